@@ -1,18 +1,33 @@
 """
 Agents package for AI Paper Reviewer
+
+Exports are resolved on first access, so importing one submodule (e.g. a
+PDF-conversion worker unpickling ``parser_agent.convert_pdf``) doesn't pay
+for importing every agent.
 """
-from .root_agent import RootAgent
-from .parser_agent import ParserAgent
-from .finder_agent import PaperFinderAgent
-from .ranking_agent import RankingAgent
-from .reviewer_agent import ReviewerAgent
-from .validator_agent import PaperValidationAgent
+import importlib
+
+_EXPORTS = {
+    'RootAgent': '.root_agent',
+    'ParserAgent': '.parser_agent',
+    'PaperFinderAgent': '.finder_agent',
+    'RankingAgent': '.ranking_agent',
+    'ReviewerAgent': '.reviewer_agent',
+    'PaperValidationAgent': '.validator_agent',
+    'SharedLookups': '.shared_lookups',
+    'PaperCorpus': '.paper_corpus',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
 
-__all__ = [
-    'RootAgent',
-    'ParserAgent',
-    'PaperFinderAgent',
-    'RankingAgent',
-    'ReviewerAgent',
-    'PaperValidationAgent'
-]
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,152 @@
+"""
+Ensemble - Merges the reviews of several reviewer variants into one
+
+A single generation's recommendation varies a lot from run to run. The
+reviewer can instead run N variants (different personas, or repeated samples
+of one persona) concurrently and merge whatever finished in time:
+
+* The recommendation is a confidence-weighted vote on the venue scale. The
+  spread of the votes (``dispersion``, in scale steps) sets the ensemble's
+  own confidence.
+* Strengths, weaknesses and questions are taken round-robin from every
+  review, skipping near-duplicates (term overlap, as in ``shared_lookups``).
+* The prose sections (summary, detailed comments, related work) come from
+  the *anchor*: the review whose vote is closest to the consensus.
+"""
+import math
+
+from .shared_lookups import jaccard, query_terms
+
+# Venue scale, most negative first; the value is the vote in scale steps
+RECOMMENDATION_SCALE = {
+    'strong reject': -3,
+    'reject': -2,
+    'weak reject': -1,
+    'borderline': 0,
+    'weak accept': 1,
+    'accept': 2,
+    'strong accept': 3,
+}
+CONFIDENCE_WEIGHTS = {'high': 1.0, 'medium': 0.7, 'low': 0.4}
+DUPLICATE_SIMILARITY = 0.5
+LIST_LIMITS = {'strengths': 6, 'weaknesses': 6, 'questions': 5}
+
+
+def recommendation_score(recommendation: str) -> int | None:
+    """Vote of a free-text recommendation on ``RECOMMENDATION_SCALE`` (None if unrecognised)."""
+    text = ' '.join(str(recommendation or '').lower().replace('-', ' ').replace('_', ' ').split())
+    if text in RECOMMENDATION_SCALE:
+        return RECOMMENDATION_SCALE[text]
+    # "Weak Accept (minor revisions)", "Reject - lacks baselines": longest label that appears wins
+    for label in sorted(RECOMMENDATION_SCALE, key=len, reverse=True):
+        if label in text:
+            return RECOMMENDATION_SCALE[label]
+    if 'major revision' in text:
+        return -1
+    if 'minor revision' in text:
+        return 1
+    return None
+
+
+def _label(score: float) -> str:
+    nearest = max(-3, min(3, round(score)))
+    return next(label.title() for label, value in RECOMMENDATION_SCALE.items() if value == nearest)
+
+
+def consensus(votes: list) -> dict:
+    """
+    Confidence-weighted consensus of ``votes`` (dicts with ``variant``,
+    ``recommendation`` and ``confidence``)
+
+    ``dispersion`` is the weighted standard deviation of the votes in scale
+    steps; ``agreement`` is the share of votes within one step of the
+    consensus. The ensemble is 'High' confidence when at least three votes
+    agree closely, 'Low' when they spread over more than a step.
+    """
+    scored = []
+    for vote in votes:
+        score = recommendation_score(vote.get('recommendation'))
+        if score is not None:
+            weight = CONFIDENCE_WEIGHTS.get(str(vote.get('confidence', '')).strip().lower(), CONFIDENCE_WEIGHTS['medium'])
+            scored.append((score, weight))
+    if not scored:
+        return {'recommendation': None, 'score': None, 'dispersion': None, 'agreement': None,
+                'confidence': 'Low', 'votes': votes}
+    total_weight = sum(weight for _, weight in scored)
+    mean = sum(score * weight for score, weight in scored) / total_weight
+    dispersion = math.sqrt(sum(weight * (score - mean) ** 2 for score, weight in scored) / total_weight)
+    agreement = sum(1 for score, _ in scored if abs(score - round(mean)) <= 1) / len(scored)
+    if len(scored) >= 3 and dispersion <= 0.5:
+        confidence = 'High'
+    elif dispersion <= 1.0:
+        confidence = 'Medium'
+    else:
+        confidence = 'Low'
+    return {
+        'recommendation': _label(mean),
+        'score': round(mean, 2),
+        'dispersion': round(dispersion, 2),
+        'agreement': round(agreement, 2),
+        'confidence': confidence,
+        'votes': votes,
+    }
+
+
+def merge_items(lists: list, limit: int, similarity: float = DUPLICATE_SIMILARITY) -> list:
+    """Round-robin over ``lists`` (one per review), dropping items too similar to one already kept."""
+    merged, kept_terms = [], []
+    for round_items in _round_robin(lists):
+        for item in round_items:
+            if len(merged) >= limit:
+                return merged
+            terms = query_terms(str(item))
+            if any(jaccard(terms, other) >= similarity for other in kept_terms):
+                continue
+            merged.append(item)
+            kept_terms.append(terms)
+    return merged
+
+
+def _round_robin(lists: list):
+    lists = [items if isinstance(items, list) else [] for items in lists]
+    for index in range(max((len(items) for items in lists), default=0)):
+        yield [items[index] for items in lists if index < len(items)]
+
+
+def aggregate_reviews(reviews: list) -> dict:
+    """
+    Merge ``(variant_name, review)`` pairs into one review in the single-review shape
+
+    The result carries an ``ensemble`` block with the consensus, each
+    variant's vote and which variant anchored the prose sections.
+    """
+    votes = []
+    for name, review in reviews:
+        overall = review.get('overall_assessment')
+        overall = overall if isinstance(overall, dict) else {'recommendation': str(overall or '')}
+        votes.append({
+            'variant': name,
+            'recommendation': overall.get('recommendation'),
+            'confidence': overall.get('confidence'),
+        })
+    agreed = consensus(votes)
+
+    def distance(vote):
+        score = recommendation_score(vote['recommendation'])
+        return abs(score - agreed['score']) if score is not None and agreed['score'] is not None else math.inf
+
+    # min() keeps the first of equals, and reviews arrive in completion order
+    anchor_index = min(range(len(votes)), key=lambda index: distance(votes[index]))
+    anchor_name, anchor = reviews[anchor_index]
+
+    merged = dict(anchor)
+    for key, limit in LIST_LIMITS.items():
+        merged[key] = merge_items([review.get(key) for _, review in reviews], limit)
+    anchor_overall = anchor.get('overall_assessment') if isinstance(anchor.get('overall_assessment'), dict) else {}
+    merged['overall_assessment'] = {
+        **anchor_overall,
+        'recommendation': agreed['recommendation'] or anchor_overall.get('recommendation', 'N/A'),
+        'confidence': agreed['confidence'],
+    }
+    merged['ensemble'] = {**agreed, 'anchor': anchor_name}
+    return merged
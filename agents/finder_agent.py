@@ -4,28 +4,66 @@ Paper Finder Agent - Searches for related academic papers using Tavily + arXiv
 import os
 import json
 import asyncio
+import logging
 import time
 import re
+import threading
 import requests
 import xml.etree.ElementTree as ET
-from tavily import TavilyClient
+from concurrent.futures import ThreadPoolExecutor
+from . import jobs, tracing
+from .rate_limit import get_limiter
+from .paper_corpus import PaperCorpus
+from .shared_lookups import jaccard, query_terms
 
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
+logger = logging.getLogger(__name__)
 
+ARXIV_NS = {
+    "atom": "http://www.w3.org/2005/Atom",
+    "arxiv": "http://arxiv.org/schemas/atom",
+    "opensearch": "http://a9.com/-/spec/opensearch/1.1/",
+}
+ATOM_ENTRY = "{http://www.w3.org/2005/Atom}entry"
+OPENSEARCH_TOTAL = "{http://a9.com/-/spec/opensearch/1.1/}totalResults"
+ARXIV_CHUNK_BYTES = 16 * 1024
+ARXIV_MAX_AUTHORS = 10
+RRF_K = 60  # Reciprocal-rank fusion constant: higher flattens the advantage of top ranks
 
-def tavily_search(query: str, max_results: int = 8):
+
+class SearchAbandoned(Exception):
+    """The fan-out a search request belonged to is over; raised instead of sending the request."""
+
+
+def unless_stopped(stop: threading.Event | None, func):
+    """
+    ``func`` that raises ``SearchAbandoned`` instead of running once ``stop``
+    is set; checked when the limiter lets the request through, so a worker
+    still queued when the fan-out ends spends no quota.
+    """
+    def guarded(*args, **kwargs):
+        if stop is not None and stop.is_set():
+            raise SearchAbandoned()
+        return func(*args, **kwargs)
+    return guarded
+
+
+def tavily_search(query: str, max_results: int = 8, stop: threading.Event | None = None):
     """Searches the web using Tavily and returns academic/technical links."""
     try:
         api_key = os.getenv("TAVILY_API_KEY")
         if not api_key:
-            print("Warning: TAVILY_API_KEY not set")
+            logger.warning("TAVILY_API_KEY not set")
             return []
         
+        from tavily import TavilyClient
+
         tavily_client = TavilyClient(api_key=api_key)
         # We use "advanced" depth to get better content
-        results = tavily_client.search(query=query, max_results=max_results, search_depth="advanced")
+        with tracing.span("search.tavily", query=query[:120], max_results=max_results) as span:
+            results = get_limiter("tavily").call(
+                unless_stopped(stop, tavily_client.search), query=query, max_results=max_results, search_depth="advanced"
+            )
+            span.set(results=len(results.get("results", [])))
         
         output = []
         for item in results.get("results", []):
@@ -36,28 +74,34 @@ def tavily_search(query: str, max_results: int = 8):
                 "snippet": item.get("content", "")[:500] if item.get("content") else ""
             })
         return output
+    except SearchAbandoned:
+        return []
     except Exception as e:
-        print(f"Tavily search error: {e}")
+        logger.warning("Tavily search error: %s", e)
         return []
 
 
 
 class PaperFinderAgent:
     def __init__(self):
-        # We keep the agent definition just in case we need LLM filtering later, 
-        # but for now we will use direct tool calls for reliability.
-        self.agent = LlmAgent(
-            name="paper_finder_agent",
-            model=Gemini(model="gemini-2.5-flash-lite"),
-            description="Finds academic papers using Tavily search.",
-            instruction="You are a helper.", # Not used in direct mode
-            tools=[tavily_search],
+        self._session = self._build_session()
+        # Local index of every candidate fetched so far; consulted before external search
+        self.corpus = PaperCorpus.from_env()
+        # Focused queries run concurrently; stragglers past the fan-out budget are dropped
+        self.max_queries = int(os.getenv("FINDER_MAX_QUERIES", "4"))
+        self.fanout_timeout = float(os.getenv("FINDER_FANOUT_TIMEOUT", "45"))
+        # Search clients block on I/O; a dedicated pool keeps the fan-out from queueing
+        # behind the loop's default executor, which is sized by CPU count
+        self.search_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("FINDER_SEARCH_THREADS", "16")), thread_name_prefix="finder-search"
         )
-        # self.runner will be initialized in the async method if needed
-        self._session = requests.Session()
-        self._session.headers.update({"User-Agent": "PaperReviewer/1.0"})
         self.arxiv_base_url = "https://export.arxiv.org/api/query"
 
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        session.headers.update({"User-Agent": "PaperReviewer/1.0"})
+        return session
+
     def _sanitize_query(self, query: str, max_words: int = 12) -> str:
         if not query:
             return "research paper"
@@ -66,118 +110,353 @@ class PaperFinderAgent:
             return "research paper"
         return " ".join(words[:max_words])
 
-    def _arxiv_search(self, sanitized_query: str, max_results: int = 5) -> list:
-        if not sanitized_query:
-            sanitized_query = "research paper"
-        params = {
-            "search_query": f"all:{sanitized_query}",
-            "start": 0,
-            "max_results": max_results,
-            "sortBy": "relevance",
-            "sortOrder": "descending"
+    def build_queries(self, title: str, abstract: str = "", keywords: list | None = None) -> list:
+        """
+        Focused search queries for a paper, most specific first
+
+        The title, the extracted keywords, the abstract's opening sentence and
+        each leading keyword anchored to the title's main terms. Near-duplicate
+        queries (by term overlap) are dropped and at most ``max_queries`` kept.
+        """
+        keywords = [k.strip() for k in keywords or [] if isinstance(k, str) and k.strip()]
+        title_terms = [w for w in re.findall(r"[A-Za-z0-9]+", title or "") if w.lower() in query_terms(w)]
+        sentences = re.split(r"(?<=[.!?])\s+", (abstract or "").strip(), maxsplit=1)
+        opening = [w for w in re.findall(r"[A-Za-z0-9]+", sentences[0]) if w.lower() in query_terms(w)]
+
+        candidates = [title, " ".join(keywords[:4]), " ".join(opening[:10])]
+        # Keywords the title doesn't already cover, anchored to the title's main terms
+        title_set = {w.lower() for w in title_terms}
+        candidates += [
+            f"{keyword} {' '.join(title_terms[:4])}" for keyword in keywords[:4]
+            if not query_terms(keyword) <= title_set
+        ]
+
+        queries, seen = [], []
+        for candidate in candidates:
+            query = self._sanitize_query(candidate) if candidate.strip() else ""
+            terms = query_terms(query)
+            if not terms or any(jaccard(terms, other) >= 0.8 for other in seen):
+                continue
+            queries.append(query)
+            seen.append(terms)
+            if len(queries) >= max(1, self.max_queries):
+                break
+        return queries or [self._sanitize_query(title)]
+
+    @staticmethod
+    def _arxiv_entry(entry) -> dict:
+        """Finder-shaped candidate from one Atom ``<entry>`` element."""
+        def text(tag):
+            return " ".join((entry.findtext(tag, default="", namespaces=ARXIV_NS) or "").split())
+
+        summary = text("atom:summary")
+        pdf_url = ""
+        for link in entry.findall("atom:link", ARXIV_NS):
+            if link.get("title") == "pdf" or link.get("type") == "application/pdf":
+                pdf_url = link.get("href", "")
+                break
+        authors = [
+            " ".join((author.findtext("atom:name", default="", namespaces=ARXIV_NS) or "").split())
+            for author in entry.findall("atom:author", ARXIV_NS)
+        ]
+        primary = entry.find("arxiv:primary_category", ARXIV_NS)
+        return {
+            "title": text("atom:title"),
+            "url": text("atom:id"),
+            "content": summary,
+            "snippet": summary[:500],
+            "published": text("atom:published")[:10],
+            "updated": text("atom:updated")[:10],
+            # Collaboration papers list hundreds of authors; the first few identify the work
+            "authors": authors[:ARXIV_MAX_AUTHORS],
+            "author_count": len(authors),
+            "categories": [c.get("term") for c in entry.findall("atom:category", ARXIV_NS) if c.get("term")],
+            "primary_category": primary.get("term", "") if primary is not None else "",
+            "pdf_url": pdf_url,
+            "journal_ref": text("arxiv:journal_ref"),
+            "doi": text("arxiv:doi"),
+            "source": "arxiv"
         }
+
+    def _arxiv_page(self, params: dict) -> tuple:
+        """
+        Fetch one result page and parse it while it streams in
+
+        Returns ``(entries, total_results)``. Each ``<entry>`` is converted as
+        soon as its closing tag arrives and then dropped from the tree, so
+        memory stays bounded by one chunk plus the converted dicts.
+        """
+        with tracing.span("search.arxiv", query=params["search_query"][:120], start=params["start"]) as span:
+            entries, total = self._read_arxiv_page(params)
+            span.set(results=len(entries), total_results=total)
+            return entries, total
+
+    def _read_arxiv_page(self, params: dict) -> tuple:
+        entries, total = [], None
+        resp = self._session.get(self.arxiv_base_url, params=params, timeout=30, stream=True)
         try:
-            resp = self._session.get(self.arxiv_base_url, params=params, timeout=30)
             resp.raise_for_status()
-        except requests.RequestException as exc:
-            print(f"⚠️ arXiv request failed: {exc}")
-            return []
+            parser = ET.XMLPullParser(events=("start", "end"))
+            feed = None
+            for chunk in resp.iter_content(chunk_size=ARXIV_CHUNK_BYTES):
+                parser.feed(chunk)
+                for event, elem in parser.read_events():
+                    if event == "start":
+                        if feed is None:
+                            feed = elem
+                    elif elem.tag == ATOM_ENTRY:
+                        entries.append(self._arxiv_entry(elem))
+                        feed.remove(elem)
+                    elif elem.tag == OPENSEARCH_TOTAL and elem.text:
+                        total = int(elem.text.strip())
+            parser.close()
+        finally:
+            resp.close()
+        return entries, total
 
-        try:
-            root = ET.fromstring(resp.content)
-            ns = {"atom": "http://www.w3.org/2005/Atom"}
-            entries = []
-            for entry in root.findall("atom:entry", ns):
-                title = (entry.findtext("atom:title", default="", namespaces=ns) or "").strip()
-                summary = (entry.findtext("atom:summary", default="", namespaces=ns) or "").strip()
-                url_abs = entry.findtext("atom:id", default="", namespaces=ns) or ""
-                published = (entry.findtext("atom:published", default="", namespaces=ns) or "")[:10]
-                entries.append({
-                    "title": title,
-                    "url": url_abs,
-                    "content": summary,
-                    "snippet": summary[:500],
-                    "published": published,
-                    "source": "arxiv"
+    def _arxiv_search(self, sanitized_query: str, max_results: int = 5, page_size: int | None = None,
+                      stop: threading.Event | None = None) -> list:
+        """
+        arXiv results for a query, paging ``page_size`` at a time until
+        ``max_results`` are collected, the result set is exhausted or ``stop`` is set
+        """
+        if not sanitized_query:
+            sanitized_query = "research paper"
+        page_size = max(1, page_size or int(os.getenv("ARXIV_PAGE_SIZE", "100")))
+        entries = []
+        while len(entries) < max_results:
+            params = {
+                "search_query": f"all:{sanitized_query}",
+                "start": len(entries),
+                "max_results": min(page_size, max_results - len(entries)),
+                "sortBy": "relevance",
+                "sortOrder": "descending"
+            }
+            try:
+                # Shared limiter spaces every page (and every review) by arXiv's ~3s guidance
+                page, total = get_limiter("arxiv").call(unless_stopped(stop, self._arxiv_page), params)
+            except SearchAbandoned:
+                logger.info("⏹️ arXiv search abandoned after %d results", len(entries))
+                break
+            except requests.RequestException as exc:
+                logger.warning("⚠️ arXiv request failed: %s", exc)
+                break
+            except (ET.ParseError, ValueError) as exc:
+                logger.warning("⚠️ arXiv parse error: %s", exc)
+                break
+            entries.extend(page)
+            if len(page) < params["max_results"] or (total is not None and len(entries) >= total):
+                break
+        logger.info("✅ arXiv returned %d results", len(entries))
+        return entries
+
+    def _filter_academic(self, raw_papers: list) -> list:
+        """Keep results from academic domains or PDFs, falling back to everything if none match."""
+        # This is more reliable than asking LLM to filter JSON
+        academic_domains = [
+            'arxiv.org', 'ieee.org', 'acm.org', 'springer.com', 
+            'elsevier.com', 'nature.com', 'science.org', 'sciencedirect.com',
+            'researchgate.net', 'semanticscholar.org', 'scholar.google.com',
+            'mdpi.com', 'frontiersin.org', 'plos.org', 'wiley.com',
+            'tandfonline.com', 'sagepub.com', 'hindawi.com', 'mdpi.com'
+        ]
+
+        filtered_papers = []
+        for p in raw_papers:
+            url = p.get('url', '').lower()
+            # If it matches a domain OR if it looks like a PDF
+            if any(d in url for d in academic_domains) or url.endswith('.pdf'):
+                filtered_papers.append({
+                    **p,
+                    'source': p.get('source', 'tavily')
                 })
-            print(f"✅ arXiv returned {len(entries)} results")
-            return entries
-        except ET.ParseError as exc:
-            print(f"⚠️ arXiv parse error: {exc}")
-            return []
+            else:
+                # Keep it if it looks really relevant (fallback)
+                # For now, let's be permissive if we have few results
+                if len(raw_papers) < 3:
+                    filtered_papers.append({
+                        **p,
+                        'source': p.get('source', 'tavily')
+                    })
+
+        # If we filtered too aggressively, revert to raw
+        if not filtered_papers and raw_papers:
+            logger.info("⚠️ No strict academic domains found, using all results.")
+            filtered_papers = [{**p, 'source': p.get('source', 'tavily')} for p in raw_papers]
+
+        return filtered_papers
+
+    def _merge_results(self, combined: list) -> list:
+        """Deduplicate merged Tavily/arXiv results, keeping the first occurrence."""
+        # Deduplicate by URL/title combo
+        deduped = []
+        seen = set()
+        for paper in combined:
+            key = (paper.get('url') or paper.get('title', '')).lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            deduped.append(paper)
+        return deduped
     
-    async def find_papers_async(self, query: str, max_results: int = 10) -> list:
+    async def _search_sources(self, query: str, max_results: int, arxiv: bool = True,
+                              stop: threading.Event | None = None) -> list:
+        """Tavily (academic-filtered) and, if ``arxiv``, arXiv results for one query, as ranked lists."""
+        # Both clients block, so they run in worker threads and the caller's deadline can still fire.
+        loop = asyncio.get_running_loop()
+        searches = [loop.run_in_executor(
+            self.search_executor, tracing.in_context(tavily_search, query, max_results=max_results, stop=stop)
+        )]
+        if arxiv:
+            searches.append(loop.run_in_executor(self.search_executor, tracing.in_context(
+                self._arxiv_search, self._sanitize_query(query), max_results=min(5, max_results), stop=stop
+            )))
+        raw_papers, *arxiv_results = await asyncio.gather(*searches)
+        logger.info("✅ Tavily returned %d results for '%.60s'", len(raw_papers), query)
+        # Python-based Filtering for Academic Sources
+        return [self._filter_academic(raw_papers), *arxiv_results]
+
+    async def _fan_out(self, queries: list, max_results: int, shared_lookups=None, arxiv: bool = True) -> list:
+        """
+        Run every query concurrently and collect the ranked lists of those that
+        answered within ``fanout_timeout``; if none has, wait for the first one.
+
+        Only the primary (first, most specific) query goes to arXiv as well
+        (none does without ``arxiv``): the arXiv limiter serialises requests
+        3s apart, so one arXiv search per query would make the fan-out as slow
+        as running the queries in turn.
+        Once the fan-out is over, workers still queued for a limiter skip
+        their request instead of spending quota on discarded results.
+
+        With ``shared_lookups`` (a batch), a query another paper of the batch
+        already sent is not sent again.
+        """
+        stop = threading.Event()
+
+        async def search(query, arxiv):
+            ranked_lists = await self._search_sources(query, max_results, arxiv=arxiv, stop=stop)
+            # Nothing at all (e.g. abandoned at the deadline) isn't worth sharing: [] lets the next paper retry
+            return ranked_lists if any(ranked_lists) else []
+
+        def lookup(query, arxiv):
+            if shared_lookups is None:
+                return search(query, arxiv)
+            return shared_lookups.once("search", (query, arxiv, max_results), lambda: search(query, arxiv))
+
+        tasks = [asyncio.ensure_future(lookup(q, arxiv and index == 0)) for index, q in enumerate(queries)]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=self.fanout_timeout)
+            if not done:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if pending:
+                logger.warning("⏱️ %d of %d queries missed the fan-out deadline; using the rest", len(pending), len(queries))
+        finally:
+            # Cancelling the tasks doesn't stop their threads; the flag keeps them from sending more requests
+            stop.set()
+            for task in tasks:
+                task.cancel()
+        ranked_lists = []
+        for query, task in zip(queries, tasks):
+            if task in done and not task.cancelled():
+                if isinstance(task.exception(), jobs.JobCancelled):
+                    raise task.exception()
+                if task.exception():
+                    logger.warning("⚠️ Search for '%.60s' failed: %s", query, task.exception())
+                    continue
+                ranked_lists.extend(task.result())
+        return ranked_lists
+
+    @staticmethod
+    def _fuse(ranked_lists: list, k: int = RRF_K) -> list:
+        """
+        Reciprocal-rank fusion: a paper scores ``sum(1 / (k + rank))`` over
+        every list it appears in, so papers several queries agree on rise to the
+        top. Ties keep first-seen order.
+        """
+        scores, papers = {}, {}
+        for results in ranked_lists:
+            for rank, paper in enumerate(results, start=1):
+                key = (paper.get('url') or paper.get('title', '')).lower()
+                if not key:
+                    continue
+                scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+                papers.setdefault(key, paper)
+        return [papers[key] for key in sorted(scores, key=lambda key: -scores[key])]
+
+    async def find_papers_async(self, query: str, max_results: int = 10, queries: list | None = None,
+                                shared_lookups=None) -> list:
         """
         Find related academic papers (Async)
+
+        Args:
+            query: The paper's topic; keys the local corpus lookup
+            max_results: Tavily results per query (arXiv contributes up to 5 more for the primary query)
+            queries: Focused queries to fan out (see ``build_queries``); defaults to ``[query]``
+            shared_lookups: The batch's ``SharedLookups``; corpus lookups and
+                fanned-out queries already run for another paper are reused
         """
-        # Initialize runner here if we were using it (currently using direct tool call)
-        # runner = InMemoryRunner(agent=self.agent)
         try:
-            print(f"\n{'='*60}")
-            print(f"🔎 PAPER FINDER AGENT - Starting paper search (Tavily + arXiv)")
-            print(f"{'='*60}")
-            print(f"❓ Query: {query}")
+            logger.info("🔎 Searching related papers (Tavily + arXiv) for: %.200s", query)
             
-            # 1. Direct Tool Call (No LLM hallucination risk) - Tavily
-            raw_papers = tavily_search(query, max_results=max_results)
+            # 0. Local corpus first: skip the paid searches when it already covers the topic
+            local_papers = []
+            if self.corpus:
+                def corpus_lookup():
+                    return asyncio.to_thread(self.corpus.lookup, query, max_results)
+                if shared_lookups is not None:
+                    local = await shared_lookups.once("corpus", (query, max_results), corpus_lookup)
+                else:
+                    local = await corpus_lookup()
+                local_papers = local.papers
+                if local.sufficient:
+                    logger.info("📚 Local corpus answered the query (%d papers, %s); skipping external search", len(local_papers), local.reason)
+                    return local_papers
+                logger.info("📚 Local corpus: %s; searching externally", local.reason)
             
-            print(f"✅ Tavily returned {len(raw_papers)} results")
+            # 1. Direct Tool Calls (No LLM hallucination risk) - every query on Tavily, the primary one on arXiv too
+            queries = queries or [query]
+            if len(queries) > 1:
+                logger.info("🧭 Fanning out %d queries: %s", len(queries), queries)
+            with tracing.span("search.fan_out", queries=len(queries)) as span:
+                ranked_lists = await self._fan_out(queries, max_results, shared_lookups)
+                span.set(ranked_lists=len(ranked_lists))
             
-            # 2. Python-based Filtering for Academic Sources
-            # This is more reliable than asking LLM to filter JSON
-            academic_domains = [
-                'arxiv.org', 'ieee.org', 'acm.org', 'springer.com', 
-                'elsevier.com', 'nature.com', 'science.org', 'sciencedirect.com',
-                'researchgate.net', 'semanticscholar.org', 'scholar.google.com',
-                'mdpi.com', 'frontiersin.org', 'plos.org', 'wiley.com',
-                'tandfonline.com', 'sagepub.com', 'hindawi.com', 'mdpi.com'
-            ]
+            # 2. Reciprocal-rank fusion, capped at what a single query could return
+            deduped = self._fuse(ranked_lists)[:max_results + min(5, max_results)]
             
-            filtered_papers = []
-            for p in raw_papers:
-                url = p.get('url', '').lower()
-                # If it matches a domain OR if it looks like a PDF
-                if any(d in url for d in academic_domains) or url.endswith('.pdf'):
-                    filtered_papers.append({
-                        **p,
-                        'source': p.get('source', 'tavily')
-                    })
-                else:
-                    # Keep it if it looks really relevant (fallback)
-                    # For now, let's be permissive if we have few results
-                    if len(raw_papers) < 3:
-                        filtered_papers.append({
-                            **p,
-                            'source': p.get('source', 'tavily')
-                        })
-
-            # If we filtered too aggressively, revert to raw
-            if not filtered_papers and raw_papers:
-                print("⚠️  No strict academic domains found, using all results.")
-                filtered_papers = [{**p, 'source': p.get('source', 'tavily')} for p in raw_papers]
+            if self.corpus and deduped:
+                await asyncio.to_thread(self.corpus.record_search, query, deduped)
+            if local_papers:
+                # Local matches fill in when the external searches came back short
+                deduped = self._merge_results(deduped + local_papers)[:max(len(deduped), max_results)]
             
-            search_query = self._sanitize_query(query)
-            arxiv_results = self._arxiv_search(search_query, max_results=min(5, max_results))
-            combined = filtered_papers + arxiv_results
-
-            # Deduplicate by URL/title combo
-            deduped = []
-            seen = set()
-            for paper in combined:
-                key = (paper.get('url') or paper.get('title', '')).lower()
-                if key in seen:
-                    continue
-                seen.add(key)
-                deduped.append(paper)
-            
-            print(f"✅ Returning {len(deduped)} total papers after merging sources")
+            logger.info("✅ Returning %d total papers after merging sources", len(deduped))
             
             return deduped
             
         except Exception as e:
-            print(f"❌ FINDER AGENT - Error: {str(e)}")
+            logger.exception("❌ Related-paper search failed: %s", e)
             return []
 
-    def find_papers(self, query: str, max_results: int = 10) -> list:
+    async def top_up_async(self, found, queries: list, max_results: int = 10, shared_lookups=None) -> list:
+        """
+        The papers of ``found`` (an awaitable of ``find_papers_async``) fused
+        with the Tavily results of further ``queries``, e.g. the keyword
+        queries a search started before the keywords were known didn't send
+
+        The extra queries run while ``found`` is still in flight; they skip
+        arXiv, which the primary query of ``found`` already covered.
+        """
+        extra = asyncio.ensure_future(self._fan_out(queries, max_results, shared_lookups, arxiv=False))
+        try:
+            papers = await found
+            ranked_lists = await extra
+        finally:
+            extra.cancel()
+        if not any(ranked_lists):
+            return papers
+        return self._fuse([papers, *ranked_lists])[:max_results + min(5, max_results)]
+
+    def find_papers(self, query: str, max_results: int = 10, queries: list | None = None) -> list:
         """Synchronous wrapper"""
-        return asyncio.run(self.find_papers_async(query, max_results))
+        return asyncio.run(self.find_papers_async(query, max_results, queries))
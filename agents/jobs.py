@@ -0,0 +1,104 @@
+"""
+Jobs - Cancellation and priority of the review running in the current context
+
+Each review runs as a ``Job`` (``with running(job):`` inside its task). The
+job travels in a context variable like the trace does, so code anywhere
+below it, including worker threads started with ``tracing.in_context`` or
+``asyncio.to_thread``, can see it:
+
+* ``job.cancel()`` (any thread) cancels the review's asyncio task, which
+  aborts whatever stage and LLM call it is awaiting, and sets an event that
+  outbound calls still running in worker threads check before each request,
+  retry or rate-limit wait (``check_cancelled`` / ``sleep``).
+* ``priority`` (``interactive`` or ``batch``) is read by the rate limiters:
+  batch callers wait while interactive ones are queued for the same backend.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+
+_current_job = contextvars.ContextVar("review_job", default=None)
+
+
+class JobCancelled(BaseException):
+    """
+    Raised by outbound calls of a job that was cancelled
+
+    A ``BaseException``, like ``asyncio.CancelledError``, so the agents'
+    ``except Exception`` fallbacks don't turn it into an error result and
+    carry on with the remaining stages.
+    """
+
+
+class Job:
+    """One review's cancel switch and priority class."""
+
+    def __init__(self, job_id: str, priority: str = INTERACTIVE):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'; expected one of {PRIORITIES}")
+        self.job_id = job_id
+        self.priority = priority
+        self.cancelled = threading.Event()
+        self._task = None
+        self._loop = None
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self.cancelled.is_set()
+
+    def cancel(self):
+        """Request cancellation (idempotent, callable from any thread)."""
+        self.cancelled.set()
+        task, loop = self._task, self._loop
+        if task is not None and not task.done():
+            loop.call_soon_threadsafe(task.cancel)
+
+
+def current_job() -> Job | None:
+    return _current_job.get()
+
+
+def current_priority() -> str:
+    job = _current_job.get()
+    return job.priority if job is not None else INTERACTIVE
+
+
+def check_cancelled():
+    """Raise ``JobCancelled`` if the current job was cancelled."""
+    job = _current_job.get()
+    if job is not None:
+        _check(job)
+
+
+def _check(job: Job):
+    if job.cancelled.is_set():
+        raise JobCancelled(job.job_id)
+
+
+def sleep(seconds: float):
+    """``time.sleep`` that wakes up and raises ``JobCancelled`` as soon as the current job is cancelled."""
+    job = _current_job.get()
+    if job is None:
+        time.sleep(seconds)
+    elif job.cancelled.wait(seconds):
+        raise JobCancelled(job.job_id)
+
+
+@contextmanager
+def running(job: Job):
+    """Run the enclosed code (inside ``job``'s asyncio task) as ``job``."""
+    job._task = asyncio.current_task()
+    job._loop = asyncio.get_running_loop()
+    # Cancelled before its task started: don't start
+    _check(job)
+    token = _current_job.set(job)
+    try:
+        yield job
+    finally:
+        _current_job.reset(token)
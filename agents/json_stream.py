@@ -0,0 +1,83 @@
+"""
+Incremental JSON - Emits top-level members of a streamed JSON object as soon as they close
+"""
+import json
+
+
+class IncrementalJSONObjectParser:
+    """
+    Feed text chunks of an LLM response; get back each top-level ``key: value``
+    pair of the JSON object the moment its value is complete.
+
+    Anything before the first ``{`` (prose, a ```json fence) is ignored. Strings
+    are tracked so braces inside them don't confuse the depth count. Each
+    member is decoded on its own with ``json.loads``; a member that can't be
+    decoded is skipped and left for the final full-document parse.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.members = {}
+        self._pos = 0
+        self._depth = 0
+        self._quote = None
+        self._escaped = False
+        self._member_start = None
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        """True once the top-level object has closed."""
+        return self._done
+
+    def feed(self, chunk: str) -> list:
+        """Consume ``chunk`` and return the ``(key, value)`` pairs completed by it."""
+        if self._done or not chunk:
+            return []
+        self.buffer += chunk
+        completed = []
+        text = self.buffer
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._quote:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == self._quote:
+                    self._quote = None
+                continue
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._member_start = i + 1
+                continue
+            if ch == '"':
+                self._quote = ch
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed += self._close_member(text[self._member_start:i])
+                    self._done = True
+                    self._pos = i + 1
+                    return completed
+            elif ch == "," and self._depth == 1:
+                completed += self._close_member(text[self._member_start:i])
+                self._member_start = i + 1
+        self._pos = len(text)
+        return completed
+
+    def _close_member(self, member: str) -> list:
+        member = member.strip()
+        if not member:
+            return []
+        try:
+            decoded = json.loads("{" + member + "}")
+        except ValueError:
+            return []
+        if not isinstance(decoded, dict):
+            return []
+        self.members.update(decoded)
+        return list(decoded.items())
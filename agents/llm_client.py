@@ -0,0 +1,229 @@
+"""
+LLM Client - Shared entry point for every Gemini call made by the agents
+
+Calls are rate limited per model (see ``rate_limit.py``), bounded by a
+per-attempt timeout so a stuck generation is retried instead of holding a
+worker forever, and can optionally be hedged: if the first attempt has not
+answered by the model's observed p95 latency, a duplicate is sent and the
+first answer wins. ``stream_prompt`` is the streaming variant used when the
+caller wants tokens as they are generated.
+
+google.adk / google.genai take seconds to import, so they are only imported
+when the first runner is built (or by ``warm_up``), keeping ``import agents``
+and app startup cheap.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from . import jobs, tracing
+from .rate_limit import get_limiter
+
+DEFAULT_ATTEMPT_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "180"))
+DEFAULT_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "30"))
+MIN_HEDGE_SAMPLES = 20
+
+logger = logging.getLogger(__name__)
+
+
+def build_runner(config: dict, **agent_options):
+    """
+    Fresh ``InMemoryRunner`` for the agent described by ``config``
+
+    ``config`` holds ``name``, ``model_name``, ``description`` and
+    ``instruction``; ``agent_options`` go to ``LlmAgent`` (e.g.
+    ``output_schema``, ``generate_content_config``). A new runner per call
+    never reuses state bound to a closed event loop.
+    """
+    from google.adk.agents import LlmAgent
+    from google.adk.models.google_llm import Gemini
+    from google.adk.runners import InMemoryRunner
+
+    agent = LlmAgent(
+        name=config["name"],
+        model=Gemini(model=config["model_name"]),
+        description=config["description"],
+        instruction=config["instruction"],
+        tools=[],
+        **agent_options,
+    )
+    return InMemoryRunner(agent=agent)
+
+
+def warm_up(runner_factories: list) -> dict:
+    """
+    Import the model SDKs and pre-build one runner (and its API client) per
+    factory, so the first real call doesn't pay for it. Returns timings.
+    """
+    timings = {}
+    started = time.perf_counter()
+    import google.adk.runners  # noqa: F401 - the slow part of a cold start
+    from google.adk.agents.run_config import RunConfig  # noqa: F401
+    timings["import_s"] = round(time.perf_counter() - started, 3)
+    for factory in runner_factories:
+        started = time.perf_counter()
+        runner = factory()
+        try:
+            # Initialises the genai client stack (credentials, HTTP/TLS setup); needs an API key
+            runner.agent.model.api_client
+        except Exception as exc:
+            timings["client_error"] = str(exc)[:200]
+        timings[runner.agent.name] = round(time.perf_counter() - started, 3)
+    return timings
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per model."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, q: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q / 100 * len(samples)))]
+
+
+latency_tracker = LatencyTracker()
+
+
+def hedge_delay(model: str) -> float:
+    """Delay before a hedged duplicate is sent: observed p95, or the default until enough samples exist."""
+    p95 = latency_tracker.percentile(model, 95)
+    return p95 if p95 is not None else DEFAULT_HEDGE_DELAY
+
+
+async def _first_success(start_attempt, delay: float):
+    """Run one attempt; if it hasn't finished after ``delay`` seconds start a second and return whichever succeeds first."""
+    first = asyncio.ensure_future(start_attempt())
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+        logger.info("🪁 LLM call exceeded hedge delay (%.1fs); sending duplicate request", delay)
+        pending.add(asyncio.ensure_future(start_attempt()))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+                if isinstance(error, jobs.JobCancelled):
+                    raise error
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def run_prompt(build_runner, prompt: str, *, model: str, timeout: float | None = None, hedge: bool = False) -> list:
+    """
+    Send ``prompt`` through a fresh runner under the per-model Gemini limiter
+
+    Args:
+        build_runner: Zero-argument factory returning a new ``InMemoryRunner``.
+            Each attempt gets its own runner so a failed or duplicate attempt
+            never shares session history with another.
+        prompt: User message for the agent
+        model: Gemini model name, used to pick the rate limiter
+        timeout: Per-attempt timeout in seconds (default ``LLM_CALL_TIMEOUT``);
+            timed-out attempts are retried like other transient failures
+        hedge: Send a duplicate request after the model's p95 latency
+
+    Returns:
+        List of events from ``runner.run_debug``
+    """
+    limiter = get_limiter("gemini", model)
+    attempt_timeout = timeout or DEFAULT_ATTEMPT_TIMEOUT
+
+    async def attempt():
+        # Inside the limiter: the parent llm.call span also covers queueing and retries
+        with tracing.span("llm.attempt", model=model):
+            started = time.monotonic()
+            events = await asyncio.wait_for(build_runner().run_debug(prompt), attempt_timeout)
+            latency_tracker.record(model, time.monotonic() - started)
+            return events
+
+    async def governed_attempt():
+        return await limiter.call_async(attempt)
+
+    with tracing.span("llm.call", model=model, prompt_chars=len(prompt), hedge=hedge) as span:
+        if hedge:
+            events = await _first_success(governed_attempt, hedge_delay(model))
+        else:
+            events = await governed_attempt()
+        span.set(events=len(events))
+        return events
+
+
+async def stream_prompt(build_runner, prompt: str, *, model: str, on_text, on_restart=None, timeout: float | None = None) -> list:
+    """
+    Like ``run_prompt`` but streams: ``on_text(delta)`` is called with each
+    chunk of model text as it arrives (SSE streaming mode).
+
+    If an attempt fails and is retried, ``on_restart()`` is called first so the
+    listener can discard the partial output of the failed attempt. Streaming
+    calls are never hedged.
+
+    Returns:
+        The non-partial (final) events, in the same shape ``run_prompt`` returns
+    """
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+    from google.genai import types
+
+    limiter = get_limiter("gemini", model)
+    attempt_timeout = timeout or DEFAULT_ATTEMPT_TIMEOUT
+    attempts = 0
+
+    async def consume(runner) -> list:
+        session = await runner.session_service.create_session(
+            app_name=runner.app_name, user_id="stream_user", session_id=uuid.uuid4().hex
+        )
+        final_events = []
+        async for event in runner.run_async(
+            user_id="stream_user",
+            session_id=session.id,
+            new_message=types.UserContent(parts=[types.Part(text=prompt)]),
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+        ):
+            if getattr(event, "partial", False):
+                parts = event.content.parts if event.content and event.content.parts else []
+                delta = "".join(
+                    part.text for part in parts
+                    if getattr(part, "text", None) and not getattr(part, "thought", False)
+                )
+                if delta:
+                    on_text(delta)
+            else:
+                final_events.append(event)
+        return final_events
+
+    async def attempt():
+        nonlocal attempts
+        attempts += 1
+        if attempts > 1 and on_restart:
+            on_restart()
+        with tracing.span("llm.attempt", model=model, attempt=attempts):
+            started = time.monotonic()
+            events = await asyncio.wait_for(consume(build_runner()), attempt_timeout)
+            latency_tracker.record(model, time.monotonic() - started)
+            return events
+
+    with tracing.span("llm.call", model=model, prompt_chars=len(prompt), streaming=True) as span:
+        events = await limiter.call_async(attempt)
+        span.set(events=len(events), attempts=attempts)
+        return events
@@ -0,0 +1,117 @@
+"""
+Logging - Queue-based structured logging for the agents and the web tier
+
+Modules log through ``logging.getLogger(__name__)`` with %-style arguments,
+so a message below the configured level is never formatted. Records are
+handed to a ``QueueHandler``, which merges the message with its arguments
+(and any traceback) in the calling thread, as the stdlib handler does, so
+later changes to those arguments can't alter the line. A single background
+``QueueListener`` thread lays out the output lines (timestamp, level,
+review, JSON encoding) and writes them. Pipelines never wait on the stdout
+lock or a slow log driver.
+
+Each record carries ``review``: the token of the review whose trace is
+active in the logging context (see ``tracing``), or ``-`` outside one.
+
+Entry points call ``configure_logging()`` once:
+
+* ``LOG_LEVEL`` (default ``INFO``) applies to this project's loggers;
+  third-party libraries stay at WARNING.
+* ``LOG_FORMAT``: ``text`` (default) or ``json`` (one object per line).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+from . import tracing
+
+# This project's top-level logger names; everything else stays at WARNING
+PROJECT_LOGGERS = ("agents", "services", "app", "asgi", "batch_review", "benchmarks", "__main__", "__mp_main__")
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s [%(review)s] %(name)s: %(message)s"
+# Attributes every LogRecord has; anything else was passed via ``extra=``
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "review"}
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+class ReviewContextFilter(logging.Filter):
+    """Stamps each record with the review token of the active trace (runs in the caller's context)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = tracing.current_trace()
+        record.review = current.trace_id if current is not None else "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, review token, message and any ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "review": getattr(record, "review", "-"),
+            "msg": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def set_level(level: str | int):
+    """Set the level of this project's loggers (names like ``"DEBUG"`` or numbers)."""
+    if isinstance(level, str):
+        level = logging.getLevelName(level.strip().upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    for name in PROJECT_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+
+
+def configure_logging(level: str | int | None = None, fmt: str | None = None, stream=None) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a queue to one writer thread
+
+    Idempotent: later calls only change the level, and only when ``level``
+    is given, so an entry point can set it before importing ``app``.
+
+    Args:
+        level: Level for this project's loggers (default ``LOG_LEVEL`` or INFO)
+        fmt: ``text`` or ``json`` (default ``LOG_FORMAT`` or text)
+        stream: Where the writer thread writes (default stdout)
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            if level is not None:
+                set_level(level)
+            return _listener
+        set_level(level or os.getenv("LOG_LEVEL", "INFO"))
+        fmt = (fmt or os.getenv("LOG_FORMAT", "text")).strip().lower()
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+        records = queue.SimpleQueue()  # Unbounded: logging never blocks the caller
+        enqueue = logging.handlers.QueueHandler(records)
+        enqueue.addFilter(ReviewContextFilter())
+        root = logging.getLogger()
+        root.addHandler(enqueue)
+        if root.level == logging.NOTSET or root.level > logging.WARNING:
+            root.setLevel(logging.WARNING)
+
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        # Flush what is still queued when the process exits
+        atexit.register(_listener.stop)
+        return _listener
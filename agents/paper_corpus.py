@@ -0,0 +1,226 @@
+"""
+Paper Corpus - Local, persistent index of every related-paper candidate the finder has fetched
+
+Candidates (title, URL, abstract, source, date) are stored in SQLite with an
+FTS5 full-text index (BM25 ranking, Porter stemming). The finder queries the
+corpus first and only goes to Tavily / arXiv when local recall is too low or
+the local matches are stale, so repeat subfields get cheaper and faster as
+the corpus grows.
+
+Configured from the environment:
+
+    PAPER_CORPUS_PATH=paper_corpus.db     empty string disables the corpus
+    PAPER_CORPUS_MIN_RESULTS=6            strong local matches needed to skip external search
+    PAPER_CORPUS_MAX_AGE_DAYS=30          older entries / searches count as stale
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+
+from .shared_lookups import query_terms
+
+logger = logging.getLogger(__name__)
+
+MIN_COVERAGE = 0.4  # Share of the query's terms a local match must contain to count as strong
+MAX_QUERY_TERMS = 24
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    title TEXT NOT NULL,
+    url TEXT,
+    abstract TEXT,
+    source TEXT,
+    published TEXT,
+    fetched_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    title, abstract, content='papers', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+    INSERT INTO papers_fts(rowid, title, abstract) VALUES (new.id, new.title, new.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+    INSERT INTO papers_fts(papers_fts, rowid, title, abstract) VALUES ('delete', old.id, old.title, old.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+    INSERT INTO papers_fts(papers_fts, rowid, title, abstract) VALUES ('delete', old.id, old.title, old.abstract);
+    INSERT INTO papers_fts(rowid, title, abstract) VALUES (new.id, new.title, new.abstract);
+END;
+CREATE TABLE IF NOT EXISTS searches (
+    query_key TEXT PRIMARY KEY,
+    searched_at REAL NOT NULL,
+    results INTEGER NOT NULL
+);
+"""
+
+
+@dataclass
+class LocalResult:
+    papers: list = field(default_factory=list)
+    sufficient: bool = False
+    reason: str = ""
+
+
+def paper_key(paper: dict) -> str:
+    """Stable identity for a candidate: its URL without scheme/version suffix, else its title."""
+    url = (paper.get("url") or "").strip().lower()
+    if url:
+        url = re.sub(r"^https?://(www\.)?", "", url).rstrip("/")
+        url = re.sub(r"(arxiv\.org/(abs|pdf)/[\w.\-/]+?)(v\d+)?(\.pdf)?$", r"\1", url)
+        return url
+    return " ".join(re.findall(r"[a-z0-9]+", (paper.get("title") or "").lower()))
+
+
+class PaperCorpus:
+    def __init__(self, path: str, min_results: int = 6, max_age_days: float = 30.0):
+        self.path = path
+        self.min_results = min_results
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        # WAL lets the web server and CLI runs read while another process writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls):
+        """Corpus configured by ``PAPER_CORPUS_*``; None if disabled or SQLite lacks FTS5."""
+        path = os.getenv("PAPER_CORPUS_PATH", "paper_corpus.db")
+        if not path:
+            return None
+        try:
+            return cls(
+                path,
+                min_results=int(os.getenv("PAPER_CORPUS_MIN_RESULTS", "6")),
+                max_age_days=float(os.getenv("PAPER_CORPUS_MAX_AGE_DAYS", "30")),
+            )
+        except sqlite3.Error as exc:
+            logger.warning("⚠️ Paper corpus disabled (%s)", exc)
+            return None
+
+    @staticmethod
+    def _terms(query: str) -> list:
+        """Significant terms of ``query`` in order of appearance (the title comes first)."""
+        significant = query_terms(query)
+        words = dict.fromkeys(word.lower() for word in re.findall(r"[A-Za-z0-9]+", query or ""))
+        return [word for word in words if word in significant][:MAX_QUERY_TERMS]
+
+    def _query_key(self, query: str) -> str:
+        return " ".join(sorted(self._terms(query)))
+
+    def add(self, papers: list, fetched_at: float | None = None) -> int:
+        """Insert or refresh candidates; a longer abstract never gets replaced by a shorter one."""
+        fetched_at = fetched_at or time.time()
+        rows = []
+        for paper in papers:
+            title = (paper.get("title") or "").strip()
+            key = paper_key(paper)
+            if not title or not key:
+                continue
+            rows.append((
+                key, title, paper.get("url", ""), paper.get("content") or paper.get("snippet") or "",
+                paper.get("source", "tavily"), paper.get("published", ""), fetched_at,
+            ))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO papers (key, title, url, abstract, source, published, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    title = excluded.title,
+                    url = excluded.url,
+                    abstract = CASE WHEN length(excluded.abstract) >= length(papers.abstract)
+                                    THEN excluded.abstract ELSE papers.abstract END,
+                    source = excluded.source,
+                    published = COALESCE(NULLIF(excluded.published, ''), papers.published),
+                    fetched_at = excluded.fetched_at
+                """,
+                rows,
+            )
+        return len(rows)
+
+    def record_search(self, query: str, papers: list):
+        """Store an external search's results and remember when the query was last searched."""
+        self.add(papers)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (query_key, searched_at, results) VALUES (?, ?, ?)",
+                (self._query_key(query), time.time(), len(papers)),
+            )
+
+    def _search_rows(self, query: str, limit: int) -> list:
+        """``(paper, coverage, fetched_at)`` for the BM25-ranked matches (title weighted double)."""
+        terms = self._terms(query)
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT p.title, p.url, p.abstract, p.source, p.published, p.fetched_at,
+                       bm25(papers_fts, 2.0, 1.0) AS score
+                FROM papers_fts JOIN papers p ON p.id = papers_fts.rowid
+                WHERE papers_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+                """,
+                (match, limit),
+            ).fetchall()
+        matches = []
+        for row in rows:
+            text = f"{row['title']} {row['abstract']}".lower()
+            paper = {
+                "title": row["title"],
+                "url": row["url"],
+                "content": row["abstract"],
+                "snippet": (row["abstract"] or "")[:500],
+                "published": row["published"],
+                "source": row["source"],
+                "from_corpus": True,
+            }
+            matches.append((paper, sum(term in text for term in terms) / len(terms), row["fetched_at"]))
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """Local candidates for ``query``, best first, in the finder's result shape."""
+        return [paper for paper, _, _ in self._search_rows(query, limit)]
+
+    def lookup(self, query: str, limit: int = 10) -> LocalResult:
+        """
+        Local candidates for ``query`` and whether they are enough to skip external search
+
+        Enough means: the same query was searched externally within the max
+        age, or at least ``min_results`` fresh local matches each contain
+        ``MIN_COVERAGE`` of the query's terms.
+        """
+        matches = self._search_rows(query, limit)
+        papers = [paper for paper, _, _ in matches]
+        if not papers:
+            return LocalResult(reason="no local matches")
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT searched_at, results FROM searches WHERE query_key = ?", (self._query_key(query),)
+            ).fetchone()
+        if row and row["searched_at"] >= cutoff and row["results"]:
+            return LocalResult(papers, True, "query searched recently")
+        strong = [paper for paper, coverage, fetched_at in matches if coverage >= MIN_COVERAGE and fetched_at >= cutoff]
+        if len(strong) >= self.min_results:
+            return LocalResult(papers, True, f"{len(strong)} fresh strong matches")
+        return LocalResult(papers, False, f"only {len(strong)} fresh strong matches")
+
+    def stats(self) -> dict:
+        with self._lock:
+            papers = self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+            searches = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+        return {"papers": papers, "searches": searches, "path": self.path}
@@ -2,13 +2,90 @@
 Parser Agent - Converts PDF to markdown and extracts metadata
 """
 import asyncio
-import json
+import functools
+import logging
 import re
 from typing import Dict, Any
-from markitdown import MarkItDown
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
+from . import schemas, structured, tracing
+from .llm_client import build_runner
+
+logger = logging.getLogger(__name__)
+
+# Document-info titles that name the authoring tool or file rather than the paper
+_PLACEHOLDER_TITLE = re.compile(r"^(untitled|microsoft word|title|paper)\b|\.(tex|dvi|docx?|pdf)$", re.IGNORECASE)
+_MARKDOWN_HEADING = re.compile(r"^#{1,3}\s+(.+?)\s*#*$")
+
+
+def pdf_info_title(pdf_path: str) -> str:
+    """``/Title`` from the PDF's document info, or "" (also when pdfminer is unavailable)."""
+    try:
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.utils import decode_text
+
+        with open(pdf_path, "rb") as f:
+            for info in PDFDocument(PDFParser(f)).info:
+                title = info.get("Title")
+                if hasattr(title, "resolve"):
+                    title = title.resolve()
+                if isinstance(title, bytes):
+                    title = decode_text(title)
+                if isinstance(title, str) and title.strip():
+                    return title.strip()
+    except Exception as e:
+        logger.debug("No document-info title for %s: %s", pdf_path, e)
+    return ""
+
+
+def convert_pdf(pdf_path: str) -> tuple:
+    """
+    MarkItDown conversion as a plain module-level function, so it can be sent
+    to a worker process. Returns ``(markdown_text, document_metadata)``.
+    """
+    from markitdown import MarkItDown  # ~1s import; deferred so workers and app startup stay light
+
+    result = MarkItDown().convert(pdf_path)
+    metadata = dict(getattr(result, "metadata", {}) or {})
+    if not metadata.get("title"):
+        title = getattr(result, "title", None) or pdf_info_title(pdf_path)
+        if title:
+            metadata["title"] = title
+    return result.text_content, metadata
+
+
+def heuristic_title(full_text: str, document_metadata: dict | None = None) -> str:
+    """
+    Best guess at the title without the LLM: the document-info title unless
+    it is a placeholder, else the first Markdown heading or the first line of
+    at least three words near the top. "" if nothing looks like a title.
+    """
+    title = ((document_metadata or {}).get("title") or "").strip()
+    if len(title.split()) >= 3 and not _PLACEHOLDER_TITLE.search(title):
+        return title
+    lines = [line.strip() for line in (full_text or "").split("\n")[:40] if line.strip()]
+    for line in lines:
+        match = _MARKDOWN_HEADING.match(line)
+        if match and len(match.group(1).split()) >= 3:
+            return match.group(1).strip("*_ ")
+    for line in lines:
+        if 3 <= len(line.split()) <= 30 and not line.lower().startswith(("arxiv:", "preprint", "http")):
+            return line.lstrip("#").strip("*_ ")
+    return ""
+
+
+def heuristic_abstract(full_text: str, max_chars: int = 1500) -> str:
+    """Text following an "Abstract" line near the top, up to the next heading-like line; "" if none."""
+    match = re.search(r"^[^\w\n]*abstract[^\w\n]*(.*)$", (full_text or "")[:20000], re.IGNORECASE | re.MULTILINE)
+    if not match:
+        return ""
+    lines = [match.group(1).strip()]
+    for line in full_text[match.end():match.end() + max_chars * 2].split("\n"):
+        line = line.strip()
+        if re.match(r"^(#+\s|(\d+|[IVX]+)\.?\s+[A-Z])", line):
+            break
+        lines.append(line)
+    return " ".join(line for line in lines if line)[:max_chars]
+
 
 class ParserAgent:
     def __init__(self):
@@ -35,83 +112,142 @@ class ParserAgent:
                 "If a field is missing, use empty string/list."
             )
         }
+        # Lean pipeline: one call returns the metadata above plus the validator's classification
+        self._lean_config = {
+            "name": "pdf_intake_agent",
+            "model_name": "gemini-2.5-flash-lite",
+            "description": "Extracts paper metadata and classifies whether the document is a research paper.",
+            "instruction": (
+                "You are a Metadata Extractor and PDF validation agent.\n"
+                "You will receive the first part of an uploaded PDF (in Markdown).\n"
+                "1. Extract the Title, the Abstract (full text), the Authors (list of strings)\n"
+                "   and the Keywords (list of strings). If a field is missing, use empty string/list.\n"
+                "2. Decide whether the document is an academic/research paper (e.g., conference or\n"
+                "   journal article). Consider structure (title, abstract, sections, references),\n"
+                "   terminology, and research artifacts (methods, experiments, citations).\n"
+                "   Categories: research_paper, non_academic_document (reports, slides, invoices,\n"
+                "   books, ...), unclear (not enough information to decide).\n"
+                "   Be strict: marketing brochures, resumes, or blank documents are not research papers.\n\n"
+                "Return a JSON object:\n"
+                "{\n"
+                "  'title': str,\n"
+                "  'abstract': str,\n"
+                "  'authors': [str, ...],\n"
+                "  'keywords': [str, ...],\n"
+                "  'validation': {\n"
+                "    'is_research_paper': bool,\n"
+                "    'category': 'research_paper' | 'non_academic_document' | 'unclear',\n"
+                "    'confidence': 'High' | 'Medium' | 'Low',\n"
+                "    'reason': 'Short explanation referencing evidence from the text'\n"
+                "  }\n"
+                "}"
+            )
+        }
+        # Per-call LLM policy (attempt timeout, hedging); RootAgent may override it
+        self.llm_options = {"timeout": None, "hedge": False}
+        # Executor for the CPU-bound conversion: None = a thread; the batch CLI sets a process pool
+        self.convert_executor = None
         # runner will be created on-demand with a new agent so we never reuse closed event loops
 
-    def _build_runner(self) -> InMemoryRunner:
+    def _build_runner(self):
         """Create a fresh runner each time to avoid reusing closed event loops."""
-        agent = LlmAgent(
-            name=self._agent_config["name"],
-            model=Gemini(model=self._agent_config["model_name"]),
-            description=self._agent_config["description"],
-            instruction=self._agent_config["instruction"],
-            tools=[],  # No tools needed, just text processing
+        return build_runner(self._agent_config, **structured.agent_options("METADATA"))
+
+    def _build_lean_runner(self):
+        """Runner for the combined metadata + classification call."""
+        return build_runner(self._lean_config, **structured.agent_options("INTAKE"))
+
+    def _build_prompt(self, full_text: str) -> str:
+        # We send the first 10k chars which usually covers Title, Abstract, Intro
+        prompt_text = full_text[:10000]
+        return (
+            "Here is the beginning of a research paper:\n"
+            "========================================\n"
+            f"{prompt_text}\n"
+            "========================================\n"
+            "Extract the metadata as JSON."
         )
-        return InMemoryRunner(agent=agent)
     
-    async def parse_pdf_async(self, pdf_path: str) -> dict:
+    def _build_lean_prompt(self, full_text: str) -> str:
+        # One sample serves both tasks: the validator's 20k window covers the metadata's 10k
+        prompt_text = full_text[:20000]
+        return (
+            "Here is the beginning of an uploaded PDF:\n"
+            "========================================\n"
+            f"{prompt_text}\n"
+            "========================================\n"
+            "Extract the metadata and classify the document as JSON."
+        )
+
+    @staticmethod
+    def _validation_from(metadata: dict):
+        """The classification embedded by the lean call, or None if it is missing or malformed."""
+        validation = metadata.pop('validation', None)
+        if not isinstance(validation, dict) or not isinstance(validation.get('is_research_paper'), bool):
+            return None
+        return validation
+
+    async def parse_pdf_async(self, pdf_path: str, classify: bool = False, on_text=None) -> dict:
         """
         Parse PDF to markdown and extract metadata (Async)
+
+        With ``classify=True`` (lean pipeline) the same LLM call also decides
+        whether the document is a research paper; the result then carries a
+        ``validation`` dict shaped like ``PaperValidationAgent``'s output, or
+        None if the model didn't return a usable classification.
+
+        ``on_text(full_text, document_metadata)`` is called as soon as the
+        conversion is done, before the LLM call, so the caller can start
+        work that only needs the text (see ``RootAgent``'s speculative search).
         """
-        # Initialize runner here to ensure it uses the current async loop
-        runner = self._build_runner()
         try:
-            print(f"\n{'='*60}")
-            print(f"🔍 PARSER AGENT - Starting PDF parsing")
-            print(f"{'='*60}")
-            print(f"📄 File: {pdf_path}")
+            logger.info("🔍 Parsing PDF %s", pdf_path)
             
             # 1. Deterministic Parsing with MarkItDown
-            md = MarkItDown()
-            result = md.convert(pdf_path)
-            full_text = result.text_content
+            # Off the event loop so stage deadlines can fire during long conversions
+            with tracing.span("pdf.convert", executor=type(self.convert_executor).__name__) as span:
+                convert = functools.partial(convert_pdf, pdf_path)
+                profile_path = tracing.profile_path()
+                if profile_path:
+                    # Profiled where it runs (worker thread or process), merged into the review's profile
+                    convert = functools.partial(tracing.run_profiled, profile_path, convert_pdf, pdf_path)
+                full_text, document_metadata = await asyncio.get_running_loop().run_in_executor(
+                    self.convert_executor, convert
+                )
+                span.set(chars=len(full_text or ""))
             
             if not full_text:
-                print("❌ PARSER AGENT - Failed to convert PDF to markdown (empty result)")
+                logger.error("❌ Failed to convert PDF to markdown (empty result)")
                 return {'error': 'Empty result from MarkItDown'}
                 
-            print(f"✅ PDF converted to Markdown ({len(full_text)} chars)")
-            
-            # 2. LLM Metadata Extraction
-            # We send the first 10k chars which usually covers Title, Abstract, Intro
-            prompt_text = full_text[:10000]
-            prompt = (
-                "Here is the beginning of a research paper:\n"
-                "========================================\n"
-                f"{prompt_text}\n"
-                "========================================\n"
-                "Extract the metadata as JSON."
-            )
-            
-            print(f"🔍 Extracting metadata with LLM...")
-            response_list = await runner.run_debug(prompt)
-            
-            # Extract final text
-            final_text = ""
-            for item in reversed(response_list):
-                if hasattr(item, "content") and item.content and item.content.parts:
-                    for part in item.content.parts:
-                        if hasattr(part, "text") and part.text:
-                            final_text = part.text
-                            break
-                if final_text:
-                    break
-            
-            if not final_text:
-                print("⚠️ PARSER AGENT - No response from LLM for metadata. Using basic fallback.")
-                metadata = {}
-            else:
-                # Parse JSON
+            logger.info("✅ PDF converted to Markdown (%d chars)", len(full_text))
+            if on_text:
                 try:
-                    if "```json" in final_text:
-                        final_text = final_text.split("```json")[1].split("```")[0].strip()
-                    elif "```" in final_text:
-                        final_text = final_text.split("```")[1].split("```")[0].strip()
-                    
-                    metadata = json.loads(final_text)
-                    print("✅ Metadata extracted successfully")
+                    on_text(full_text, document_metadata)
                 except Exception as e:
-                    print(f"⚠️ PARSER AGENT - JSON parsing failed: {e}. Using raw text fallback.")
-                    metadata = {}
+                    logger.warning("⚠️ on_text callback failed: %s", e)
+            
+            # 2. LLM Metadata Extraction (plus classification in lean mode)
+            if classify:
+                prompt, runner_factory, config = self._build_lean_prompt(full_text), self._build_lean_runner, self._lean_config
+                schema = schemas.INTAKE
+                logger.info("🔍 Extracting metadata and classifying the document with one LLM call")
+            else:
+                prompt, runner_factory, config = self._build_prompt(full_text), self._build_runner, self._agent_config
+                schema = schemas.METADATA
+                logger.info("🔍 Extracting metadata with LLM")
+            try:
+                metadata = await structured.generate(
+                    runner_factory, prompt, schema, model=config["model_name"], name=config["name"],
+                    llm_options=self.llm_options
+                )
+                logger.info("✅ Metadata extracted")
+            except structured.StructuredOutputError as e:
+                # Degrade: the heuristic fallbacks below still give the pipeline a title
+                logger.warning("⚠️ No usable metadata from the LLM (%s). Using basic fallback.", e)
+                metadata = {}
+
+            validation = self._validation_from(metadata) if classify else None
 
             # 3. Construct Final Result
             # Ensure we have at least a title from metadata or fallback
@@ -124,20 +260,23 @@ class ParserAgent:
                 metadata['abstract'] = "Abstract not found."
 
             # Combine
-            return {
+            parsed = {
                 'markdown': full_text,
                 'full_content': full_text, # Alias
                 'title': metadata.get('title'),
                 'abstract': metadata.get('abstract'),
                 'authors': metadata.get('authors', []),
                 'keywords': metadata.get('keywords', []),
-                'metadata': getattr(result, "metadata", {})
+                'metadata': document_metadata
             }
+            if classify:
+                parsed['validation'] = validation
+            return parsed
             
         except Exception as e:
-            print(f"❌ PARSER AGENT - Error: {str(e)}")
+            logger.exception("❌ PDF parsing failed: %s", e)
             return {'error': f'PDF parsing failed: {str(e)}'}
 
-    def parse_pdf(self, pdf_path: str) -> dict:
+    def parse_pdf(self, pdf_path: str, classify: bool = False, on_text=None) -> dict:
         """Synchronous wrapper for parse_pdf_async"""
-        return asyncio.run(self.parse_pdf_async(pdf_path))
+        return asyncio.run(self.parse_pdf_async(pdf_path, classify, on_text))
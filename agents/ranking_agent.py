@@ -2,10 +2,14 @@
 Ranking Agent - Ranks papers by relevance and quality
 """
 import json
+import logging
 import asyncio
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
+import os
+import re
+from . import schemas, structured, tracing
+from .llm_client import build_runner
+
+logger = logging.getLogger(__name__)
 
 class RankingAgent:
     def __init__(self):
@@ -25,6 +29,8 @@ class RankingAgent:
                 "2. For each paper, assign:\n"
                 "   - relevance_score: integer 1–10 (10 = perfectly on-topic).\n"
                 "   - quality_score: integer 1–10 (10 = strong venue + recent + technical).\n"
+                "     arXiv papers may carry 'journal_ref' / 'doi' (published venue), 'updated',\n"
+                "     'categories' and 'authors'; use them as quality evidence when present.\n"
                 "   - reason: 1–3 sentences explaining your scores.\n"
                 "3. Sort papers by relevance_score desc, then quality_score desc.\n\n"
                 "OUTPUT STRICTLY as a JSON object:\n"
@@ -36,115 +42,211 @@ class RankingAgent:
                 "      'url': str,\n"
                 "      'relevance_score': int,\n"
                 "      'quality_score': int,\n"
-                "      'reason': str,\n"
-                "      'original': object  # original paper dict as received\n"
+                "      'reason': str\n"
                 "    }\n"
                 "  ],\n"
                 "  'notes': str\n"
                 "}\n"
+                "Copy each paper's title and url exactly as received.\n"
                 "Do NOT invent new papers; only rank the ones provided."
             )
         }
+        # Light mode for mid-sized candidate sets: scores only, no reasons or echoed papers
+        self._light_config = {
+            "name": "paper_scoring_agent",
+            "model_name": "gemini-2.5-flash-lite",
+            "description": "Scores a short list of candidate papers for relevance and quality.",
+            "instruction": (
+                "You are a Paper Scoring Agent.\n"
+                "You receive the original user query and a numbered list of candidate papers\n"
+                "(title and snippet). For EVERY candidate assign:\n"
+                "   - relevance_score: integer 1–10 (10 = perfectly on-topic).\n"
+                "   - quality_score: integer 1–10 (10 = strong venue + recent + technical).\n\n"
+                "OUTPUT STRICTLY as a JSON object:\n"
+                "{ 'scores': [ { 'index': int, 'relevance_score': int, 'quality_score': int } ] }\n"
+                "Use the candidates' numbers as 'index'. No explanations."
+            )
+        }
+        # Up to this many candidates are scored with the light prompt; more get full ranking
+        self.light_max_candidates = int(os.getenv("RANKING_LIGHT_MAX", "12"))
+        # Per-call LLM policy (attempt timeout, hedging); RootAgent may override it
+        self.llm_options = {"timeout": None, "hedge": False}
         # runner will be created when ranking to avoid carrying event-loop-bound state
 
-    def _build_runner(self) -> InMemoryRunner:
-        agent = LlmAgent(
-            name=self._agent_config["name"],
-            model=Gemini(model=self._agent_config["model_name"]),
-            description=self._agent_config["description"],
-            instruction=self._agent_config["instruction"],
-            tools=[],
-            generate_content_config=None
-        )
-        return InMemoryRunner(agent=agent)
+    def _build_runner(self):
+        return build_runner(self._agent_config, **structured.agent_options("RANKING"))
     
-    async def rank_papers_async(self, user_query: str, papers: list, top_n: int = 5) -> list:
+    def _build_light_runner(self):
+        return build_runner(self._light_config, **structured.agent_options("SCORES"))
+
+    def choose_mode(self, candidates: int, top_n: int = 5) -> str:
         """
-        Rank papers by relevance and quality (Async)
+        How to rank ``candidates`` papers: 'local' when every one of them is kept
+        anyway, 'light' (scores only) for mid-sized sets, 'full' otherwise.
         """
-        # Initialize runner here to ensure it uses the current async loop
-        runner = self._build_runner()
-        if not papers:
-            return []
-            
-        # Construct the prompt
+        if candidates <= top_n:
+            return 'local'
+        if candidates <= self.light_max_candidates:
+            return 'light'
+        return 'full'
+
+    def _build_light_prompt(self, user_query: str, papers: list) -> str:
+        """Numbered titles and short snippets; far fewer tokens than the full finder JSON."""
+        candidates = "\n".join(
+            f"[{index}] {paper.get('title', '')}\n    {(paper.get('snippet') or paper.get('content') or '')[:300]}"
+            for index, paper in enumerate(papers)
+        )
+        return (
+            f"User query:\n{user_query}\n\n"
+            f"Candidates:\n{candidates}\n\n"
+            "Score every candidate as instructed."
+        )
+
+    def _build_prompt(self, user_query: str, papers: list) -> str:
+        """Serialize the finder candidates into the ranking prompt."""
         finder_output = json.dumps({"papers": papers}, indent=2)
-        prompt = (
+        return (
             f"User query:\n{user_query}\n\n"
             "Here is the JSON output from paper_finder_agent:\n"
             f"{finder_output}\n\n"
             "Please rank these papers as instructed."
         )
-        
+
+    @staticmethod
+    def _with_originals(ranked: list, papers: list) -> list:
+        """
+        Ranked entries with the candidate each one refers to as ``original``
+        (matched by URL, then title) and consecutive ranks; entries that match
+        no candidate were made up and are dropped.
+        """
+        by_url = {paper['url']: paper for paper in papers if paper.get('url')}
+        by_title = {paper['title'].strip().lower(): paper for paper in papers if paper.get('title')}
+        matched = []
+        for entry in ranked:
+            paper = by_url.get(entry['url']) or by_title.get(entry['title'].strip().lower())
+            if paper is None:
+                logger.warning("⚠️ Ranking returned a paper that wasn't a candidate: %.80s", entry['title'])
+                continue
+            matched.append({**entry, 'rank': len(matched) + 1, 'original': paper})
+        return matched
+
+    @staticmethod
+    def _local_quality(paper: dict) -> int:
+        """1-10 quality estimate from bibliographic metadata the finder collected."""
+        score = 5
+        if paper.get('source') == 'arxiv':
+            score += 1
+        if paper.get('journal_ref') or paper.get('doi'):
+            score += 1  # Appeared in a journal or proceedings
+        return score
+
+    def rank_locally(self, user_query: str, papers: list, top_n: int = 5, reason: str = "Ranked locally by keyword overlap with the paper title.") -> list:
+        """
+        Rank papers without the LLM by term overlap with the query (title hits weigh double)
+
+        Returns entries in the same shape as the LLM ranking so downstream
+        stages can't tell the difference.
+        """
+        with tracing.span("rank.local", profile=True, candidates=len(papers)):
+            return self._rank_locally(user_query, papers, top_n, reason)
+
+    def _rank_locally(self, user_query: str, papers: list, top_n: int, reason: str) -> list:
+        query_terms = {w for w in re.findall(r"[a-z0-9]+", (user_query or "").lower()) if len(w) > 2}
+        scored = []
+        for index, paper in enumerate(papers):
+            title_terms = set(re.findall(r"[a-z0-9]+", (paper.get('title') or '').lower()))
+            body_terms = set(re.findall(r"[a-z0-9]+", (paper.get('snippet') or paper.get('content') or '').lower()))
+            if query_terms:
+                overlap = (2 * len(query_terms & title_terms) + len(query_terms & body_terms)) / (3 * len(query_terms))
+            else:
+                overlap = 0.0
+            # Ties go to the better-published paper, then keep the finder's order
+            scored.append((overlap, self._local_quality(paper), -index, paper))
+        scored.sort(key=lambda item: item[:3], reverse=True)
+
+        ranked = []
+        for rank, (overlap, quality, _, paper) in enumerate(scored[:top_n], start=1):
+            ranked.append({
+                'rank': rank,
+                'title': paper.get('title', ''),
+                'url': paper.get('url', ''),
+                'relevance_score': max(1, min(10, round(1 + 9 * overlap))),
+                'quality_score': quality,
+                'reason': reason,
+                'original': paper
+            })
+        return ranked
+    
+    async def score_papers_async(self, user_query: str, papers: list, top_n: int = 5) -> list:
+        """
+        Light ranking: the LLM only returns scores, and the ranked entries (same
+        shape as full ranking) are assembled locally. [] if the call fails.
+        """
+        prompt = self._build_light_prompt(user_query, papers)
         try:
-            print(f"\n{'='*60}")
-            print(f"🏆 RANKING AGENT - Starting paper ranking (LLM-driven)")
-            print(f"{'='*60}")
-            
-            response_list = await runner.run_debug(prompt)
-            
-            # Debug logging
-            print(f"DEBUG: Received {len(response_list)} items in response_list")
-            
-            # Extract final text
-            final_text = ""
-            for item in reversed(response_list):
-                if hasattr(item, "content") and item.content and item.content.parts:
-                    part_text = ""
-                    for part in item.content.parts:
-                        if hasattr(part, "text") and part.text:
-                            part_text += part.text
-                    if part_text:
-                        final_text = part_text
-                        break
-            
-            print(f"DEBUG: Final text extracted: {final_text[:200]}...")
-            
-            if not final_text:
-                print("❌ RANKING AGENT - No text response from LLM")
+            logger.info("🏆 Scoring %d papers (light mode)", len(papers))
+            try:
+                data = await structured.generate(
+                    self._build_light_runner, prompt, schemas.SCORES, model=self._light_config["model_name"],
+                    name=self._light_config["name"], llm_options=self.llm_options
+                )
+            except structured.StructuredOutputError:
                 return []
 
-            # Parse JSON
-            try:
-                cleaned_text = final_text.replace('\xa0', ' ').strip()
-                if "```json" in cleaned_text:
-                    cleaned_text = cleaned_text.split("```json", 1)[1]
-                    cleaned_text = cleaned_text.split("```", 1)[0].strip()
-                elif "```" in cleaned_text:
-                    cleaned_text = cleaned_text.split("```", 1)[1]
-                    cleaned_text = cleaned_text.split("```", 1)[0].strip()
-                else:
-                    start = cleaned_text.find('{')
-                    end = cleaned_text.rfind('}') + 1
-                    if start != -1 and end > start:
-                        cleaned_text = cleaned_text[start:end]
-                cleaned_text = cleaned_text.rstrip(';').rstrip()
-
-                data = json.loads(cleaned_text)
-            except json.JSONDecodeError:
-                print(f"❌ RANKING AGENT - Failed to parse JSON. Raw text: {final_text[:500]}")
-                # Fallback
-                import re
-                import ast
-                try:
-                    match = re.search(r'\{.*\}', final_text, re.DOTALL)
-                    if match:
-                        data = ast.literal_eval(match.group(0))
-                    else:
-                        raise ValueError("No JSON object found")
-                except Exception as e2:
-                    print(f"❌ RANKING AGENT - JSON fallback failed: {str(e2)}")
-                    return []
+            scored = {}
+            for entry in data['scores']:
+                index = int(entry['index'])
+                relevance, quality = int(entry['relevance_score']), int(entry['quality_score'])
+                if 0 <= index < len(papers):
+                    scored.setdefault(index, (relevance, quality))
+            order = sorted(scored, key=lambda index: (-scored[index][0], -scored[index][1], index))
+            return [
+                {
+                    'rank': rank,
+                    'title': papers[index].get('title', ''),
+                    'url': papers[index].get('url', ''),
+                    'relevance_score': scored[index][0],
+                    'quality_score': scored[index][1],
+                    'reason': 'Scored by the LLM in light mode (short candidate list).',
+                    'original': papers[index]
+                }
+                for rank, index in enumerate(order[:top_n], start=1)
+            ]
+        except Exception as e:
+            logger.exception("Error scoring papers: %s", e)
+            return []
+
+    async def rank_papers_async(self, user_query: str, papers: list, top_n: int = 5, mode: str = 'full') -> list:
+        """
+        Rank papers by relevance and quality (Async)
+
+        ``mode='light'`` uses the scores-only prompt (see ``choose_mode``).
+        """
+        if not papers:
+            return []
+        if mode == 'light':
+            return await self.score_papers_async(user_query, papers, top_n)
+            
+        prompt = self._build_prompt(user_query, papers)
+        
+        try:
+            logger.info("🏆 Ranking %d papers (LLM-driven)", len(papers))
             
-            ranked_papers = data.get('ranked_papers', [])
+            try:
+                data = await structured.generate(
+                    self._build_runner, prompt, schemas.RANKING, model=self._agent_config["model_name"],
+                    name=self._agent_config["name"], llm_options=self.llm_options
+                )
+            except structured.StructuredOutputError:
+                return []
             
             # Return top N
-            return ranked_papers[:top_n]
+            return self._with_originals(data['ranked_papers'], papers)[:top_n]
             
         except Exception as e:
-            print(f"Error ranking papers: {str(e)}")
+            logger.exception("Error ranking papers: %s", e)
             return []
 
-    def rank_papers(self, user_query: str, papers: list, top_n: int = 5) -> list:
+    def rank_papers(self, user_query: str, papers: list, top_n: int = 5, mode: str = 'full') -> list:
         """Synchronous wrapper"""
-        return asyncio.run(self.rank_papers_async(user_query, papers, top_n))
+        return asyncio.run(self.rank_papers_async(user_query, papers, top_n, mode))
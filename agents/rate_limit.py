@@ -0,0 +1,355 @@
+"""
+Rate Limiting - Process-wide (optionally cross-process) governors for Gemini, Tavily and arXiv
+
+Every outbound call goes through a ``BackendLimiter``: a token bucket that spaces
+requests out (callers reserve the next free slot, so bursts queue up in arrival
+order instead of all firing at once) plus a semaphore capping in-flight calls.
+Transient failures (429 / 5xx / connection errors) are retried with jittered
+exponential backoff, so bursts slow reviews down instead of failing them.
+
+Limits are read from the environment on first use:
+
+    GEMINI_RPM=60            requests/minute per Gemini model
+    GEMINI_RPM_<MODEL>=...   per-model override, e.g. GEMINI_RPM_GEMINI_2_5_FLASH_LITE
+    GEMINI_MAX_CONCURRENCY=8
+    TAVILY_RPM=60
+    TAVILY_MAX_CONCURRENCY=4
+    ARXIV_MIN_INTERVAL=3     seconds between arXiv requests (their API guidance)
+    <BACKEND>_MAX_RETRIES=4
+
+Set ``RATE_LIMIT_DIR`` to a shared directory to coordinate every process on the
+host (gunicorn workers, CLI runs) through lock files instead of in-memory state.
+
+Callers running as a ``batch`` job (see ``jobs``) yield to ``interactive``
+ones: they don't book future slots, and they wait while an interactive
+caller is queued for the same limiter in this process. Waits and retries of
+a cancelled job stop with ``JobCancelled``.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process mode unavailable, in-process limits still apply
+    fcntl = None
+
+from . import jobs
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DEFAULTS = {
+    "gemini": {"rpm": 60, "max_concurrency": 8, "max_retries": 4, "base_delay": 2.0, "max_delay": 60.0},
+    "tavily": {"rpm": 60, "max_concurrency": 4, "max_retries": 3, "base_delay": 1.0, "max_delay": 20.0},
+    "arxiv": {"min_interval": 3.0, "max_concurrency": 1, "max_retries": 3, "base_delay": 3.0, "max_delay": 30.0},
+}
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_MARKERS = ("resource_exhausted", "too many requests", "rate limit", "unavailable", "overloaded", "deadline exceeded")
+RETRYABLE_EXCEPTIONS = ("ConnectionError", "Timeout", "TimeoutError", "ReadTimeout", "ConnectTimeout", "UsageLimitExceededError", "ServerError")
+
+_POLL_INTERVAL = 0.05
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``reserve`` returns how long the caller must wait for its token."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        return self._take(book=True)
+
+    def take_now(self) -> float:
+        """Take a token only if one is free now: 0.0 if taken, else roughly how long until one is."""
+        return self._take(book=False)
+
+    def _take(self, book: bool) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1 and not book:
+                return (1 - self._tokens) / self.rate
+            # Going negative books a future slot, so concurrent callers queue in order
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class FileTokenBucket(TokenBucket):
+    """Token bucket whose state lives in a lock-protected file shared by every process."""
+
+    def __init__(self, rate: float, capacity: float, path: str):
+        super().__init__(rate, capacity)
+        self.path = path
+
+    def _take(self, book: bool) -> float:
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                now = time.time()
+                tokens = state.get("tokens", self.capacity)
+                updated = state.get("updated", now)
+                tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+                if tokens < 1 and not book:
+                    return (1 - tokens) / self.rate
+                tokens -= 1
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({"tokens": tokens, "updated": now}))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return 0.0 if tokens >= 0 else -tokens / self.rate
+
+
+class ConcurrencySlots:
+    """Caps in-flight calls within this process."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def try_acquire(self):
+        return True if self._semaphore.acquire(blocking=False) else None
+
+    def release(self, handle):
+        self._semaphore.release()
+
+
+class FileConcurrencySlots(ConcurrencySlots):
+    """Caps in-flight calls across processes with one ``flock``-ed file per slot."""
+
+    def __init__(self, limit: int, prefix: str):
+        super().__init__(limit)
+        self.paths = [f"{prefix}.slot{i}" for i in range(limit)]
+
+    def try_acquire(self):
+        for path in self.paths:
+            f = open(path, "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except OSError:
+                f.close()
+        return None
+
+    def release(self, handle):
+        try:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        finally:
+            handle.close()
+
+
+class BackendLimiter:
+    """Rate + concurrency governor and retry policy for one backend (or one model)."""
+
+    def __init__(self, name: str, rate: float, max_concurrency: int, max_retries: int,
+                 base_delay: float, max_delay: float, shared_dir: str | None = None):
+        self.name = name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        if shared_dir and fcntl:
+            os.makedirs(shared_dir, exist_ok=True)
+            prefix = os.path.join(shared_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", name))
+            self.bucket = FileTokenBucket(rate, 1.0, f"{prefix}.bucket")
+            self.slots = FileConcurrencySlots(max_concurrency, prefix)
+        else:
+            self.bucket = TokenBucket(rate, 1.0)
+            self.slots = ConcurrencySlots(max_concurrency)
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "queued_seconds": 0.0,
+                      "interactive_waiting": 0, "batch_deferrals": 0}
+
+    def _count(self, key: str, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for retry ``attempt`` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _batch_wait(self) -> float:
+        """
+        0.0 once a batch caller may go (token taken, no interactive caller
+        queued), else how long to wait before trying again
+        """
+        if self.stats["interactive_waiting"]:
+            self._count("batch_deferrals")
+            return _POLL_INTERVAL
+        wait = self.bucket.take_now()
+        return max(wait, _POLL_INTERVAL) if wait else 0.0
+
+    def acquire(self):
+        """Block until a rate token and a concurrency slot are available; returns the slot handle."""
+        started = time.monotonic()
+        jobs.check_cancelled()
+        interactive = jobs.current_priority() == jobs.INTERACTIVE
+        if interactive:
+            self._count("interactive_waiting")
+        try:
+            if interactive:
+                wait = self.bucket.reserve()
+                if wait:
+                    jobs.sleep(wait)
+            else:
+                while (wait := self._batch_wait()):
+                    jobs.sleep(wait)
+            handle = self.slots.try_acquire()
+            while handle is None:
+                jobs.sleep(_POLL_INTERVAL)
+                handle = self.slots.try_acquire()
+        finally:
+            if interactive:
+                self._count("interactive_waiting", -1)
+        self._count("queued_seconds", time.monotonic() - started)
+        return handle
+
+    async def acquire_async(self):
+        """Async ``acquire``; polls instead of blocking so cancellation never leaks a slot."""
+        started = time.monotonic()
+        interactive = jobs.current_priority() == jobs.INTERACTIVE
+        if interactive:
+            self._count("interactive_waiting")
+        try:
+            if interactive:
+                wait = self.bucket.reserve()
+                if wait:
+                    await asyncio.sleep(wait)
+            else:
+                while (wait := self._batch_wait()):
+                    await asyncio.sleep(wait)
+            handle = self.slots.try_acquire()
+            while handle is None:
+                await asyncio.sleep(_POLL_INTERVAL)
+                handle = self.slots.try_acquire()
+        finally:
+            if interactive:
+                self._count("interactive_waiting", -1)
+        self._count("queued_seconds", time.monotonic() - started)
+        return handle
+
+    def call(self, func, *args, **kwargs):
+        """Run ``func`` under the limiter, retrying transient failures."""
+        attempt = 0
+        while True:
+            handle = self.acquire()
+            self._count("calls")
+            try:
+                return func(*args, **kwargs)
+            except Exception as exc:
+                attempt += 1
+                if attempt > self.max_retries or not is_retryable(exc):
+                    self._count("failures")
+                    raise
+                delay = self.backoff(attempt)
+                self._count("retries")
+                logger.warning(
+                    "⏳ %s transient error (%s); retry %d/%d in %.1fs",
+                    self.name, exc.__class__.__name__, attempt, self.max_retries, delay
+                )
+            finally:
+                self.slots.release(handle)
+            jobs.sleep(delay)
+
+    async def call_async(self, coro_factory):
+        """Await ``coro_factory()`` under the limiter, retrying transient failures with a fresh coroutine."""
+        attempt = 0
+        while True:
+            handle = await self.acquire_async()
+            self._count("calls")
+            try:
+                return await coro_factory()
+            except Exception as exc:
+                attempt += 1
+                if attempt > self.max_retries or not is_retryable(exc):
+                    self._count("failures")
+                    raise
+                delay = self.backoff(attempt)
+                self._count("retries")
+                logger.warning(
+                    "⏳ %s transient error (%s); retry %d/%d in %.1fs",
+                    self.name, exc.__class__.__name__, attempt, self.max_retries, delay
+                )
+            finally:
+                self.slots.release(handle)
+            await asyncio.sleep(delay)
+
+
+def is_retryable(exc: Exception) -> bool:
+    """True for rate-limit, overload, timeout and connection failures from any of the SDKs we use."""
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int) and value in RETRYABLE_STATUS:
+            return True
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) in RETRYABLE_STATUS:
+        return True
+    if any(cls.__name__ in RETRYABLE_EXCEPTIONS for cls in type(exc).__mro__):
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in RETRYABLE_MARKERS) or message.startswith("429")
+
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning("⚠️ Ignoring invalid %s=%r", name, value)
+        return default
+
+
+_limiters = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(backend: str, model: str | None = None) -> BackendLimiter:
+    """Return the shared limiter for ``backend`` (and ``model`` for Gemini), creating it on first use."""
+    key = f"{backend}:{model}" if model else backend
+    with _registry_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            defaults = BACKEND_DEFAULTS[backend]
+            prefix = backend.upper()
+            if "min_interval" in defaults:
+                rate = 1.0 / max(_env_number(f"{prefix}_MIN_INTERVAL", defaults["min_interval"]), 1e-3)
+            else:
+                rpm = _env_number(f"{prefix}_RPM", defaults["rpm"])
+                if model:
+                    rpm = _env_number(f"{prefix}_RPM_{re.sub(r'[^A-Z0-9]', '_', model.upper())}", rpm)
+                rate = max(rpm, 1e-3) / 60.0
+            limiter = BackendLimiter(
+                name=key,
+                rate=rate,
+                max_concurrency=max(1, int(_env_number(f"{prefix}_MAX_CONCURRENCY", defaults["max_concurrency"]))),
+                max_retries=int(_env_number(f"{prefix}_MAX_RETRIES", defaults["max_retries"])),
+                base_delay=defaults["base_delay"],
+                max_delay=defaults["max_delay"],
+                shared_dir=os.getenv("RATE_LIMIT_DIR") or None,
+            )
+            _limiters[key] = limiter
+        return limiter
+
+
+def limiter_stats() -> dict:
+    """Per-limiter call/retry/failure counters and cumulative queueing time."""
+    with _registry_lock:
+        return {key: dict(limiter.stats) for key, limiter in _limiters.items()}
@@ -1,12 +1,72 @@
 """
 Reviewer Agent - Generates comprehensive paper reviews
 """
+import functools
 import json
+import logging
 import asyncio
+import os
+import time
 from datetime import datetime
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
+from . import jobs, revisions, schemas, structured, tracing
+from .ensemble import aggregate_reviews
+from .json_stream import IncrementalJSONObjectParser
+from .llm_client import build_runner, run_prompt, stream_prompt
+
+logger = logging.getLogger(__name__)
+
+# Extra instruction per ensemble persona; 'balanced' is the plain reviewer
+ENSEMBLE_PERSONAS = {
+    "balanced": "",
+    "methodologist": (
+        "Weigh methodology most heavily: experimental design, baselines, ablations, statistical "
+        "rigor and reproducibility. Be specific about which missing experiment would change your mind."
+    ),
+    "novelty": (
+        "Weigh novelty and positioning most heavily: compare each claimed contribution against the "
+        "ranked references and state plainly which ones are incremental."
+    ),
+    "clarity": (
+        "Weigh clarity most heavily: structure, notation, figures and whether the claims can be "
+        "followed and checked from the text alone."
+    ),
+    "skeptic": (
+        "Act as the most skeptical member of the committee: look for overstated claims, confounds "
+        "and evaluation shortcuts before crediting strengths."
+    ),
+}
+# Temperature for repeated samples of the same persona (the first sample keeps the model default)
+SAMPLE_TEMPERATURE = 1.0
+
+
+def ensemble_variants(spec) -> list:
+    """
+    Reviewer variants from ``spec``: a list or comma-separated string of
+    persona names, where ``persona*N`` means N samples of that persona
+    (e.g. ``"balanced*3"`` or ``"balanced,methodologist,novelty"``).
+
+    Repeats of a persona are sampled at ``SAMPLE_TEMPERATURE`` so they differ.
+    Unknown personas are skipped with a warning.
+    """
+    names = spec.split(",") if isinstance(spec, str) else list(spec or [])
+    variants, seen = [], {}
+    for entry in names:
+        persona, _, count = str(entry).strip().partition("*")
+        persona = persona.strip().lower()
+        if not persona:
+            continue
+        if persona not in ENSEMBLE_PERSONAS:
+            logger.warning("⚠️ Unknown reviewer persona '%s'; expected one of %s", persona, sorted(ENSEMBLE_PERSONAS))
+            continue
+        for _ in range(max(1, int(count)) if count.strip().isdigit() else 1):
+            seen[persona] = seen.get(persona, 0) + 1
+            repeat = seen[persona]
+            variants.append({
+                "name": persona if repeat == 1 else f"{persona}#{repeat}",
+                "persona": persona,
+                "temperature": None if repeat == 1 else SAMPLE_TEMPERATURE,
+            })
+    return variants
 
 
 class ReviewerAgent:
@@ -94,110 +154,342 @@ class ReviewerAgent:
                 "- Do NOT use Markdown bold markers (**) or other formatting characters inside any section; rely on sentences with leading phrases for emphasis.\n"
             )
         }
+        # Revised manuscripts: only the comments the changed sections affect are rewritten
+        self._revision_config = {
+            "name": "revision_reviewer_agent",
+            "model_name": self._agent_config["model_name"],
+            "description": "Updates an earlier review of a paper for a revised version of the manuscript.",
+            "instruction": (
+                "You are an Assistant Reviewer re-reviewing a REVISED version of a research paper.\n\n"
+                "INPUT YOU WILL RECEIVE:\n"
+                "1. The paper's title and abstract (revised version).\n"
+                "2. Your previous review of the earlier version, as JSON.\n"
+                "3. The sections that changed: for each, its status (changed, added, removed) with the previous and the revised text.\n"
+                "4. The names of the sections that did not change.\n"
+                "5. The ranked reference papers the previous review was grounded in.\n\n"
+                "YOUR JOB:\n"
+                "- Judge only what the revision changed; the previous review stands for unchanged sections.\n"
+                "- Decide which previous weaknesses and questions the revision addresses, and whether it introduces new problems.\n"
+                "- Rewrite the detailed comments ONLY for the review sections listed as affected, in the same dense, "
+                "evidence-based paragraph style as before.\n"
+                "- Update strengths, weaknesses and questions: keep those that still apply, drop those that were resolved, add new ones.\n"
+                "- Reconsider the overall assessment in light of the changes.\n\n"
+                "OUTPUT FORMAT (VERY IMPORTANT):\n"
+                "Return a single JSON object with this exact structure:\n"
+                "{\n"
+                "  'changes_summary': str,          # What changed since the last version and how it affects the assessment\n"
+                "  'addressed_concerns': [str, ...],  # Previous weaknesses/questions the revision resolves\n"
+                "  'strengths': [str, ...],\n"
+                "  'weaknesses': [str, ...],\n"
+                "  'questions': [str, ...],\n"
+                "  'detailed_comments': {str: str},  # Only the affected sections, keyed by their exact names\n"
+                "  'overall_assessment': {\n"
+                "    'recommendation': str,\n"
+                "    'confidence': str,\n"
+                "    'justification': str\n"
+                "  }\n"
+                "}\n"
+                "You may also return 'summary' or 'related_work_analysis' if the revision makes the previous ones inaccurate.\n\n"
+                "GUIDELINES:\n"
+                "- Do NOT fabricate new references beyond the provided ranked list.\n"
+                "- Do NOT use Markdown bold markers (**) or other formatting characters inside any section.\n"
+                "- Maintain the critical, professional tone of a reviewer for a high-impact journal.\n"
+            )
+        }
+        # Per-call LLM policy (attempt timeout, hedging); RootAgent may override it
+        self.llm_options = {"timeout": None, "hedge": False}
+        # Ensemble: once the first variant is done, stragglers get this fraction of its latency on top
+        self.ensemble_grace = float(os.getenv("ENSEMBLE_GRACE", "0.5"))
         # runner will be built per review request
 
-    def _build_runner(self) -> InMemoryRunner:
-        agent = LlmAgent(
-            name=self._agent_config["name"],
-            model=Gemini(model=self._agent_config["model_name"]),
-            description=self._agent_config["description"],
-            instruction=self._agent_config["instruction"],
-            tools=[]
+    def _build_runner(self):
+        return build_runner(self._agent_config, **structured.agent_options("REVIEW"))
+
+    def _build_revision_runner(self):
+        return build_runner(self._revision_config, **structured.agent_options("REVISION"))
+
+    def _variant_config(self, persona: str) -> dict:
+        focus = ENSEMBLE_PERSONAS[persona]
+        if not focus:
+            return self._agent_config
+        return {
+            **self._agent_config,
+            "name": f"{self._agent_config['name']}_{persona}",
+            "instruction": f"{self._agent_config['instruction']}\nREVIEWER FOCUS:\n- {focus}\n",
+        }
+
+    def _build_variant_runner(self, variant: dict):
+        options = {} if variant.get("temperature") is None else {"temperature": variant["temperature"]}
+        return build_runner(
+            self._variant_config(variant["persona"]),
+            **structured.agent_options("REVIEW", **options)
         )
-        return InMemoryRunner(agent=agent)
     
-    async def generate_review_async(self, paper_data: dict, related_papers: list) -> dict:
+    def _build_prompt(self, paper_data: dict, related_papers: list) -> str:
+        """Assemble the reviewer prompt from the parsed paper and the ranked references."""
+        # Prepare context
+        title = paper_data.get('title', 'Unknown Title')
+        abstract = paper_data.get('abstract', '')
+        full_content = paper_data.get('full_content', '')
+        
+        # Format uploaded paper markdown
+        uploaded_paper_md = f"# {title}\n\n## Abstract\n{abstract}\n\n## Content\n{full_content[:20000]}" # Truncate if too huge
+        
+        # Format ranked papers JSON
+        ranked_papers_json = json.dumps({"ranked_papers": related_papers}, indent=2)
+        
+        return (
+            f"User Topic: {title}\n\n"
+            "UPLOADED PAPER (Markdown):\n"
+            f"{uploaded_paper_md}\n\n"
+            "RANKED REFERENCE PAPERS (JSON):\n"
+            f"{ranked_papers_json}\n\n"
+            "Please generate the review as instructed."
+        )
+
+    def _build_revision_prompt(self, paper_data: dict, related_papers: list, previous_review: dict,
+                               revision: dict, changes: list) -> str:
+        """Previous review plus only the changed sections; unchanged text is named, not resent."""
+        kept = {key: previous_review.get(key) for key in (
+            'summary', 'strengths', 'weaknesses', 'questions', 'detailed_comments', 'overall_assessment'
+        )}
+        changed = "\n\n".join(
+            f"### {name} ({status})\n"
+            f"PREVIOUS:\n{old or '(none)'}\n\n"
+            f"REVISED:\n{new or '(removed)'}"
+            for name, status, old, new in changes
+        )
+        unchanged = [section['name'] for section in revision['sections'] if section['status'] == 'unchanged']
+        references = json.dumps(
+            [{"rank": paper.get("rank"), "title": paper.get("title"), "url": paper.get("url")} for paper in related_papers],
+            indent=2
+        )
+        return (
+            f"Title: {paper_data.get('title', 'Unknown Title')}\n\n"
+            f"Abstract:\n{paper_data.get('abstract', '')}\n\n"
+            "PREVIOUS REVIEW (JSON):\n"
+            f"{json.dumps(kept, indent=2)}\n\n"
+            "CHANGED SECTIONS:\n"
+            f"{changed}\n\n"
+            f"UNCHANGED SECTIONS: {', '.join(unchanged) or '(none)'}\n\n"
+            f"AFFECTED REVIEW SECTIONS: {', '.join(revision['review_sections']) or '(none)'}\n\n"
+            "RANKED REFERENCE PAPERS (JSON):\n"
+            f"{references}\n\n"
+            "Please update the review as instructed."
+        )
+
+    async def generate_review_async(self, paper_data: dict, related_papers: list, on_section=None) -> dict:
         """
         Generate comprehensive review (Async)
+
+        Args:
+            paper_data: Parsed paper from the parser agent
+            related_papers: Ranked reference papers
+            on_section: Optional ``callback(key, value)``. When given, the
+                generation is streamed and each top-level review section
+                (summary, strengths, ...) is published as soon as it closes.
         """
-        # Initialize runner here to ensure it uses the current async loop
-        runner = self._build_runner()
         try:
-            print(f"\n{'='*60}")
-            print(f"✍️  REVIEWER AGENT - Starting review generation (LLM-driven)")
-            print(f"{'='*60}")
-            
-            # Prepare context
-            title = paper_data.get('title', 'Unknown Title')
-            abstract = paper_data.get('abstract', '')
-            full_content = paper_data.get('full_content', '')
-            
-            # Format uploaded paper markdown
-            uploaded_paper_md = f"# {title}\n\n## Abstract\n{abstract}\n\n## Content\n{full_content[:20000]}" # Truncate if too huge
-            
-            # Format ranked papers JSON
-            ranked_papers_json = json.dumps({"ranked_papers": related_papers}, indent=2)
-            
-            prompt = (
-                f"User Topic: {title}\n\n"
-                "UPLOADED PAPER (Markdown):\n"
-                f"{uploaded_paper_md}\n\n"
-                "RANKED REFERENCE PAPERS (JSON):\n"
-                f"{ranked_papers_json}\n\n"
-                "Please generate the review as instructed."
-            )
+            logger.info("✍️ Generating review (LLM-driven)")
             
-            response_list = await runner.run_debug(prompt)
+            with tracing.span("prompt.build", profile=True, agent=self._agent_config["name"]) as span:
+                prompt = self._build_prompt(paper_data, related_papers)
+                span.set(chars=len(prompt))
             
-            # Debug logging
-            print(f"DEBUG: Received {len(response_list)} items in response_list")
+            stream_parser = None
+            streamed = {}
+            if on_section:
+                stream_parser = IncrementalJSONObjectParser()
+
+                def on_text(delta):
+                    for key, value in stream_parser.feed(delta):
+                        streamed[key] = value
+                        on_section(key, value)
+
+                def on_restart():
+                    nonlocal stream_parser
+                    stream_parser = IncrementalJSONObjectParser()
+
+                response_list = await stream_prompt(
+                    self._build_runner, prompt, model=self._agent_config["model_name"],
+                    on_text=on_text, on_restart=on_restart, timeout=self.llm_options.get("timeout")
+                )
+            else:
+                response_list = await run_prompt(self._build_runner, prompt, model=self._agent_config["model_name"], **self.llm_options)
             
-            # Extract final text
-            final_text = ""
-            for item in reversed(response_list):
-                if hasattr(item, "content") and item.content and item.content.parts:
-                    for part in item.content.parts:
-                        if hasattr(part, "text") and part.text:
-                            final_text = part.text
-                            break
-                if final_text:
-                    break
+            final_text = structured.response_text(response_list)
             
-            print(f"DEBUG: Final text extracted: {final_text[:200]}...")
+            if not final_text and stream_parser:
+                final_text = stream_parser.buffer
             
-            if not final_text:
-                print("❌ REVIEWER AGENT - No text response from LLM")
-                return {'error': 'No response from LLM'}
-
-            # Parse JSON
             try:
-                final_text = final_text.replace('\xa0', ' ').strip()
-                if "```json" in final_text:
-                    final_text = final_text.split("```json", 1)[1]
-                    final_text = final_text.split("```", 1)[0].strip()
-                elif "```" in final_text:
-                    final_text = final_text.split("```", 1)[1]
-                    final_text = final_text.split("```", 1)[0].strip()
-                else:
-                    brace_start = final_text.find('{')
-                    brace_end = final_text.rfind('}') + 1
-                    if brace_start != -1 and brace_end > brace_start:
-                        final_text = final_text[brace_start:brace_end]
-                final_text = final_text.rstrip(';').rstrip()
-
-                review = json.loads(final_text)
-            except json.JSONDecodeError:
-                print(f"❌ REVIEWER AGENT - Failed to parse JSON. Raw text: {final_text[:500]}")
-                # Fallback
-                import re
-                import ast
-                try:
-                    match = re.search(r'\{.*\}', final_text, re.DOTALL)
-                    if match:
-                        review = ast.literal_eval(match.group(0))
-                    else:
-                        raise ValueError("No JSON object found")
-                except Exception as e2:
-                    return {'error': f'Failed to parse JSON response: {str(e2)}'}
+                review = await structured.generate(
+                    self._build_runner, prompt, schemas.REVIEW, model=self._agent_config["model_name"],
+                    name=self._agent_config["name"], llm_options=self.llm_options, text=final_text
+                )
+            except structured.StructuredOutputError as e2:
+                return {'error': f'Failed to parse JSON response: {str(e2)}'}
+            if on_section:
+                # A repaired answer replaces whatever was streamed
+                for key, value in review.items():
+                    if streamed.get(key) != value:
+                        on_section(key, value)
             
             review['generated_at'] = datetime.now().isoformat()
             
             return review
             
         except Exception as e:
-            print(f"❌ REVIEWER AGENT - Error: {str(e)}")
+            logger.exception("❌ Review generation failed: %s", e)
             return {'error': f'Review generation failed: {str(e)}'}
 
-    def generate_review(self, paper_data: dict, related_papers: list) -> dict:
+    async def generate_revision_async(self, paper_data: dict, related_papers: list, previous_review: dict,
+                                      revision: dict, basis: dict, on_section=None) -> dict:
+        """
+        Update ``previous_review`` for a revised manuscript
+
+        Only the changed sections (see ``revisions.compare``) are sent, with
+        the previous review. Detailed comments are replaced for the affected
+        review sections only; the rest of the previous review is kept. The
+        result adds ``changes_since_last_version`` and ``addressed_concerns``.
+
+        Args:
+            on_section: Optional ``callback(key, value)`` called with each
+                section of the updated review
+        """
+        try:
+            logger.info(
+                "✍️ Updating the previous review for %d changed section(s)",
+                sum(1 for section in revision['sections'] if section['status'] != 'unchanged')
+            )
+            with tracing.span("prompt.build", profile=True, agent=self._revision_config["name"]) as span:
+                changes = revisions.changed_text(revision, paper_data, basis)
+                prompt = self._build_revision_prompt(paper_data, related_papers, previous_review, revision, changes)
+                span.set(chars=len(prompt))
+            try:
+                update = await structured.generate(
+                    self._build_revision_runner, prompt, schemas.REVISION, model=self._revision_config["model_name"],
+                    name=self._revision_config["name"], llm_options=self.llm_options
+                )
+            except structured.StructuredOutputError as e2:
+                return {'error': f'Failed to parse JSON response: {str(e2)}'}
+
+            review = {key: value for key, value in previous_review.items() if key not in ('ensemble', 'generated_at')}
+            for key in ('summary', 'strengths', 'weaknesses', 'questions', 'related_work_analysis', 'overall_assessment'):
+                if update.get(key):
+                    review[key] = update[key]
+            rewritten = update['detailed_comments']
+            review['detailed_comments'] = {
+                **(previous_review.get('detailed_comments') or {}),
+                **{name: text for name, text in rewritten.items() if text and name in revision['review_sections']},
+            }
+            review['changes_since_last_version'] = update.get('changes_summary') or revisions.describe(revision)
+            review['addressed_concerns'] = update.get('addressed_concerns') or []
+            review['generated_at'] = datetime.now().isoformat()
+            if on_section:
+                for key, value in review.items():
+                    if key != 'generated_at':
+                        on_section(key, value)
+            return review
+
+        except Exception as e:
+            logger.exception("❌ Review update failed: %s", e)
+            return {'error': f'Review update failed: {str(e)}'}
+
+    async def _generate_variant(self, variant: dict, prompt: str) -> dict:
+        with tracing.span("review.variant", variant=variant["name"]):
+            return await structured.generate(
+                functools.partial(self._build_variant_runner, variant), prompt, schemas.REVIEW,
+                model=self._agent_config["model_name"], name=self._agent_config["name"], llm_options=self.llm_options
+            )
+
+    async def generate_ensemble_async(self, paper_data: dict, related_papers: list, variants: list,
+                                      deadline: float | None = None, on_section=None) -> dict:
+        """
+        Generate one review per variant concurrently and merge them (see ``ensemble``)
+
+        Args:
+            paper_data: Parsed paper from the parser agent
+            related_papers: Ranked reference papers
+            variants: Reviewer variants from ``ensemble_variants``
+            deadline: ``time.monotonic()`` value after which unfinished
+                variants are dropped. Independently of it, once the first
+                variant is done the others get ``ensemble_grace`` times its
+                latency to finish, so the ensemble takes about as long as one review.
+            on_section: Optional ``callback(key, value)``; called with each
+                section of the merged review once it is aggregated
+
+        Returns:
+            The merged review, with an ``ensemble`` block (consensus,
+            dispersion, votes, completed/timed-out/failed variants)
+        """
+        started = time.monotonic()
+        logger.info("✍️ Generating review ensemble: %s", ", ".join(variant["name"] for variant in variants))
+        with tracing.span("prompt.build", profile=True, agent=self._agent_config["name"]) as span:
+            prompt = self._build_prompt(paper_data, related_papers)
+            span.set(chars=len(prompt))
+
+        tasks = {
+            asyncio.create_task(self._generate_variant(variant, prompt), name=f"review.{variant['name']}"): variant
+            for variant in variants
+        }
+        pending = set(tasks)
+        reviews, failed = [], []
+        cutoff = deadline
+        graced = False
+        try:
+            while pending:
+                timeout = None if cutoff is None else max(0.0, cutoff - time.monotonic())
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    name = tasks[task]["name"]
+                    if isinstance(task.exception(), jobs.JobCancelled):
+                        raise task.exception()
+                    if task.exception() is not None:
+                        logger.warning("⚠️ Reviewer variant '%s' failed: %s", name, task.exception())
+                        failed.append(name)
+                    else:
+                        reviews.append((name, task.result()))
+                if reviews and not graced:
+                    # First success: stragglers get a grace period relative to its latency
+                    graced = True
+                    now = time.monotonic()
+                    straggler_cutoff = now + (now - started) * self.ensemble_grace
+                    cutoff = straggler_cutoff if cutoff is None else min(cutoff, straggler_cutoff)
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        timed_out = [tasks[task]["name"] for task in pending]
+        if timed_out:
+            logger.info("⏱️ Dropped %d reviewer variant(s) past the deadline: %s", len(timed_out), ", ".join(timed_out))
+        if not reviews:
+            logger.error("❌ No reviewer variant finished")
+            return {'error': f'No reviewer variant finished ({len(failed)} failed, {len(timed_out)} timed out)'}
+
+        review = aggregate_reviews(reviews)
+        review['ensemble'].update({
+            'variants_requested': len(variants),
+            'variants_completed': [name for name, _ in reviews],
+            'variants_timed_out': timed_out,
+            'variants_failed': failed,
+            'wall_s': round(time.monotonic() - started, 3),
+        })
+        review['generated_at'] = datetime.now().isoformat()
+        logger.info(
+            "✅ Ensemble of %d/%d reviews: %s (dispersion %s, %s confidence)", len(reviews), len(variants),
+            review['ensemble']['recommendation'], review['ensemble']['dispersion'], review['ensemble']['confidence']
+        )
+        if on_section:
+            for key, value in review.items():
+                if key not in ('ensemble', 'generated_at'):
+                    on_section(key, value)
+        return review
+
+    def generate_review(self, paper_data: dict, related_papers: list, on_section=None) -> dict:
         """Synchronous wrapper"""
-        return asyncio.run(self.generate_review_async(paper_data, related_papers))
+        return asyncio.run(self.generate_review_async(paper_data, related_papers, on_section))
@@ -0,0 +1,221 @@
+"""
+Revisions - Section-level diff between two versions of the same manuscript
+
+A completed review keeps a small *revision basis* next to it: the parsed
+paper split into sections, plus the related papers it was searched and
+ranked against. When the authors upload a revision, ``compare`` diffs the
+new parse against that basis and decides how much of the pipeline to redo:
+
+* ``reuse_search``: title and abstract barely changed, so the earlier
+  related-paper search, ranking and validation still apply
+* ``incremental``: few enough sections changed that the reviewer only
+  rewrites the comments those sections affect (see
+  ``ReviewerAgent.generate_revision_async``); otherwise it is a full review
+
+Thresholds come from ``REVISION_REUSE_SIMILARITY`` (default 0.85) and
+``REVISION_FULL_REVIEW_RATIO`` (default 0.6, share of the text changed).
+"""
+import difflib
+import os
+import re
+
+from . import tracing
+
+# Sections whose text is at least this similar count as unchanged
+UNCHANGED_SIMILARITY = 0.98
+# Paper headings -> the review's detailed-comment section they feed, first match wins
+REVIEW_SECTION_KEYWORDS = (
+    ('Title and Abstract', ('abstract', 'title')),
+    ('Introduction', ('introduction', 'motivation', 'background', 'related work', 'prior work', 'overview')),
+    ('Methodology', ('method', 'approach', 'model', 'framework', 'algorithm', 'preliminar', 'problem',
+                     'formulation', 'theory', 'design', 'architecture', 'proposed')),
+    ('Experiments', ('experiment', 'evaluation', 'result', 'ablation', 'benchmark', 'dataset', 'setup',
+                     'analysis', 'empirical', 'study')),
+    ('Conclusion', ('conclusion', 'discussion', 'limitation', 'future work', 'summary')),
+)
+KNOWN_HEADINGS = (
+    'abstract', 'introduction', 'background', 'related work', 'preliminaries', 'method', 'methods',
+    'methodology', 'approach', 'experiments', 'experimental setup', 'evaluation', 'results', 'discussion',
+    'limitations', 'conclusion', 'conclusions', 'references', 'acknowledgments', 'acknowledgements', 'appendix',
+)
+_MARKDOWN_HEADING = re.compile(r'^#{1,6}\s+(.+?)\s*#*$')
+_NUMBERED_HEADING = re.compile(r'^((?:\d+|[IVX]+)(?:\.\d+)*)\.?\s+([A-Z][^.!?]{1,80})$')
+
+
+def reuse_similarity() -> float:
+    return float(os.getenv('REVISION_REUSE_SIMILARITY', '0.85'))
+
+
+def full_review_ratio() -> float:
+    return float(os.getenv('REVISION_FULL_REVIEW_RATIO', '0.6'))
+
+
+def _heading(line: str) -> str | None:
+    """Heading text if ``line`` looks like a section heading (Markdown, numbered, or a known name)."""
+    line = line.strip()
+    if not line or len(line) > 100:
+        return None
+    match = _MARKDOWN_HEADING.match(line)
+    if match:
+        return match.group(1).strip('*_ ')
+    match = _NUMBERED_HEADING.match(line)
+    if match:
+        return f"{match.group(1)} {match.group(2).strip()}"
+    if line.lower().rstrip(':') in KNOWN_HEADINGS:
+        return line.rstrip(':')
+    return None
+
+
+def split_sections(markdown: str) -> dict:
+    """
+    Ordered ``{heading: text}`` of a converted paper
+
+    PDF conversion rarely produces Markdown headings, so numbered headings
+    ("3.1 Training Setup") and bare well-known names ("Conclusion") count
+    too. Text before the first heading goes under ``front matter``; repeated
+    headings get a ``(2)`` suffix.
+    """
+    sections, current, lines = {}, 'front matter', []
+
+    def close():
+        text = '\n'.join(lines).strip()
+        if text or current != 'front matter':
+            name, count = current, 2
+            while name in sections:
+                name, count = f"{current} ({count})", count + 1
+            sections[name] = text
+
+    for line in (markdown or '').splitlines():
+        heading = _heading(line)
+        if heading is None:
+            lines.append(line)
+            continue
+        close()
+        current, lines = heading, []
+    close()
+    return sections
+
+
+def similarity(a: str, b: str) -> float:
+    """Word-level similarity of two texts (1.0 = identical)."""
+    if a == b:
+        return 1.0
+    words_a, words_b = (a or '').lower().split(), (b or '').lower().split()
+    if not words_a or not words_b:
+        return 0.0
+    # autojunk would drop every common word of a long section and make small edits look like rewrites
+    return difflib.SequenceMatcher(None, words_a, words_b, autojunk=False).ratio()
+
+
+def review_section(heading: str) -> str | None:
+    """Detailed-comment section of the review that a paper section feeds (None if unclear)."""
+    name = re.sub(r'^[\dIVX.]+\s+', '', heading.lower())
+    for section, keywords in REVIEW_SECTION_KEYWORDS:
+        if any(keyword in name for keyword in keywords):
+            return section
+    return None
+
+
+def build_basis(parsed_data: dict, papers: list, ranked_papers: list, validation: dict, ranking_mode) -> dict:
+    """What a later revision is compared against and can reuse."""
+    return {
+        'title': parsed_data.get('title', ''),
+        'abstract': parsed_data.get('abstract', ''),
+        'keywords': parsed_data.get('keywords', []),
+        'sections': split_sections(parsed_data.get('full_content', '')),
+        'papers': papers,
+        'ranked_papers': ranked_papers,
+        'ranking_mode': ranking_mode,
+        'validation': validation,
+    }
+
+
+def compare(basis: dict, parsed_data: dict) -> dict:
+    """
+    Diff a new parse against the previous version's ``basis``
+
+    Returns:
+        ``title_similarity``, ``abstract_similarity``, ``reuse_search``,
+        ``sections`` (name, status: unchanged | changed | added | removed,
+        similarity, review section), ``changed_ratio`` (share of the new
+        text in changed or added sections), ``review_sections`` to rewrite
+        and ``incremental``.
+    """
+    with tracing.span('revision.diff', profile=True) as span:
+        title_similarity = similarity(basis.get('title', ''), parsed_data.get('title', ''))
+        abstract_similarity = similarity(basis.get('abstract', ''), parsed_data.get('abstract', ''))
+        old_sections = basis.get('sections') or {}
+        new_sections = split_sections(parsed_data.get('full_content', ''))
+
+        sections, changed_chars = [], 0
+        for name, text in new_sections.items():
+            if name not in old_sections:
+                status, score = 'added', 0.0
+            else:
+                score = similarity(old_sections[name], text)
+                status = 'unchanged' if score >= UNCHANGED_SIMILARITY else 'changed'
+            if status != 'unchanged':
+                changed_chars += len(text)
+            sections.append({'name': name, 'status': status, 'similarity': round(score, 3),
+                             'review_section': review_section(name)})
+        sections.extend(
+            {'name': name, 'status': 'removed', 'similarity': 0.0, 'review_section': review_section(name)}
+            for name in old_sections if name not in new_sections
+        )
+        if abstract_similarity < UNCHANGED_SIMILARITY or title_similarity < UNCHANGED_SIMILARITY:
+            sections.append({'name': 'Title and Abstract', 'status': 'changed',
+                             'similarity': round(min(title_similarity, abstract_similarity), 3),
+                             'review_section': 'Title and Abstract'})
+
+        total_chars = sum(len(text) for text in new_sections.values()) or 1
+        changed_ratio = changed_chars / total_chars
+        reuse = min(title_similarity, abstract_similarity) >= reuse_similarity()
+        changed = [section for section in sections if section['status'] != 'unchanged']
+        result = {
+            'title_similarity': round(title_similarity, 3),
+            'abstract_similarity': round(abstract_similarity, 3),
+            'reuse_search': reuse,
+            'sections': sections,
+            'changed_ratio': round(changed_ratio, 3),
+            'review_sections': sorted({section['review_section'] for section in changed if section['review_section']}),
+            # One undivided "section" means the paper couldn't be split: nothing to be incremental about
+            'incremental': len(new_sections) > 1 and changed_ratio < full_review_ratio(),
+        }
+        span.set(sections=len(sections), changed=len(changed), changed_ratio=result['changed_ratio'],
+                 incremental=result['incremental'])
+        return result
+
+
+def changed_text(revision: dict, parsed_data: dict, basis: dict, max_chars: int = 20000) -> list:
+    """``(name, status, old_text, new_text)`` of every changed section, capped at ``max_chars`` of new text in total."""
+    new_sections = split_sections(parsed_data.get('full_content', ''))
+    old_sections = basis.get('sections') or {}
+    changes, budget = [], max_chars
+    for section in revision['sections']:
+        if section['status'] == 'unchanged':
+            continue
+        if section['name'] == 'Title and Abstract' and section['name'] not in new_sections:
+            old = f"{basis.get('title', '')}\n\n{basis.get('abstract', '')}"
+            new = f"{parsed_data.get('title', '')}\n\n{parsed_data.get('abstract', '')}"
+        else:
+            old, new = old_sections.get(section['name'], ''), new_sections.get(section['name'], '')
+        changes.append((section['name'], section['status'], old[:budget], new[:budget]))
+        budget = max(0, budget - len(new))
+    return changes
+
+
+def describe(revision: dict) -> str:
+    """One-paragraph, deterministic account of what changed (used when no LLM summary exists)."""
+    by_status = {}
+    for section in revision['sections']:
+        by_status.setdefault(section['status'], []).append(section['name'])
+    parts = [
+        f"{label}: {', '.join(by_status[status])}"
+        for status, label in (('changed', 'Revised sections'), ('added', 'New sections'), ('removed', 'Removed sections'))
+        if by_status.get(status)
+    ]
+    if not parts:
+        return 'No substantive changes to the manuscript text were detected since the previous version.'
+    return (
+        '; '.join(parts) + f". About {round(revision['changed_ratio'] * 100)}% of the manuscript text changed."
+    )
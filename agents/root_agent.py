@@ -1,69 +1,274 @@
 """
 Root Agent - Orchestrates the entire paper review workflow
 """
+import asyncio
 import os
-from datetime import datetime
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
+import time
+import logging
+from functools import cached_property, partial
+from . import jobs, revisions, tracing
+from .speculation import SpeculationStats, SpeculativeSearch
+from .llm_client import warm_up
 from .parser_agent import ParserAgent
 from .finder_agent import PaperFinderAgent
 from .ranking_agent import RankingAgent
-from .reviewer_agent import ReviewerAgent
+from .reviewer_agent import ReviewerAgent, ensemble_variants
 from .validator_agent import PaperValidationAgent
 
+logger = logging.getLogger(__name__)
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
 
 class RootAgent:
-    def __init__(self):
-        self.parser_agent = ParserAgent()
-        self.finder_agent = PaperFinderAgent()
-        self.ranking_agent = RankingAgent()
-        self.reviewer_agent = ReviewerAgent()
-        self.validation_agent = PaperValidationAgent()
-        
-        # Create root orchestrator agent
-        self.agent = LlmAgent(
-            name="root_orchestrator",
-            model=Gemini(model="gemini-2.5-flash"),
-            description="Root orchestrator for the paper review system",
-            instruction=(
-                "You are the Root Orchestrator Agent for an academic paper review system.\n"
-                "Your role is to coordinate the workflow:\n"
-                "1. Receive parsed paper content (title, abstract, full text)\n"
-                "2. Coordinate with other agents to find and rank related papers\n"
-                "3. Coordinate comprehensive review generation\n"
-                "4. Format final output as structured JSON\n\n"
-                "Always maintain context and ensure smooth handoffs between agents.\n"
-                "Provide clear, actionable instructions to each agent."
-            ),
-            tools=[]
-        )
+    # Per-stage budgets in seconds; each is further capped by what is left of the review SLA
+    DEFAULT_STAGE_TIMEOUTS = {
+        'parse': 180,
+        'validate': 60,
+        'find': 90,
+        'rank': 90,
+        'review': 300,
+    }
+    DEFAULT_REVIEW_SLA = 900
+    # Seconds of the review stage's budget kept back to merge an ensemble before the stage times out
+    ENSEMBLE_MARGIN = 1.0
+
+    def __init__(self, stage_timeouts: dict | None = None, review_sla: float | None = DEFAULT_REVIEW_SLA,
+                 hedge_llm_calls: bool = False, llm_call_timeout: float | None = None,
+                 lean_pipeline: bool = False, review_ensemble=None, speculative_search: bool = True):
+        """
+        Args:
+            stage_timeouts: Overrides for ``DEFAULT_STAGE_TIMEOUTS`` (None disables a stage's budget)
+            review_sla: End-to-end budget for one review in seconds (None = unbounded)
+            hedge_llm_calls: Send a duplicate LLM request once a call exceeds the model's p95 latency
+            llm_call_timeout: Per-attempt LLM timeout in seconds (default ``LLM_CALL_TIMEOUT``)
+            lean_pipeline: Get the metadata and the research-paper classification from
+                one LLM call instead of separate parser and validator calls
+            review_ensemble: Reviewer personas to run concurrently and merge
+                (list or comma-separated string, see ``ensemble_variants``);
+                empty for a single review
+            speculative_search: Start the related-paper search from a heuristic
+                title as soon as the PDF is converted, while the metadata call
+                runs (see ``speculation``)
+        """
+        self.stage_timeouts = {**self.DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {})}
+        self.review_sla = review_sla
+        self.lean_pipeline = lean_pipeline
+        self.review_ensemble = ensemble_variants(review_ensemble)
+        self.speculative_search = speculative_search
+        self.speculation_stats = SpeculationStats()
+        # Sub-agents are built on first use (see the properties below), so constructing
+        # a RootAgent at import time costs nothing until a review actually runs
+        self.llm_options = {"timeout": llm_call_timeout, "hedge": hedge_llm_calls}
+
+    @classmethod
+    def from_env(cls, **overrides) -> "RootAgent":
+        """
+        RootAgent configured like every entry point (web app, batch CLI):
+        ``REVIEW_SLA_SECONDS``, ``HEDGE_LLM_CALLS``, ``LEAN_PIPELINE``,
+        ``REVIEW_ENSEMBLE`` and ``SPECULATIVE_SEARCH``; ``overrides`` win.
+        """
+        options = {
+            'review_sla': float(os.getenv('REVIEW_SLA_SECONDS', cls.DEFAULT_REVIEW_SLA)),
+            'hedge_llm_calls': _env_flag('HEDGE_LLM_CALLS', False),
+            'lean_pipeline': _env_flag('LEAN_PIPELINE', False),
+            'review_ensemble': os.getenv('REVIEW_ENSEMBLE', ''),
+            'speculative_search': _env_flag('SPECULATIVE_SEARCH', True),
+        }
+        return cls(**{**options, **overrides})
+
+    def _with_llm_options(self, llm_agent):
+        llm_agent.llm_options = dict(self.llm_options)
+        return llm_agent
+
+    @cached_property
+    def parser_agent(self) -> ParserAgent:
+        return self._with_llm_options(ParserAgent())
+
+    @cached_property
+    def finder_agent(self) -> PaperFinderAgent:
+        return PaperFinderAgent()
+
+    @cached_property
+    def ranking_agent(self) -> RankingAgent:
+        return self._with_llm_options(RankingAgent())
+
+    @cached_property
+    def reviewer_agent(self) -> ReviewerAgent:
+        return self._with_llm_options(ReviewerAgent())
+
+    @cached_property
+    def validation_agent(self) -> PaperValidationAgent:
+        return self._with_llm_options(PaperValidationAgent())
+
+    def runner_factories(self) -> list:
+        """The sub-agents' own runner builders (with their output schemas), as used in reviews."""
+        factories = [
+            self.parser_agent._build_runner,
+            self.validation_agent._build_runner,
+            self.ranking_agent._build_runner,
+            self.ranking_agent._build_light_runner,
+            self.reviewer_agent._build_runner,
+            self.reviewer_agent._build_revision_runner,
+        ]
+        if self.lean_pipeline:
+            factories.append(self.parser_agent._build_lean_runner)
+        for variant in self.review_ensemble:
+            factories.append(partial(self.reviewer_agent._build_variant_runner, variant))
+        return factories
+
+    def warm_up(self) -> dict:
+        """
+        Build every sub-agent and pre-open the model clients and PDF converter
+        so the first review doesn't pay the cold-start cost. Safe to run in a
+        background thread; returns per-step timings in seconds.
+        """
+        started = time.perf_counter()
+        timings = {}
+        factories = self.runner_factories()
+        self.finder_agent
+        timings['agents_s'] = round(time.perf_counter() - started, 3)
+        timings['models'] = warm_up(factories)
+        step = time.perf_counter()
+        import markitdown  # noqa: F401
+        timings['markitdown_s'] = round(time.perf_counter() - step, 3)
+        timings['total_s'] = round(time.perf_counter() - started, 3)
+        return timings
     
-    def process_paper(self, file_path: str) -> dict:
+    def _stage_budget(self, stage: str, deadline: float | None) -> float | None:
+        """Seconds ``stage`` may take: its own timeout capped by what is left before ``deadline``."""
+        budget = self.stage_timeouts.get(stage)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            budget = remaining if budget is None else min(budget, remaining)
+        return budget
+
+    async def _run_stage(self, stage: str, coro, deadline: float | None, timings: dict):
+        """
+        Await one pipeline stage within its budget
+
+        The budget is the stage's own timeout capped by the time left before the
+        review deadline. Raises ``asyncio.TimeoutError`` when it runs out.
+        """
+        budget = self._stage_budget(stage, deadline)
+        started = time.monotonic()
+        with tracing.span(f"stage.{stage}", budget_s=round(budget, 3) if budget is not None else None) as span:
+            try:
+                if budget is not None and budget <= 0:
+                    if isinstance(coro, asyncio.Future):
+                        coro.cancel()
+                    else:
+                        coro.close()
+                    raise asyncio.TimeoutError
+                return await asyncio.wait_for(coro, budget)
+            except asyncio.TimeoutError:
+                logger.warning("⏱️ Stage '%s' exceeded its budget (%.0fs)", stage, budget or 0)
+                span.set(timed_out=True)
+                raise
+            finally:
+                timings[stage] = round(time.monotonic() - started, 3)
+
+    def _search(self, title: str, abstract: str, keywords, shared_lookups) -> tuple:
+        """``(search query, focused queries, coroutine)`` of the related-paper search for this metadata."""
+        search_query = f"{title} {abstract[:200]}"
+        queries = self.finder_agent.build_queries(title, abstract, keywords)
+        logger.info("🔍 Search strategy: %d focused queries from title, keywords and abstract", len(queries))
+
+        def find_papers(query):
+            return self.finder_agent.find_papers_async(query, queries=queries, shared_lookups=shared_lookups)
+        if shared_lookups:
+            return search_query, queries, shared_lookups.find(search_query, find_papers)
+        return search_query, queries, find_papers(search_query)
+
+    def _report(self, progress_callback, **update):
+        """Send a progress update to the caller; a failing callback never breaks the pipeline."""
+        if not progress_callback:
+            return
+        try:
+            progress_callback(update)
+        except Exception as e:
+            logger.warning("⚠️ Progress callback failed: %s", e)
+
+    def process_paper(self, file_path: str, progress_callback=None, shared_lookups=None,
+                      trace_id: str | None = None, profile: bool = False, previous: dict | None = None,
+                      with_revision_basis: bool = False) -> dict:
+        """Synchronous wrapper for process_paper_async"""
+        return asyncio.run(self.process_paper_async(
+            file_path, progress_callback, shared_lookups, trace_id, profile, previous, with_revision_basis
+        ))
+
+    async def process_paper_async(self, file_path: str, progress_callback=None, shared_lookups=None,
+                                  trace_id: str | None = None, profile: bool = False, previous: dict | None = None,
+                                  with_revision_basis: bool = False) -> dict:
         """
         Process a paper through the complete review pipeline
         
         Args:
             file_path: Path to the PDF file
+            progress_callback: Optional ``callback(update: dict)``. Receives
+                ``{'stage': ..., 'message': ...}`` when a stage starts and
+                ``{'review_section': key, 'content': value}`` for each review
+                section as soon as the reviewer has streamed it.
+            shared_lookups: Optional ``SharedLookups`` shared by the papers of a
+                batch, so similar papers reuse one search and one ranking
+            trace_id: Id of the review's trace (e.g. the review token); random if omitted
+            profile: Also capture a cProfile of the CPU-bound steps (see ``tracing``)
+            previous: Review this file as a revision of an earlier version:
+                ``{'token': ..., 'basis': ..., 'result': ...}`` with that version's
+                revision basis and final result (see ``revisions``)
+            with_revision_basis: Add ``revision_basis`` to the result, for the
+                caller to store and pass back as ``previous['basis']`` later
             
         Returns:
-            Complete review result as dictionary
+            Complete review result as dictionary. When the trace was written
+            (``TRACE_EXPORTER`` or ``profile``), ``metadata.trace`` (``trace``
+            on errors) lists the trace id, per-span totals and the files.
+            Revisions carry a ``revision`` block (what changed, what was reused).
         """
+        with tracing.trace('review', trace_id=trace_id, profile=profile, file=os.path.basename(file_path)) as trace:
+            result = await self._process_paper_async(
+                file_path, progress_callback, shared_lookups, previous, with_revision_basis
+            )
+        if trace.files and isinstance(result, dict):
+            info = {'trace_id': trace.trace_id, 'span_totals_s': trace.summary(), 'files': trace.files}
+            if isinstance(result.get('metadata'), dict) and 'error' not in result:
+                result['metadata']['trace'] = info
+            else:
+                result['trace'] = info
+        return result
+
+    async def _process_paper_async(self, file_path: str, progress_callback, shared_lookups,
+                                   previous=None, with_revision_basis=False) -> dict:
+        deadline = time.monotonic() + self.review_sla if self.review_sla else None
+        timings = {}
+        warnings = []
+        speculation = None
+        if self.speculative_search and not (previous and previous.get('basis')):
+            # Revisions usually reuse the earlier search instead (see ``revisions``)
+            speculation = SpeculativeSearch(lambda title, abstract: self._search(title, abstract, None, shared_lookups))
         try:
-            print("\n" + "="*80)
-            print("🚀 ROOT AGENT - Starting Complete Review Pipeline")
-            print("="*80)
-            print(f"📁 Input File: {file_path}")
-            print(f"⏰ Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            logger.info("🚀 Starting review pipeline for %s", file_path)
             
             # Step 1: Parse the paper
-            print("\n" + "─"*80)
-            print("📝 STEP 1/5: PARSING PDF DOCUMENT")
-            print("─"*80)
-            parsed_data = self.parser_agent.parse_pdf(file_path)
+            logger.info("📝 Step 1/5: parsing PDF document")
+            self._report(progress_callback, stage='parse', message='Parsing document...')
+            try:
+                parsed_data = await self._run_stage('parse', self.parser_agent.parse_pdf_async(
+                    file_path, classify=self.lean_pipeline, on_text=speculation.start if speculation else None
+                ), deadline, timings)
+            except asyncio.TimeoutError:
+                return {
+                    'error': 'Failed to parse PDF',
+                    'details': 'PDF parsing exceeded its time budget'
+                }
             
             if not parsed_data or 'error' in parsed_data:
-                print("❌ ROOT AGENT - Pipeline failed at parsing stage")
+                logger.error("❌ Pipeline failed at parsing stage")
                 return {
                     'error': 'Failed to parse PDF',
                     'details': parsed_data.get('error', 'Unknown error')
@@ -72,101 +277,208 @@ class RootAgent:
             title = parsed_data.get('title', 'Unknown Title')
             abstract = parsed_data.get('abstract', '')
             
-            print(f"✅ Step 1 Complete - Paper parsed successfully")
-            print(f"   📄 Title: {title[:80]}...")
-            print(f"   📋 Abstract: {len(abstract)} characters")
+            logger.info("✅ Step 1 complete - title: %.80s, abstract: %d characters", title, len(abstract))
+
+            revision = None
+            basis = previous.get('basis') if previous else None
+            if basis:
+                # Off the event loop: diffing long sections is CPU-bound
+                revision = await asyncio.to_thread(revisions.compare, basis, parsed_data)
+                logger.info(
+                    "🔁 Revision of %s: %.0f%% of the text changed, %s search, %s review",
+                    previous.get('token'), revision['changed_ratio'] * 100,
+                    'reusing the' if revision['reuse_search'] else 'redoing the',
+                    'incremental' if revision['incremental'] else 'full'
+                )
+            reuse = bool(revision and revision['reuse_search'])
             
             # Step 2: Validate document authenticity
-            print("\n" + "─"*80)
-            print("🛡️  STEP 2/5: VALIDATING DOCUMENT TYPE")
-            print("─"*80)
-            validation = self.validation_agent.validate_document(
-                paper_text=parsed_data.get('full_content', ''),
-                metadata={'title': title, 'abstract': abstract}
-            )
+            logger.info("🛡️ Step 2/5: validating document type")
+            self._report(progress_callback, stage='validate', message='Validating document type...')
+            # Lean mode: the parser's call already classified the document
+            validation = parsed_data.pop('validation', None)
+            if reuse and basis.get('validation'):
+                # Same paper as last time: it was already classified as a research paper
+                validation = basis['validation']
+                logger.info("✅ Classification reused from the previous version")
+            elif validation:
+                logger.info("✅ Classification came with the metadata call (lean pipeline)")
+            elif self.lean_pipeline:
+                logger.warning("⚠️ Combined call returned no usable classification, validating separately")
+            try:
+                validation = validation or await self._run_stage('validate', self.validation_agent.validate_document_async(
+                    paper_text=parsed_data.get('full_content', ''),
+                    metadata={'title': title, 'abstract': abstract}
+                ), deadline, timings)
+            except asyncio.TimeoutError:
+                # Degrade: review anyway rather than fail on a slow classifier
+                warnings.append('Document validation skipped: stage deadline exceeded')
+                logger.warning("⚠️ Skipping validation, assuming research paper")
+                validation = {
+                    'is_research_paper': True,
+                    'category': 'unclear',
+                    'confidence': 'Low',
+                    'reason': 'Validation skipped because it exceeded its time budget.',
+                    'skipped': True
+                }
 
             if validation.get('error'):
-                print(f"❌ ROOT AGENT - Validation failed: {validation['error']}")
+                logger.error("❌ Validation failed: %s", validation['error'])
                 return {
                     'error': 'Failed to validate uploaded document',
                     'details': validation['error']
                 }
 
             if not validation.get('is_research_paper'):
-                print("⚠️ ROOT AGENT - Uploaded file rejected: not a research paper")
+                logger.warning("⚠️ Uploaded file rejected: not a research paper")
                 return {
                     'error': 'Uploaded file does not appear to be a research paper',
                     'validation': validation
                 }
 
-            print(f"✅ Step 2 Complete - Document classified as research paper ({validation.get('confidence', 'Unknown')} confidence)")
+            logger.info("✅ Step 2 complete - research paper (%s confidence)", validation.get('confidence', 'Unknown'))
             
             # Step 3: Find related papers
-            print("\n" + "─"*80)
-            print("📝 STEP 3/5: FINDING RELATED ACADEMIC PAPERS")
-            print("─"*80)
+            logger.info("📝 Step 3/5: finding related academic papers")
+            self._report(progress_callback, stage='find', message='Searching for related papers...')
             search_query = f"{title} {abstract[:200]}"
-            print(f"🔍 Search strategy: Using title + first 200 chars of abstract")
-            papers = self.finder_agent.find_papers(search_query)
+            search_timed_out = False
+            if reuse:
+                papers = basis.get('papers') or []
+                logger.info("🔁 Title and abstract barely changed: reusing the previous version's %d related papers", len(papers))
+            else:
+                find = speculation.claim(title) if speculation else None
+                if find is not None:
+                    logger.info("⚡ Speculative search from the heuristic title matches: %.2fs already done", speculation.saved_s)
+                    # Ranking shares lookups under the query that was actually searched
+                    search_query = speculation.query
+                    # The heuristic guess had no keywords: send the keyword queries it missed alongside
+                    missing = speculation.missing(
+                        self.finder_agent.build_queries(title, abstract, parsed_data.get('keywords')))
+                    if missing:
+                        logger.info("➕ Topping up the speculative search with %d keyword queries: %s", len(missing), missing)
+                        find = self.finder_agent.top_up_async(find, missing, shared_lookups=shared_lookups)
+                else:
+                    if speculation and speculation.outcome in ('miss', 'failed'):
+                        logger.info("↩️ Speculative search discarded (%s, title similarity %.2f): searching again",
+                                    speculation.outcome, speculation.similarity)
+                    search_query, _, find = self._search(title, abstract, parsed_data.get('keywords'), shared_lookups)
+                try:
+                    papers = await self._run_stage('find', find, deadline, timings)
+                except asyncio.TimeoutError:
+                    # Degrade: review without related-work context instead of failing
+                    warnings.append('Related-paper search skipped: stage deadline exceeded')
+                    papers = []
+                    search_timed_out = True
             
-            if not papers or len(papers) == 0:
-                print("❌ ROOT AGENT - Pipeline failed: No related papers found")
+            if not papers and not search_timed_out:
+                logger.error("❌ Pipeline failed: no related papers found")
                 return {
                     'error': 'No related papers found',
                     'parsed_data': parsed_data
                 }
             
-            print(f"✅ Step 3 Complete - Found {len(papers)} related papers")
+            logger.info("✅ Step 3 complete - found %d related papers", len(papers))
             
             # Step 4: Rank papers
-            print("\n" + "─"*80)
-            print("📝 STEP 4/5: RANKING RELATED PAPERS")
-            print("─"*80)
-            print(f"🎯 Ranking {len(papers)} papers to select top 5...")
-            ranked_papers = self.ranking_agent.rank_papers(
-                user_query=title,
-                papers=papers,
-                top_n=5
-            )
-            
-            if not ranked_papers or len(ranked_papers) == 0:
-                print("❌ ROOT AGENT - Pipeline failed at ranking stage")
-                return {
-                    'error': 'Failed to rank papers',
-                    'papers': papers
-                }
+            logger.info("📝 Step 4/5: ranking related papers")
+            self._report(progress_callback, stage='rank', message=f'Ranking {len(papers)} related papers...')
+            ranked_papers = []
+            ranking_mode = None
+            if reuse and basis.get('ranked_papers'):
+                ranked_papers = basis['ranked_papers']
+                ranking_mode = 'reused'
+                logger.info("🔁 Reusing the previous version's ranking")
+            elif papers:
+                # Few candidates are all kept anyway: order them locally instead of asking the LLM
+                ranking_mode = self.ranking_agent.choose_mode(len(papers), top_n=5)
+                logger.info("🎯 Ranking %d papers to select top 5 (%s mode)", len(papers), ranking_mode)
+                if ranking_mode == 'local':
+                    ranked_papers = self.ranking_agent.rank_locally(
+                        title, papers, top_n=5, reason="Few candidates: all kept, ordered by keyword overlap."
+                    )
+                else:
+                    def rank():
+                        return self.ranking_agent.rank_papers_async(user_query=title, papers=papers, top_n=5, mode=ranking_mode)
+                    try:
+                        ranked_papers = await self._run_stage(
+                            'rank', shared_lookups.rank(search_query, rank) if shared_lookups else rank(), deadline, timings
+                        )
+                    except asyncio.TimeoutError:
+                        warnings.append('LLM ranking timed out: used local keyword ranking')
+                        ranking_mode = 'local_fallback'
+                        ranked_papers = self.ranking_agent.rank_locally(title, papers, top_n=5)
+                    
+                    if not ranked_papers:
+                        # Degrade: keyword ranking is better than failing the whole review
+                        logger.warning("⚠️ LLM ranking failed, falling back to local ranking")
+                        warnings.append('LLM ranking failed: used local keyword ranking')
+                        ranking_mode = 'local_fallback'
+                        ranked_papers = self.ranking_agent.rank_locally(title, papers, top_n=5)
             
-            print(f"✅ Step 4 Complete - Ranked top {len(ranked_papers)} papers")
+            logger.info("✅ Step 4 complete - ranked top %d papers", len(ranked_papers))
             
             # Step 5: Generate review
-            print("\n" + "─"*80)
-            print("📝 STEP 5/5: GENERATING COMPREHENSIVE REVIEW")
-            print("─"*80)
-            print(f"📊 Comparing uploaded paper with {len(ranked_papers)} top-ranked papers")
-            print(f"🤖 Review Agent will analyze:")
-            print(f"   ✓ Original paper (title, abstract, content)")
-            print(f"   ✓ Top {len(ranked_papers)} related papers for context")
-            print(f"   ✓ Relative positioning in the research landscape")
-            
-            review = self.reviewer_agent.generate_review(
-                paper_data=parsed_data,
-                related_papers=ranked_papers
-            )
+            logger.info("📝 Step 5/5: generating review against %d top-ranked papers", len(ranked_papers))
+            previous_review = ((previous or {}).get('result') or {}).get('review') if revision else None
+            incremental = bool(revision and revision['incremental'] and isinstance(previous_review, dict))
+            if incremental:
+                self._report(progress_callback, stage='review', message='Updating the review for the changed sections...')
+            elif self.review_ensemble:
+                self._report(progress_callback, stage='review', message=f'Generating {len(self.review_ensemble)} reviews...')
+            else:
+                self._report(progress_callback, stage='review', message='Generating review...')
+            
+            try:
+                on_section = None
+                if progress_callback:
+                    def on_section(key, value):
+                        self._report(progress_callback, review_section=key, content=value)
+                if incremental:
+                    generate = self.reviewer_agent.generate_revision_async(
+                        paper_data=parsed_data,
+                        related_papers=ranked_papers,
+                        previous_review=previous_review,
+                        revision=revision,
+                        basis=basis,
+                        on_section=on_section
+                    )
+                elif self.review_ensemble:
+                    # Variants still running when the stage is nearly out of budget are dropped, not waited for
+                    budget = self._stage_budget('review', deadline)
+                    generate = self.reviewer_agent.generate_ensemble_async(
+                        paper_data=parsed_data,
+                        related_papers=ranked_papers,
+                        variants=self.review_ensemble,
+                        deadline=time.monotonic() + budget - self.ENSEMBLE_MARGIN if budget is not None else None,
+                        on_section=on_section
+                    )
+                else:
+                    generate = self.reviewer_agent.generate_review_async(
+                        paper_data=parsed_data,
+                        related_papers=ranked_papers,
+                        on_section=on_section
+                    )
+                review = await self._run_stage('review', generate, deadline, timings)
+            except asyncio.TimeoutError:
+                return {
+                    'error': 'Failed to generate review',
+                    'details': 'Review generation exceeded its time budget'
+                }
             
             if not review or 'error' in review:
-                print("❌ ROOT AGENT - Pipeline failed at review generation stage")
+                logger.error("❌ Pipeline failed at review generation stage")
                 return {
                     'error': 'Failed to generate review',
                     'details': review.get('error', 'Unknown error')
                 }
             
-            print(f"✅ Step 5 Complete - Review generated successfully")
+            logger.info("✅ Step 5 complete - review generated")
+            if revision and 'changes_since_last_version' not in review:
+                # Full re-review of a revision: still say what changed
+                review['changes_since_last_version'] = revisions.describe(revision)
             
             # Final Step: Format final output
-            print("\n" + "─"*80)
-            print("📝 FINAL STEP: FORMATTING OUTPUT")
-            print("─"*80)
-            
             final_result = {
                 'paper': {
                     'title': title,
@@ -180,34 +492,51 @@ class RootAgent:
                     'validation': validation,
                     'total_papers_found': len(papers),
                     'papers_ranked': len(ranked_papers),
-                    'review_generated_at': review.get('generated_at', '')
+                    'ranking_mode': ranking_mode,
+                    'review_generated_at': review.get('generated_at', ''),
+                    'stage_timings': timings,
+                    'warnings': warnings
                 }
             }
+            if speculation:
+                final_result['metadata']['speculative_search'] = speculation.report()
+            if revision:
+                final_result['revision'] = {
+                    'previous_token': previous.get('token'),
+                    'mode': 'incremental' if incremental else 'full',
+                    'reused_search': reuse,
+                    'title_similarity': revision['title_similarity'],
+                    'abstract_similarity': revision['abstract_similarity'],
+                    'changed_ratio': revision['changed_ratio'],
+                    'regenerated_sections': revision['review_sections'] if incremental else None,
+                    'sections': [section for section in revision['sections'] if section['status'] != 'unchanged'],
+                    'unchanged_sections': sum(1 for section in revision['sections'] if section['status'] == 'unchanged'),
+                }
+            if with_revision_basis:
+                final_result['revision_basis'] = revisions.build_basis(
+                    parsed_data, papers, ranked_papers, validation, ranking_mode
+                )
             
-            print(f"\n{'='*80}")
-            print(f"🎉 ROOT AGENT - PIPELINE COMPLETE!")
-            print(f"{'='*80}")
-            print(f"📊 Final Output Summary:")
-            print(f"   ✓ Paper analyzed: {title[:60]}...")
-            print(f"   ✓ Related papers included: {len(ranked_papers)}")
-            print(f"   ✓ Review summary: {review.get('summary', '')[:60]}...")
             overall = review.get('overall_assessment', {})
-            if isinstance(overall, dict):
-                print(f"   ✓ Recommendation: {overall.get('recommendation', 'N/A')}")
-            else:
-                print(f"   ✓ Overall assessment: {str(overall)[:60]}...")
-            print(f"⏰ End Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"{'='*80}\n")
+            recommendation = overall.get('recommendation', 'N/A') if isinstance(overall, dict) else str(overall)[:60]
+            logger.info(
+                "🎉 Pipeline complete - %.60s: %d related papers, recommendation: %s",
+                title, len(ranked_papers), recommendation
+            )
             
             return final_result
         
+        except jobs.JobCancelled:
+            # Not a failure: the caller asked for it and records it
+            logger.info("🛑 Review cancelled")
+            raise
         except Exception as e:
-            print(f"\n{'='*80}")
-            print(f"❌ ROOT AGENT - CRITICAL ERROR")
-            print(f"{'='*80}")
-            print(f"Error: {str(e)}")
-            print(f"{'='*80}\n")
+            logger.exception("❌ Review pipeline crashed: %s", e)
             return {
                 'error': 'Root agent processing failed',
                 'details': str(e)
             }
+        finally:
+            if speculation:
+                speculation.abandon()
+                self.speculation_stats.record(speculation)
@@ -0,0 +1,100 @@
+"""
+Schemas - Typed JSON output of every LLM agent
+
+Plain dicts in the OpenAPI subset Gemini accepts as ``response_schema``, so
+the same definition constrains the model (JSON mode) and validates its
+answer (``structured.validate``). Properties are listed in the order the
+model should write them; ``required`` defaults to all of them.
+"""
+
+STRING = {"type": "string"}
+BOOLEAN = {"type": "boolean"}
+INTEGER = {"type": "integer"}
+STRINGS = {"type": "array", "items": STRING}
+
+
+def obj(properties: dict, required=None) -> dict:
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties if required is None else required),
+        "propertyOrdering": list(properties),
+    }
+
+
+def array(items: dict) -> dict:
+    return {"type": "array", "items": items}
+
+
+def enum(*values: str) -> dict:
+    return {"type": "string", "enum": list(values)}
+
+
+REVIEW_SECTIONS = ("Title and Abstract", "Introduction", "Methodology", "Experiments", "Conclusion")
+
+VALIDATION = obj({
+    "is_research_paper": BOOLEAN,
+    "category": enum("research_paper", "non_academic_document", "unclear"),
+    "confidence": enum("High", "Medium", "Low"),
+    "reason": STRING,
+})
+
+_METADATA_FIELDS = {
+    "title": STRING,
+    "abstract": STRING,
+    "authors": STRINGS,
+    "keywords": STRINGS,
+}
+METADATA = obj(_METADATA_FIELDS)
+# Lean pipeline: metadata and classification from one call
+INTAKE = obj({**_METADATA_FIELDS, "validation": VALIDATION})
+
+RANKING = obj({
+    "ranked_papers": array(obj({
+        "rank": INTEGER,
+        "title": STRING,
+        "url": STRING,
+        "relevance_score": INTEGER,
+        "quality_score": INTEGER,
+        "reason": STRING,
+    })),
+    "notes": STRING,
+}, required=["ranked_papers"])
+
+SCORES = obj({
+    "scores": array(obj({
+        "index": INTEGER,
+        "relevance_score": INTEGER,
+        "quality_score": INTEGER,
+    })),
+})
+
+OVERALL_ASSESSMENT = obj({
+    "recommendation": STRING,
+    "confidence": STRING,
+    "justification": STRING,
+})
+
+REVIEW = obj({
+    "summary": STRING,
+    "strengths": STRINGS,
+    "weaknesses": STRINGS,
+    "detailed_comments": obj({section: STRING for section in REVIEW_SECTIONS}),
+    "questions": STRINGS,
+    "related_work_analysis": STRING,
+    "overall_assessment": OVERALL_ASSESSMENT,
+})
+
+# Revised manuscripts: only the affected detailed comments, summary and related work only if outdated
+REVISION = obj({
+    "changes_summary": STRING,
+    "addressed_concerns": STRINGS,
+    "strengths": STRINGS,
+    "weaknesses": STRINGS,
+    "questions": STRINGS,
+    "detailed_comments": obj({section: STRING for section in REVIEW_SECTIONS}, required=[]),
+    "overall_assessment": OVERALL_ASSESSMENT,
+    "summary": STRING,
+    "related_work_analysis": STRING,
+}, required=["changes_summary", "addressed_concerns", "strengths", "weaknesses", "questions",
+             "detailed_comments", "overall_assessment"])
@@ -0,0 +1,131 @@
+"""
+Shared Lookups - Batch-scoped, single-flight caches for related-paper search and ranking
+
+Papers submitted together (a program committee's batch) often cover the same
+topic. Within one batch, a search whose query terms overlap an earlier one
+enough (Jaccard similarity of the significant terms) reuses that search's
+results instead of hitting Tavily and arXiv again, and papers that share a
+search also share its LLM ranking. Concurrent callers await the same
+in-flight task, so a topic is only ever looked up once per batch.
+
+Papers that don't share a whole search can still overlap below it: the
+finder runs its local-corpus lookup and each fanned-out query through
+``once``, an exact-key single-flight, so two papers with the same focused
+query (or a speculative search and the search that replaces it) send it
+only once.
+
+All methods must be called from the event loop running the batch.
+"""
+import asyncio
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIMILARITY = 0.6
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "based", "by", "for", "from", "in", "into", "is", "of",
+    "on", "or", "our", "the", "this", "to", "towards", "using", "via", "we", "with",
+}
+
+
+def query_terms(text: str) -> frozenset:
+    """Significant lowercase terms of a search query."""
+    return frozenset(
+        word for word in re.findall(r"[a-z0-9]+", (text or "").lower())
+        if len(word) > 2 and word not in STOPWORDS
+    )
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class SharedLookups:
+    """
+    Args:
+        similarity: Minimum Jaccard similarity between two queries' terms for
+            them to share one search (1.0 = identical term sets only)
+        max_terms: Only the first ``max_terms`` terms of a query are compared,
+            matching how many words the finder actually sends
+    """
+
+    def __init__(self, similarity: float = DEFAULT_SIMILARITY, max_terms: int = 12):
+        self.similarity = similarity
+        self.max_terms = max_terms
+        self._searches = []  # [(terms, task)]
+        self._clusters = {}  # query -> index into _searches
+        self._rankings = {}  # cluster index -> task
+        self._lookups = {}  # (kind, key) -> task
+        self.stats = {
+            "searches": 0, "searches_shared": 0, "rankings": 0, "rankings_shared": 0,
+            "lookups": 0, "lookups_shared": 0,
+        }
+
+    def _cluster(self, query: str) -> tuple:
+        """Index of the most similar earlier search (or None) and this query's terms."""
+        terms = query_terms(" ".join(re.findall(r"[A-Za-z0-9]+", query or "")[:self.max_terms]))
+        best, best_score = None, 0.0
+        for index, (cluster_terms, _) in enumerate(self._searches):
+            score = jaccard(terms, cluster_terms)
+            if score >= self.similarity and score > best_score:
+                best, best_score = index, score
+        return best, terms
+
+    async def find(self, query: str, search) -> list:
+        """
+        Related papers for ``query``; ``search(query)`` is only awaited if no
+        similar query has been searched in this batch.
+        """
+        index, terms = self._cluster(query)
+        if index is None:
+            index = len(self._searches)
+            self._searches.append((terms, asyncio.ensure_future(search(query))))
+            self.stats["searches"] += 1
+        else:
+            self.stats["searches_shared"] += 1
+            logger.info("♻️ Reusing related-paper search from a similar paper in this batch")
+        self._clusters[query] = index
+        # Shielded: one paper's stage timeout must not cancel a search others are waiting on
+        return list(await asyncio.shield(self._searches[index][1]))
+
+    @staticmethod
+    def _reusable(task) -> bool:
+        """A task others may await: still running, or finished with a non-empty result."""
+        return not task.done() or not (task.cancelled() or task.exception() or not task.result())
+
+    async def once(self, kind: str, key, compute):
+        """
+        ``compute()``'s result for ``(kind, key)``, computed once per batch;
+        an earlier attempt that failed or came back empty is run again.
+        """
+        task = self._lookups.get((kind, key))
+        if task is None or not self._reusable(task):
+            task = asyncio.ensure_future(compute())
+            self._lookups[(kind, key)] = task
+            self.stats["lookups"] += 1
+        else:
+            self.stats["lookups_shared"] += 1
+            logger.debug("♻️ Reusing %s lookup from a paper in this batch", kind)
+        return await asyncio.shield(task)
+
+    async def rank(self, query: str, rank):
+        """
+        Ranking for the papers found for ``query``; ``rank()`` runs once per
+        shared search, later papers in the cluster reuse its result.
+        """
+        index = self._clusters.get(query)
+        if index is None:
+            return await rank()
+        task = self._rankings.get(index)
+        if task is None or not self._reusable(task):
+            # First paper of the cluster, or the earlier attempt failed: rank again
+            task = asyncio.ensure_future(rank())
+            self._rankings[index] = task
+            self.stats["rankings"] += 1
+        else:
+            self.stats["rankings_shared"] += 1
+            logger.info("♻️ Reusing LLM ranking from a similar paper in this batch")
+        return list(await asyncio.shield(task))
@@ -0,0 +1,140 @@
+"""
+Speculation - Related-paper search started before the metadata is known
+
+The search normally waits for ``ParserAgent``'s LLM call to extract the
+title, although a usable guess (the PDF's document-info title, or its first
+heading or line) exists as soon as the text is converted. ``SpeculativeSearch``
+starts the search from that guess while the LLM call is still running, and
+``claim`` reconciles it with the extracted title once it arrives:
+
+* hit: the two titles share enough significant terms (Jaccard similarity of
+  ``query_terms`` of at least ``SPECULATIVE_SEARCH_SIMILARITY``, default
+  0.8), so the speculative results are used; the search time that overlapped
+  the metadata call is saved. The heuristic guess has no keywords, so the
+  keyword queries it didn't send (``missing``) are run on top
+* miss: the speculative search is cancelled and the caller searches again
+  with the real title; the time it had run is wasted
+
+``report`` gives one review's outcome; ``SpeculationStats`` sums them.
+"""
+import asyncio
+import os
+import threading
+import time
+
+from . import tracing
+from .parser_agent import heuristic_abstract, heuristic_title
+from .shared_lookups import jaccard, query_terms
+
+
+def match_similarity() -> float:
+    return float(os.getenv('SPECULATIVE_SEARCH_SIMILARITY', '0.8'))
+
+
+class SpeculativeSearch:
+    """
+    One review's speculative search
+
+    Args:
+        search: ``search(title, abstract) -> (query, queries, coroutine)``,
+            the same search the pipeline would run with the extracted metadata
+            (``queries`` are the focused queries it fans out)
+    """
+
+    def __init__(self, search):
+        self.search = search
+        self.title = ''
+        self.query = None
+        self.queries = []
+        self.task = None
+        self.outcome = 'not_started'
+        self.similarity = None
+        self.started = None
+        self.finished = None
+        self.saved_s = 0.0
+        self.wasted_s = 0.0
+
+    def start(self, full_text: str, document_metadata: dict):
+        """``ParserAgent`` ``on_text`` hook: launch the search from the heuristic title (on the event loop)."""
+        self.title = heuristic_title(full_text, document_metadata)
+        if not self.title:
+            self.outcome = 'no_title'
+            return
+        self.query, self.queries, coroutine = self.search(self.title, heuristic_abstract(full_text))
+        self.started = time.monotonic()
+        self.outcome = 'running'
+        self.task = asyncio.ensure_future(self._run(coroutine))
+
+    async def _run(self, coroutine):
+        try:
+            with tracing.span('find.speculative', title=self.title[:80]):
+                return await coroutine
+        finally:
+            self.finished = time.monotonic()
+
+    def _ran_for(self, until: float) -> float:
+        return max(0.0, min(self.finished or until, until) - self.started)
+
+    def claim(self, title: str):
+        """
+        The speculative search task if it matches the extracted ``title``, else None
+        (the search is then cancelled and counted as wasted)
+        """
+        if self.task is None:
+            return None
+        now = time.monotonic()
+        self.similarity = jaccard(query_terms(self.title), query_terms(title))
+        # A search that already failed or found nothing is worth redoing with the real title
+        failed = self.task.done() and (self.task.cancelled() or self.task.exception() is not None or not self.task.result())
+        if self.similarity >= match_similarity() and not failed:
+            self.outcome = 'hit'
+            self.saved_s = self._ran_for(now)
+            return self.task
+        self.outcome = 'failed' if failed else 'miss'
+        self.wasted_s = self._ran_for(now)
+        self.task.cancel()
+        return None
+
+    def missing(self, queries: list) -> list:
+        """The ``queries`` the speculative search didn't send (nor a near-duplicate of them)."""
+        sent = [query_terms(query) for query in self.queries]
+        return [query for query in queries if not any(jaccard(query_terms(query), terms) >= 0.8 for terms in sent)]
+
+    def abandon(self):
+        """The pipeline ended before claiming the search (rejected paper, error, cancellation): stop it."""
+        if self.outcome != 'running':
+            return
+        self.outcome = 'abandoned'
+        self.wasted_s = self._ran_for(time.monotonic())
+        self.task.cancel()
+
+    def report(self) -> dict:
+        return {
+            'outcome': self.outcome,
+            'heuristic_title': self.title,
+            'title_similarity': round(self.similarity, 3) if self.similarity is not None else None,
+            'saved_s': round(self.saved_s, 3),
+            'wasted_s': round(self.wasted_s, 3),
+        }
+
+
+class SpeculationStats:
+    """Running totals of speculative searches across reviews (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {'launched': 0, 'hits': 0, 'misses': 0, 'abandoned': 0, 'saved_s': 0.0, 'wasted_s': 0.0}
+
+    def record(self, speculation: SpeculativeSearch):
+        with self._lock:
+            if speculation.started is not None:
+                self.totals['launched'] += 1
+            key = {'hit': 'hits', 'miss': 'misses', 'failed': 'misses', 'abandoned': 'abandoned'}.get(speculation.outcome)
+            if key:
+                self.totals[key] += 1
+            self.totals['saved_s'] = round(self.totals['saved_s'] + speculation.saved_s, 3)
+            self.totals['wasted_s'] = round(self.totals['wasted_s'] + speculation.wasted_s, 3)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.totals)
@@ -0,0 +1,218 @@
+"""
+Structured - Schema-constrained JSON output shared by the LLM agents
+
+Every agent asks the model for JSON that follows its schema in ``schemas``
+(``agent_options``: the schema as the ``LlmAgent``'s ``output_schema``, which
+ADK sends as JSON mode plus ``response_schema``) and reads the answer with ``generate``, which validates it against the same schema. An
+answer that isn't valid JSON or misses required fields is not a failed
+review: the same call is retried with a repair prompt (the original prompt,
+the rejected answer and what was wrong with it), up to
+``STRUCTURED_REPAIR_ATTEMPTS`` times (default 1). Only when the repairs are
+also invalid does the caller get a ``StructuredOutputError``.
+
+``stats`` counts valid, repaired and failed answers per agent.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Literal, Optional
+
+from . import tracing
+from .llm_client import run_prompt
+
+logger = logging.getLogger(__name__)
+
+# Characters of a rejected answer quoted back to the model in the repair prompt
+MAX_REJECTED_CHARS = 30000
+# Errors listed in the repair prompt (and the exception message)
+MAX_ERRORS = 10
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+class StructuredOutputError(ValueError):
+    """The model's answer is not JSON that follows the agent's schema."""
+
+
+def repair_attempts() -> int:
+    return int(os.getenv("STRUCTURED_REPAIR_ATTEMPTS", "1"))
+
+
+def _annotation(schema: dict, name: str):
+    kind = schema.get("type")
+    if kind == "object":
+        return _output_model(schema, name)
+    if kind == "array":
+        return list[_annotation(schema.get("items", {}), f"{name}Item")]
+    if kind == "string":
+        return Literal[tuple(schema["enum"])] if schema.get("enum") else str
+    return {"integer": int, "boolean": bool}[kind]
+
+
+def _output_model(schema: dict, name: str):
+    from pydantic import Field, create_model
+
+    fields = {}
+    for key, child in schema.get("properties", {}).items():
+        annotation = _annotation(child, name + re.sub(r"\W", "", key.title()))
+        # Keys such as "Title and Abstract" aren't identifiers; the alias keeps them in the schema
+        field = re.sub(r"\W+", "_", key)
+        if key in schema.get("required", []):
+            fields[field] = (annotation, Field(alias=key))
+        else:
+            fields[field] = (Optional[annotation], Field(None, alias=key))
+    return create_model(name, **fields)
+
+
+@lru_cache(maxsize=None)
+def output_model(schema_name: str):
+    """Pydantic model of ``schemas.<schema_name>``, the form ``LlmAgent.output_schema`` accepts."""
+    from . import schemas
+
+    return _output_model(getattr(schemas, schema_name), schema_name.title().replace("_", ""))
+
+
+def agent_options(schema_name: str, **options) -> dict:
+    """
+    ``build_runner`` options constraining the answer to JSON following
+    ``schemas.<schema_name>`` (``options`` e.g. temperature)
+    """
+    built = {"output_schema": output_model(schema_name)}
+    if options:
+        from google.genai import types
+
+        built["generate_content_config"] = types.GenerateContentConfig(**options)
+    return built
+
+
+def response_text(response_list: list) -> str:
+    """Text of the last event that carries any."""
+    for item in reversed(response_list):
+        if hasattr(item, "content") and item.content and item.content.parts:
+            text = "".join(part.text for part in item.content.parts if getattr(part, "text", None))
+            if text:
+                return text
+    return ""
+
+
+def validate(value, schema: dict, path: str = "$") -> list:
+    """Where ``value`` departs from ``schema``: one message per problem, [] if it conforms."""
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            return [f"{path}: expected an object"]
+        errors = [f"{path}.{key}: missing" for key in schema.get("required", []) if key not in value]
+        for key, child in schema.get("properties", {}).items():
+            # Optional fields come back as null when the model leaves them out
+            if key in value and not (value[key] is None and key not in schema.get("required", [])):
+                errors.extend(validate(value[key], child, f"{path}.{key}"))
+        return errors
+    if kind == "array":
+        if not isinstance(value, list):
+            return [f"{path}: expected an array"]
+        errors = []
+        for index, item in enumerate(value):
+            errors.extend(validate(item, schema.get("items", {}), f"{path}[{index}]"))
+        return errors
+    if kind == "string":
+        if not isinstance(value, str):
+            return [f"{path}: expected a string"]
+        if schema.get("enum") and value not in schema["enum"]:
+            return [f"{path}: expected one of {', '.join(schema['enum'])}"]
+        return []
+    if kind == "integer":
+        if isinstance(value, bool) or not (isinstance(value, int) or (isinstance(value, float) and value.is_integer())):
+            return [f"{path}: expected an integer"]
+        return []
+    if kind == "boolean":
+        return [] if isinstance(value, bool) else [f"{path}: expected true or false"]
+    return []
+
+
+def decode(text: str):
+    """JSON value of an answer; a Markdown fence around it (some models add one even in JSON mode) is tolerated."""
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    if not text:
+        raise StructuredOutputError("empty response")
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"invalid JSON: {e}") from e
+
+
+def parse(text: str, schema: dict, name: str):
+    """Decode and validate one answer of agent ``name``; raises ``StructuredOutputError``."""
+    with tracing.span("json.parse", profile=True, agent=name, chars=len(text or "")):
+        data = decode(text)
+        errors = validate(data, schema)
+    if errors:
+        more = f" (+{len(errors) - MAX_ERRORS} more)" if len(errors) > MAX_ERRORS else ""
+        raise StructuredOutputError("; ".join(errors[:MAX_ERRORS]) + more)
+    return data
+
+
+def repair_prompt(prompt: str, rejected: str, error: Exception) -> str:
+    return (
+        f"{prompt}\n\n"
+        "----- YOUR PREVIOUS ANSWER -----\n"
+        f"{(rejected or '(empty)')[:MAX_REJECTED_CHARS]}\n"
+        "----- END OF PREVIOUS ANSWER -----\n\n"
+        f"That answer was rejected: {error}.\n"
+        "Answer again with the complete JSON object in the required structure, nothing else."
+    )
+
+
+def _count(name: str, outcome: str):
+    with _stats_lock:
+        counts = _stats.setdefault(name, {"valid": 0, "repaired": 0, "failed": 0})
+        counts[outcome] += 1
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+
+async def generate(build_runner, prompt: str, schema: dict, *, model: str, name: str,
+                   llm_options: dict | None = None, text: str | None = None):
+    """
+    Ask agent ``name`` for ``prompt`` and return its answer validated against ``schema``
+
+    Args:
+        build_runner: Runner factory, as for ``run_prompt``; the repair
+            prompt goes to a fresh runner from it
+        llm_options: ``run_prompt`` options (timeout, hedge)
+        text: An answer already generated (e.g. streamed); only parsed,
+            and repaired if needed
+
+    Raises:
+        StructuredOutputError: the answer and its repairs were all invalid
+    """
+    llm_options = llm_options or {}
+    if text is None:
+        text = response_text(await run_prompt(build_runner, prompt, model=model, **llm_options))
+    attempt = 0
+    while True:
+        try:
+            data = parse(text, schema, name)
+        except StructuredOutputError as e:
+            if attempt >= repair_attempts():
+                _count(name, "failed")
+                logger.error("❌ %s output still invalid after %d repair(s): %s", name, attempt, e)
+                raise
+            attempt += 1
+            logger.warning("🔧 %s output invalid (%s); repair %d/%d", name, e, attempt, repair_attempts())
+            with tracing.span("structured.repair", agent=name, attempt=attempt):
+                text = response_text(await run_prompt(
+                    build_runner, repair_prompt(prompt, text, e), model=model, **llm_options
+                ))
+            continue
+        _count(name, "repaired" if attempt else "valid")
+        return data
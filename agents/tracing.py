@@ -0,0 +1,317 @@
+"""
+Tracing - Spans across the review pipeline, plus opt-in cProfile capture
+
+A review runs inside ``trace(...)``: a root span per review token. Code
+anywhere below it opens child spans with ``span(name, **attrs)``; the
+current span travels in a context variable, so it follows ``await``s and
+tasks. Worker threads need ``in_context(fn)`` (``asyncio.to_thread``
+already copies the context). Outside a trace, ``span`` is a no-op.
+
+Finished traces go to the exporter picked by ``TRACE_EXPORTER``:
+
+* ``jsonl`` - one line per span appended to ``<TRACE_DIR>/spans.jsonl``
+* ``chrome`` - ``<TRACE_DIR>/<trace_id>.trace.json`` in Chrome trace-event
+  format (open in chrome://tracing or https://ui.perfetto.dev)
+* empty (default) - spans are collected but not written
+
+With ``profile=True`` every span opened with ``profile=True`` (the CPU-bound
+parts: PDF conversion, JSON parsing, prompt building) also runs under
+cProfile. The profiles are merged into ``<TRACE_DIR>/<trace_id>.prof`` for
+``python -m pstats`` or snakeviz.
+"""
+import asyncio
+import contextvars
+import cProfile
+import functools
+import itertools
+import json
+import logging
+import os
+import pstats
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+DEFAULT_TRACE_DIR = "traces"
+
+_current_span = contextvars.ContextVar("trace_span", default=None)
+_span_ids = itertools.count(1)
+_jsonl_lock = threading.Lock()  # Reviews finishing together append to the same file
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """One timed operation; ``set`` adds attributes while it runs."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attrs", "start", "end", "lane")
+
+    def __init__(self, trace, name: str, parent_id: int | None, attrs: dict):
+        self.trace = trace
+        self.span_id = next(_span_ids)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end = None
+        self.lane = _lane()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.trace.started_at + (self.start - self.trace.start), 6),
+            "duration_s": round(self.duration, 6),
+            "lane": self.lane,
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _lane() -> str:
+    """Row of the span in trace viewers: the asyncio task, or the thread outside a loop."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return task.get_name()
+    return threading.current_thread().name
+
+
+class Trace:
+    """The spans of one review, plus the profiles captured while it ran."""
+
+    def __init__(self, name: str, trace_id: str | None = None, profile: bool = False):
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.profile = profile
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self.profiles = []  # cProfile.Profile objects or paths of dumped stats
+        self.files = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def add_profile(self, profile):
+        with self._lock:
+            self.profiles.append(profile)
+
+    def summary(self) -> dict:
+        """Total seconds per span name, slowest first."""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return {name: round(total, 3) for name, total in sorted(totals.items(), key=lambda item: -item[1])}
+
+
+class JsonlExporter:
+    """Appends every span as one JSON line to ``<directory>/spans.jsonl``."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def export(self, trace: Trace) -> list:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, "spans.jsonl")
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in trace.spans)
+        with _jsonl_lock, open(path, "a") as f:
+            f.write(lines)
+        return [path]
+
+
+class ChromeTraceExporter:
+    """Writes ``<directory>/<trace_id>.trace.json`` as Chrome trace events (one row per task/thread)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def export(self, trace: Trace) -> list:
+        os.makedirs(self.directory, exist_ok=True)
+        lanes = {}
+        events = []
+        for span in sorted(trace.spans, key=lambda span: span.start):
+            tid = lanes.setdefault(span.lane, len(lanes) + 1)
+            events.append({
+                "name": span.name,
+                "ph": "X",
+                "ts": round((span.start - trace.start) * 1e6, 1),
+                "dur": round(span.duration * 1e6, 1),
+                "pid": 1,
+                "tid": tid,
+                "args": span.attrs,
+            })
+        events.extend(
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": lane}}
+            for lane, tid in lanes.items()
+        )
+        path = os.path.join(self.directory, f"{trace.trace_id}.trace.json")
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"trace_id": trace.trace_id, "name": trace.name}}, f, default=str)
+        return [path]
+
+
+EXPORTERS = {"jsonl": JsonlExporter, "chrome": ChromeTraceExporter}
+
+
+def trace_dir() -> str:
+    return os.getenv("TRACE_DIR", DEFAULT_TRACE_DIR)
+
+
+def get_exporter():
+    """Exporter configured by ``TRACE_EXPORTER``, or None when traces aren't written."""
+    kind = os.getenv("TRACE_EXPORTER", "").strip().lower()
+    if not kind or kind == "none":
+        return None
+    if kind not in EXPORTERS:
+        logger.warning("⚠️ Unknown TRACE_EXPORTER '%s'; expected one of %s", kind, sorted(EXPORTERS))
+        return None
+    return EXPORTERS[kind](trace_dir())
+
+
+def current_trace() -> Trace | None:
+    span = _current_span.get()
+    return span.trace if span is not None else None
+
+
+@contextmanager
+def trace(name: str, trace_id: str | None = None, profile: bool = False, **attrs):
+    """
+    Root span of one review; on exit the trace is exported and its profiles merged
+
+    Yields the ``Trace``; its ``files`` lists what was written.
+    """
+    current = Trace(name, trace_id=trace_id, profile=profile)
+    root = Span(current, name, None, attrs)
+    token = _current_span.set(root)
+    try:
+        yield current
+    except BaseException as exc:
+        root.set(error=f"{type(exc).__name__}: {exc}")
+        raise
+    finally:
+        _current_span.reset(token)
+        root.end = time.perf_counter()
+        current.add(root)
+        _export(current)
+
+
+def _export(current: Trace):
+    try:
+        exporter = get_exporter()
+        if exporter:
+            current.files.extend(exporter.export(current))
+        if current.profiles:
+            current.files.append(_merge_profiles(current))
+    except Exception as exc:
+        logger.warning("⚠️ Trace export failed: %s", exc)
+
+
+def _merge_profiles(current: Trace) -> str:
+    os.makedirs(trace_dir(), exist_ok=True)
+    stats = None
+    for profile in current.profiles:
+        if isinstance(profile, str):
+            try:
+                loaded = pstats.Stats(profile)
+            except (OSError, EOFError, TypeError, ValueError):
+                continue  # The worker never got to dump it
+            finally:
+                if os.path.exists(profile):
+                    os.remove(profile)
+        else:
+            loaded = pstats.Stats(profile)
+        stats = loaded if stats is None else stats.add(loaded)
+    path = os.path.join(trace_dir(), f"{current.trace_id}.prof")
+    if stats is not None:
+        stats.dump_stats(path)
+    return path
+
+
+@contextmanager
+def span(name: str, profile: bool = False, **attrs):
+    """
+    Child span of the current one (no-op outside a trace)
+
+    ``profile=True`` marks CPU-bound work: it runs under cProfile when the
+    trace was started with profiling on. Only this thread is profiled.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    current = Span(parent.trace, name, parent.span_id, attrs)
+    token = _current_span.set(current)
+    profiler = None
+    if profile and parent.trace.profile:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            profiler = None  # Another profiler is already active on this thread (nested span)
+    try:
+        yield current
+    except BaseException as exc:
+        current.set(error=f"{type(exc).__name__}: {exc}")
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            parent.trace.add_profile(profiler)
+        _current_span.reset(token)
+        current.end = time.perf_counter()
+        parent.trace.add(current)
+
+
+def in_context(fn, *args, **kwargs):
+    """
+    ``fn(*args, **kwargs)`` bound to a copy of the caller's context, so spans it
+    opens in a worker thread join the current trace. Call the result once.
+    """
+    return functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def profile_path() -> str | None:
+    """Where a worker process should dump a profile for the current trace (None when not profiling)."""
+    current = current_trace()
+    if current is None or not current.profile:
+        return None
+    fd, path = tempfile.mkstemp(prefix=f"{current.trace_id}.", suffix=".prof")
+    os.close(fd)
+    current.add_profile(path)
+    return path
+
+
+def run_profiled(path: str, fn, *args, **kwargs):
+    """Call ``fn`` under cProfile and dump the stats to ``path``; picklable, so it works in process pools."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
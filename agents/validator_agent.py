@@ -2,10 +2,8 @@
 Validation Agent - Determines if uploaded content is a research paper
 """
 import asyncio
-import json
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
+from . import schemas, structured
+from .llm_client import build_runner
 
 
 class PaperValidationAgent:
@@ -33,26 +31,19 @@ class PaperValidationAgent:
                 "Be strict: marketing brochures, resumes, or blank documents are not research papers."
             ),
         }
+        # Per-call LLM policy (attempt timeout, hedging); RootAgent may override it
+        self.llm_options = {"timeout": None, "hedge": False}
 
-    def _build_runner(self) -> InMemoryRunner:
-        agent = LlmAgent(
-            name=self._agent_config["name"],
-            model=Gemini(model=self._agent_config["model_name"]),
-            description=self._agent_config["description"],
-            instruction=self._agent_config["instruction"],
-            tools=[],
-        )
-        return InMemoryRunner(agent=agent)
+    def _build_runner(self):
+        return build_runner(self._agent_config, **structured.agent_options("VALIDATION"))
 
-    async def validate_document_async(self, *, paper_text: str, metadata: dict | None = None) -> dict:
-        """Run validation asynchronously."""
-        runner = self._build_runner()
+    def _build_prompt(self, paper_text: str, metadata: dict | None = None) -> str:
         metadata = metadata or {}
         title = metadata.get("title", "Unknown Title")
         abstract = metadata.get("abstract", "") or "No abstract provided."
         # Clamp text to avoid overly long prompts
         sample_text = (paper_text or "")[:20000]
-        prompt = (
+        return (
             f"Title: {title}\n"
             f"Abstract: {abstract}\n\n"
             "PDF Content Sample:\n"
@@ -61,30 +52,15 @@ class PaperValidationAgent:
             "----- END OF SAMPLE -----\n\n"
             "Decide if this is a legitimate research paper following the instructions."
         )
-        try:
-            response_list = await runner.run_debug(prompt)
-            final_text = ""
-            for item in reversed(response_list):
-                if hasattr(item, "content") and item.content and item.content.parts:
-                    for part in item.content.parts:
-                        if hasattr(part, "text") and part.text:
-                            final_text = part.text
-                            break
-                if final_text:
-                    break
-
-            if not final_text:
-                return {"error": "No response from validation agent"}
-
-            # Extract JSON payload
-            if "```json" in final_text:
-                final_text = final_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in final_text:
-                final_text = final_text.split("```")[1].split("```")[0].strip()
-
-            data = json.loads(final_text)
-            return data
 
+    async def validate_document_async(self, *, paper_text: str, metadata: dict | None = None) -> dict:
+        """Run validation asynchronously."""
+        prompt = self._build_prompt(paper_text, metadata)
+        try:
+            return await structured.generate(
+                self._build_runner, prompt, schemas.VALIDATION,
+                model=self._agent_config["model_name"], name=self._agent_config["name"], llm_options=self.llm_options
+            )
         except Exception as exc:
             return {"error": f"Validation failed: {str(exc)}"}
 
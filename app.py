@@ -1,156 +1,698 @@
+import time
+APP_IMPORT_STARTED = time.perf_counter()  # Before the other imports, so cold start includes them
+
 import os
 import json
 import uuid
+import hashlib
+import asyncio
+import logging
 import threading
 from datetime import datetime
 from pathlib import Path
-from flask import Flask, request, jsonify, render_template, send_from_directory
-from werkzeug.utils import secure_filename
+from flask import Flask, request, jsonify, render_template, send_from_directory, send_file, Response
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wsgi import get_input_stream
 from dotenv import load_dotenv
+from agents import structured
+from agents.jobs import BATCH, INTERACTIVE, PRIORITIES, Job, JobCancelled, check_cancelled, running
+from agents.logs import configure_logging
 from agents.root_agent import RootAgent
+from agents.shared_lookups import SharedLookups
+from services.uploads import PdfUploadIngestor, UploadRejected
+from services.review_files import negotiate_encoding, representation_etag, response_path, write_review_response
+from services.review_store import TERMINAL_STATUSES, ReviewStore
 
 # Load environment variables
 load_dotenv()
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max
 app.config['ALLOWED_EXTENSIONS'] = {'pdf'}
+app.config['MAX_PDF_PAGES'] = int(os.getenv('MAX_PDF_PAGES', '0')) or None  # 0 = no page limit
+app.config['UPLOAD_CHUNK_SIZE'] = 64 * 1024
+app.config['REVIEWS_FOLDER'] = 'reviews'
+app.config['BATCH_MAX_FILES'] = int(os.getenv('BATCH_MAX_FILES', '50'))
+app.config['BATCH_MAX_CONTENT_LENGTH'] = int(os.getenv('BATCH_MAX_MB', '200')) * 1024 * 1024
+app.config['BATCH_CONCURRENCY'] = int(os.getenv('BATCH_CONCURRENCY', '4'))
+app.config['BULK_STATUS_MAX_TOKENS'] = int(os.getenv('BULK_STATUS_MAX_TOKENS', '1000'))
+app.config['WARMUP_ON_START'] = os.getenv('WARMUP_ON_START', '1').lower() in ('1', 'true', 'yes')
 
 # Create necessary directories
 Path(app.config['UPLOAD_FOLDER']).mkdir(exist_ok=True)
-Path('reviews').mkdir(exist_ok=True)
+Path(app.config['REVIEWS_FOLDER']).mkdir(exist_ok=True)
 
 # Initialize root agent
-root_agent = RootAgent()
+root_agent = RootAgent.from_env()
 
-# In-memory storage for reviews (use database in production)
-reviews_db = {}
+# Review status rows: byte-bounded LRU in memory, finished reviews persisted to disk
+reviews_db = ReviewStore(
+    app.config['REVIEWS_FOLDER'],
+    max_bytes=int(float(os.getenv('REVIEW_CACHE_MB', '16')) * 1024 * 1024)
+)
+# Batches of papers submitted together: the papers' review tokens and aggregate state
+batches_db = ReviewStore(os.path.join(app.config['REVIEWS_FOLDER'], 'batches'), max_bytes=2 * 1024 * 1024)
+uploads_lock = threading.Lock()
+# token -> Job of the reviews running in this process; a cancel request goes through here
+active_jobs = {}
+jobs_lock = threading.Lock()
+ACTIVE_STATUSES = ('queued', 'processing', 'completed')
+# Cold-start measurements, reported by /api/health
+startup = {'import_s': None, 'warmup': 'disabled', 'warmup_timings': None, 'ready_after_s': None}
 
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+def make_ingestor(content_type, batch=False):
+    """Upload ingestor configured for a single paper or a batch"""
+    return PdfUploadIngestor(
+        content_type,
+        app.config['UPLOAD_FOLDER'],
+        max_bytes=app.config['MAX_CONTENT_LENGTH'],
+        max_pages=app.config['MAX_PDF_PAGES'],
+        allowed_extensions=app.config['ALLOWED_EXTENSIONS'],
+        field_name='files' if batch else 'file',
+        max_files=app.config['BATCH_MAX_FILES'] if batch else 1,
+        allow_zip=batch
+    )
 
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+def profile_requested(args):
+    """``?profile=1`` on an upload captures a cProfile of that review's CPU-bound steps"""
+    return str(args.get('profile', '')).lower() in ('1', 'true', 'yes')
 
 
-@app.route('/api/upload', methods=['POST'])
-def upload_paper():
-    """Handle paper upload and initiate review process"""
+def priority_requested(args):
+    """
+    ``?priority=batch`` lets an upload yield to interactive ones under contention
+
+    Returns ``(priority, None)`` or ``(None, (error body, status))``.
+    """
+    priority = (args.get('priority') or INTERACTIVE).strip().lower()
+    if priority not in PRIORITIES:
+        return None, ({'error': f"Invalid priority '{priority}'; expected one of: {', '.join(PRIORITIES)}"}, 400)
+    return priority, None
+
+
+def revision_source(args):
+    """
+    ``?revision_of=<token>`` links an upload to the review of its earlier version
+
+    Returns ``(previous_token, None)``, ``(None, None)`` without the parameter,
+    or ``(None, (error body, status))`` when the earlier review can't be used.
+    """
+    previous_token = (args.get('revision_of') or '').strip()
+    if not previous_token:
+        return None, None
+    previous = reviews_db.get(previous_token)
+    if previous is None:
+        return None, ({'error': 'Invalid review token in revision_of'}, 404)
+    if previous['status'] != 'completed' or not previous.get('basis_file'):
+        return None, ({'error': 'The previous review must be completed before a revision can be linked to it',
+                       'status': previous['status']}, 400)
+    return previous_token, None
+
+
+def load_previous_version(previous_token):
+    """What ``RootAgent`` needs to review a revision: the earlier version's basis and final result"""
+    previous = reviews_db.get(previous_token)
+    with open(previous['basis_file']) as f:
+        basis = json.load(f)
+    with open(os.path.join(app.config['REVIEWS_FOLDER'], f"{previous_token}.json")) as f:
+        result = json.load(f)
+    return {'token': previous_token, 'basis': basis, 'result': result, 'version': previous.get('version', 1)}
+
+
+def too_large_message(batch=False):
+    if batch:
+        return f"Batch exceeds the {app.config['BATCH_MAX_CONTENT_LENGTH'] // (1024 * 1024)}MB limit"
+    return 'File exceeds the 10MB limit'
+
+
+def ingest_upload(batch=False):
+    """Stream the multipart body to disk, hashing and validating it on the way"""
+    ingestor = make_ingestor(request.content_type, batch)
     try:
-        # Check if file is in request
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Only PDF files are allowed'}), 400
+        if batch:
+            # Batches get their own, larger body limit than single uploads
+            stream = get_input_stream(request.environ, max_content_length=app.config['BATCH_MAX_CONTENT_LENGTH'])
+        else:
+            stream = request.stream
+        chunk_size = app.config['UPLOAD_CHUNK_SIZE']
+        while True:
+            chunk = stream.read(chunk_size)
+            ingestor.feed(chunk)
+            if not chunk:
+                break
+        if batch:
+            return ingestor.finish_many(), ingestor.rejected
+        return ingestor.finish()
+    except Exception:
+        ingestor.abort()
+        raise
+
+
+def register_upload(upload, status='processing', **extra):
+    """Create the review row for an ingested file, or return the token of an identical earlier upload
+
+    Returns:
+        ``(token, file_path, deduplicated)``; ``file_path`` is None when deduplicated
+    """
+    with uploads_lock:
+        # Identical PDF already reviewed or in progress (as a revision of the same review): hand back that review
+        existing_token = reviews_db.find_by_hash(
+            upload.sha256, statuses=ACTIVE_STATUSES, revision_of=extra.get('revision_of')
+        )
+        if existing_token:
+            os.remove(upload.path)
+            return existing_token, None, True
         
         # Generate unique token
         review_token = str(uuid.uuid4())
         
-        # Save uploaded file
-        filename = secure_filename(file.filename)
+        # Move the streamed file into place
+        filename = upload.filename
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{review_token}_{filename}")
-        file.save(file_path)
+        os.replace(upload.path, file_path)
         
         # Initialize review entry
-        reviews_db[review_token] = {
-            'token': review_token,
+        reviews_db.create(review_token, {
             'original_filename': filename,
             'file_path': file_path,
-            'status': 'processing',
+            'sha256': upload.sha256,
+            'size_bytes': upload.size,
+            'page_count': upload.page_count,
+            'status': status,
             'uploaded_at': datetime.now().isoformat(),
-            'progress': 'Uploaded successfully. Starting review process...'
-        }
-        
-        # Start processing in background
-        threading.Thread(target=process_review, args=(review_token, file_path), daemon=True).start()
-        
-        return jsonify({
+            'progress': 'Uploaded successfully. Starting review process...',
+            **extra
+        })
+        return review_token, file_path, False
+
+
+def revision_fields(previous_token):
+    """Extra review-row fields for an upload that revises ``previous_token`` (none otherwise)"""
+    if not previous_token:
+        return {}
+    return {'revision_of': previous_token, 'version': reviews_db.get(previous_token).get('version', 1) + 1}
+
+
+def upload_payload(review_token, deduplicated):
+    if deduplicated:
+        return {
             'success': True,
             'token': review_token,
-            'message': 'Paper uploaded successfully. Processing started.'
+            'deduplicated': True,
+            'message': 'This paper was already uploaded. Returning the existing review.'
+        }
+    return {
+        'success': True,
+        'token': review_token,
+        'deduplicated': False,
+        'message': 'Paper uploaded successfully. Processing started.'
+    }
+
+
+def create_batch(uploads, rejected):
+    """Register a batch's papers; returns ``(batch_id, response payload, jobs to run)``"""
+    batch_id = str(uuid.uuid4())
+    papers, jobs = [], []
+    for upload in uploads:
+        review_token, file_path, deduplicated = register_upload(
+            upload, status='queued', batch_id=batch_id
+        )
+        papers.append({'token': review_token, 'filename': upload.filename, 'deduplicated': deduplicated})
+        if not deduplicated and (review_token, file_path) not in jobs:
+            jobs.append((review_token, file_path))
+    
+    batches_db.create(batch_id, {
+        'status': 'processing' if jobs else 'completed',
+        'created_at': datetime.now().isoformat(),
+        'papers': papers,
+        'rejected': rejected
+    })
+    return batch_id, {
+        'success': True,
+        'batch_id': batch_id,
+        'papers': papers,
+        'rejected': rejected,
+        'message': f'{len(papers)} paper(s) accepted. Processing started.'
+    }, jobs
+
+
+def status_payload(token):
+    """Body of /api/status/<token>, or None for an unknown token"""
+    review = reviews_db.get(token)
+    if review is None:
+        return None
+    return {
+        'token': token,
+        'status': review['status'],
+        'stage': review.get('stage'),
+        'progress': review.get('progress', ''),
+        'partial_review': review.get('partial_review'),
+        'uploaded_at': review.get('uploaded_at'),
+        'completed_at': review.get('completed_at'),
+        'revision_of': review.get('revision_of'),
+        'version': review.get('version', 1),
+        'seq': review.get('seq')
+    }
+
+
+def bulk_status_query(args, body=None):
+    """
+    Tokens and cursor of a bulk status request, from the query string
+    (``tokens=a,b&since=42``) or a JSON body (``{"tokens": [...], "since": 42}``)
+
+    ``since`` is a change-sequence cursor (the ``seq`` of an earlier response),
+    ``since_time`` an ISO 8601 or epoch timestamp. Returns ``(query, None)``
+    or ``(None, (error body, status))``.
+    """
+    source = body if isinstance(body, dict) else args
+    tokens = source.get('tokens')
+    if isinstance(tokens, str):
+        tokens = [token.strip() for token in tokens.split(',') if token.strip()]
+    if tokens is not None and not (isinstance(tokens, list) and all(isinstance(token, str) for token in tokens)):
+        return None, ({'error': 'tokens must be a list of review tokens'}, 400)
+    if tokens is not None and len(tokens) > app.config['BULK_STATUS_MAX_TOKENS']:
+        return None, ({'error': f"At most {app.config['BULK_STATUS_MAX_TOKENS']} tokens per request"}, 400)
+    
+    since, since_time = source.get('since'), source.get('since_time')
+    try:
+        since = int(since) if since not in (None, '') else None
+    except (TypeError, ValueError):
+        return None, ({'error': 'since must be an integer change sequence'}, 400)
+    if since_time not in (None, ''):
+        try:
+            since_time = float(since_time)
+        except (TypeError, ValueError):
+            try:
+                since_time = datetime.fromisoformat(str(since_time)).timestamp()
+            except ValueError:
+                return None, ({'error': 'since_time must be an ISO 8601 or epoch timestamp'}, 400)
+    else:
+        since_time = None
+    
+    if tokens is None and since is None and since_time is None:
+        return None, ({'error': 'Provide tokens, a since cursor, or both'}, 400)
+    return {'tokens': list(dict.fromkeys(tokens)) if tokens is not None else None,
+            'since': since, 'since_time': since_time}, None
+
+
+def bulk_status_payload(query, if_none_match):
+    """
+    Statuses of the requested tokens that changed after the cursor
+
+    Returns ``(body, etag)``; ``body`` is None when the client's ETag still
+    matches (304). The ETag only moves when one of the requested reviews
+    changed, so a dashboard polling an idle set gets 304s. The body's ``seq``
+    is read before collecting, so a change racing the request is sent again
+    on the next poll rather than missed.
+    """
+    tokens, since, since_time = query['tokens'], query['since'], query['since_time']
+    seq = reviews_db.seq
+    if tokens is None:
+        relevant = seq
+    else:
+        relevant = max((reviews_db.last_change(token) or 0 for token in tokens), default=0)
+    etag = hashlib.sha256(json.dumps(
+        [sorted(tokens) if tokens is not None else None, since, since_time, relevant]
+    ).encode()).hexdigest()[:32]
+    if if_none_match.contains_weak(etag):
+        return None, etag
+    
+    if since is None and since_time is None:
+        candidates = tokens
+    else:
+        changed = reviews_db.changed_since(since, since_time)
+        if tokens is not None:
+            changed = set(changed)
+        candidates = changed if tokens is None else [token for token in tokens if token in changed]
+    statuses = []
+    for token in candidates:
+        payload = status_payload(token)
+        if payload is not None:
+            statuses.append(payload)
+    missing = [token for token in tokens if token not in reviews_db] if tokens is not None else []
+    return {'seq': seq, 'statuses': statuses, 'missing': missing}, etag
+
+
+def select_review_file(token, review, accept_encodings, if_none_match):
+    """
+    Which stored representation answers a GET of a completed review
+
+    Returns ``(encoding, etag, path)``; ``path`` is None when the client's
+    copy (in any encoding of the same body) is still fresh, i.e. 304.
+    """
+    served = review['response']
+    encoding = negotiate_encoding(accept_encodings, served['encodings'])
+    etag = representation_etag(served['etag'], encoding)
+    if any(if_none_match.contains_weak(representation_etag(served['etag'], candidate))
+           for candidate in served['encodings']):
+        return encoding, etag, None
+    return encoding, etag, os.path.abspath(response_path(app.config['REVIEWS_FOLDER'], token, encoding))
+
+
+def reviews_payload():
+    reviews = []
+    for review in reviews_db.rows():
+        reviews.append({
+            'token': review['token'],
+            'status': review['status'],
+            'original_filename': review.get('original_filename'),
+            'uploaded_at': review.get('uploaded_at'),
+            'completed_at': review.get('completed_at')
         })
+    return {'reviews': reviews}
+
+
+def batch_payload(batch_id):
+    """Body of /api/batch/<batch_id>, or None for an unknown batch"""
+    batch = batches_db.get(batch_id)
+    if batch is None:
+        return None
+    
+    counts = {'queued': 0, 'processing': 0, 'completed': 0, 'failed': 0, 'cancelled': 0}
+    papers = []
+    for paper in batch['papers']:
+        review = reviews_db.get(paper['token']) or {'status': 'failed', 'progress': 'Review no longer available'}
+        counts[review['status']] = counts.get(review['status'], 0) + 1
+        papers.append({
+            **paper,
+            'status': review['status'],
+            'stage': review.get('stage'),
+            'progress': review.get('progress', '')
+        })
+    
+    finished = counts['completed'] + counts['failed'] + counts['cancelled']
+    return {
+        'batch_id': batch_id,
+        'status': batch['status'],
+        'total': len(papers),
+        'counts': counts,
+        'progress': round(finished / len(papers), 3) if papers else 1.0,
+        'papers': papers,
+        'rejected': batch.get('rejected', []),
+        'created_at': batch.get('created_at'),
+        'completed_at': batch.get('completed_at')
+    }
+
+
+def batch_result_lines(batch):
+    """One JSON line per paper: the review for completed papers, the error for failed or cancelled ones"""
+    for paper in batch['papers']:
+        review = reviews_db.get(paper['token']) or {'status': 'failed', 'error': 'Review no longer available'}
+        line = {'token': paper['token'], 'original_filename': paper['filename'], 'status': review['status']}
+        if review['status'] == 'completed':
+            with open(os.path.join(app.config['REVIEWS_FOLDER'], f"{paper['token']}.json")) as f:
+                line['result'] = json.load(f)
+        elif review['status'] == 'failed':
+            line['error'] = review.get('error')
+        elif review['status'] == 'cancelled':
+            line['error'] = review.get('progress') or 'Review cancelled'
+        yield json.dumps(line) + '\n'
+
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+
+@app.route('/api/upload', methods=['POST'])
+def upload_paper():
+    """
+    Handle paper upload and initiate review process (``?revision_of=<token>``
+    for a revised version, ``?priority=batch`` to yield to interactive reviews)
+    """
+    try:
+        previous_token, error = revision_source(request.args)
+        if not error:
+            priority, error = priority_requested(request.args)
+        if error:
+            body, status = error
+            return jsonify(body), status
+        
+        try:
+            upload = ingest_upload()
+        except UploadRejected as e:
+            return jsonify({'error': e.message}), e.status
+        except RequestEntityTooLarge:
+            return jsonify({'error': too_large_message()}), 413
+        
+        review_token, file_path, deduplicated = register_upload(upload, **revision_fields(previous_token))
+        if not deduplicated:
+            # Start processing in background
+            threading.Thread(
+                target=process_review,
+                args=(review_token, file_path, profile_requested(request.args), previous_token, priority),
+                daemon=True
+            ).start()
+        
+        return jsonify(upload_payload(review_token, deduplicated))
     
     except Exception as e:
-        app.logger.error(f"Upload error: {str(e)}")
+        app.logger.error("Upload error: %s", e)
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
 
-def process_review(review_token, file_path):
+def process_review(review_token, file_path, profile=False, revision_of=None, priority=INTERACTIVE):
     """Process the paper review through the agent pipeline"""
+    asyncio.run(process_review_async(
+        review_token, file_path, profile=profile, revision_of=revision_of, priority=priority
+    ))
+
+
+def start_job(review_token, priority):
+    """Register the review's job, or None when it was cancelled before it could start"""
+    with jobs_lock:
+        review = reviews_db.get(review_token)
+        if review is None or review['status'] == 'cancelled':
+            return None
+        job = active_jobs[review_token] = Job(review_token, priority)
+        return job
+
+
+def record_cancelled(review_token):
+    """Mark a review cancelled and delete its upload; the pipeline is already stopped or never started"""
+    review = reviews_db.get(review_token)
+    reviews_db.discard_field(review_token, 'partial_review')
+    reviews_db.update(
+        review_token,
+        status='cancelled',
+        progress='Review cancelled',
+        completed_at=datetime.now().isoformat()
+    )
+    file_path = review.get('file_path') if review else None
+    if file_path:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+    logger.info("🛑 Review %s cancelled", review_token)
+
+
+def cancel_review(token):
+    """
+    ``(body, status)`` of a cancel request
+
+    A review that hasn't started (queued in a batch) is cancelled on the
+    spot. A running one is cancelled cooperatively: its task is cancelled,
+    which aborts the awaited stage and LLM call, and outbound calls still
+    running in worker threads stop at their next request or retry (see
+    ``agents.jobs``); the pipeline then records the cancellation.
+    """
+    with jobs_lock:
+        review = reviews_db.get(token)
+        if review is None:
+            return {'error': 'Invalid review token'}, 404
+        if review['status'] in TERMINAL_STATUSES:
+            return {'error': f"Review already {review['status']}", 'status': review['status']}, 409
+        job = active_jobs.get(token)
+        if job is None:
+            record_cancelled(token)
+            return {'success': True, 'token': token, 'status': 'cancelled'}, 200
+    job.cancel()
+    return {
+        'success': True,
+        'token': token,
+        'status': 'cancelling',
+        'message': 'Cancellation requested. The review stops at its next checkpoint.'
+    }, 202
+
+
+async def process_review_async(review_token, file_path, shared_lookups=None, profile=False, revision_of=None,
+                               priority=INTERACTIVE):
+    """
+    Run one review and record its outcome; batches share ``shared_lookups`` between papers
+
+    The review is traced under its token (see ``agents.tracing``). With
+    ``revision_of`` the paper is reviewed as a revision of that review's
+    paper, reusing what still applies (see ``agents.revisions``). It runs as
+    a cancellable job of the given ``priority`` class (see ``cancel_review``).
+    """
+    job = start_job(review_token, priority)
+    if job is None:
+        return
     try:
-        # Update status
-        reviews_db[review_token]['progress'] = 'Parsing document...'
-        
-        # Run root agent
-        result = root_agent.process_paper(file_path)
-        
-        if isinstance(result, dict) and result.get('error'):
-            reviews_db[review_token].update({
-                'status': 'failed',
-                'progress': f"Error: {result['error']}",
-                'completed_at': datetime.now().isoformat(),
-                'result': result,
-                'error': result.get('details', result['error'])
-            })
-            return
-        
-        # Update review entry for successful runs
-        reviews_db[review_token].update({
-            'status': 'completed',
-            'progress': 'Review completed successfully!',
-            'completed_at': datetime.now().isoformat(),
-            'result': result
-        })
+        with running(job):
+            # Update status
+            reviews_db.update(review_token, status='processing', progress='Parsing document...')
+        
+            def report_progress(update):
+                if 'review_section' in update:
+                    # Sections stream in while the reviewer is still generating
+                    reviews_db.set_partial(review_token, update['review_section'], update['content'])
+                else:
+                    reviews_db.update(review_token, stage=update['stage'], progress=update['message'])
+        
+            previous = None
+            if revision_of:
+                try:
+                    previous = await asyncio.to_thread(load_previous_version, revision_of)
+                except (OSError, ValueError, TypeError) as e:
+                    # Degrade: a full review is still a correct answer for the revision
+                    app.logger.warning("Previous version %s unavailable, reviewing from scratch: %s", revision_of, e)
+        
+            # Run root agent
+            result = await root_agent.process_paper_async(
+                file_path, progress_callback=report_progress, shared_lookups=shared_lookups,
+                trace_id=review_token, profile=profile, previous=previous, with_revision_basis=True
+            )
+            # A stage may have turned the cancellation into an error result; don't record that as a failure
+            check_cancelled()
+            reviews_db.discard_field(review_token, 'partial_review')
+            # Parsed sections and related papers a later revision can reuse; kept on disk, out of the response
+            basis = result.pop('revision_basis', None) if isinstance(result, dict) else None
+        
+            if isinstance(result, dict) and result.get('error'):
+                # Failed runs can carry the whole parsed paper; keep that on disk only
+                reviews_db.update(
+                    review_token,
+                    status='failed',
+                    progress=f"Error: {result['error']}",
+                    completed_at=datetime.now().isoformat(),
+                    result_file=reviews_db.save_payload(review_token, 'failed', result),
+                    error=str(result.get('details', result['error']))[:2000]
+                )
+                return
         
-        # Save review to file
-        review_file = f"reviews/{review_token}.json"
-        with open(review_file, 'w') as f:
-            json.dump(result, f, indent=2)
+            completed_at = datetime.now().isoformat()
+        
+            # Save review to file, then render the API response once (plus compressed
+            # variants); it is served from disk from now on, so the result doesn't stay
+            # in memory. Off the event loop: compression takes a while for long reviews
+            def save_review():
+                review_file = os.path.join(app.config['REVIEWS_FOLDER'], f"{review_token}.json")
+                with open(review_file, 'w') as f:
+                    json.dump(result, f, indent=2)
+                basis_file = reviews_db.save_payload(review_token, 'basis', basis) if basis else None
+                return basis_file, write_review_response(app.config['REVIEWS_FOLDER'], review_token, {
+                    'token': review_token,
+                    'status': 'completed',
+                    'result': result,
+                    'original_filename': reviews_db.get(review_token).get('original_filename'),
+                    'completed_at': completed_at
+                })
+            basis_file, response_info = await asyncio.to_thread(save_review)
+        
+            # Update review entry for successful runs
+            reviews_db.update(
+                review_token,
+                status='completed',
+                progress='Review completed successfully!',
+                completed_at=completed_at,
+                response=response_info,
+                basis_file=basis_file
+            )
+    
+    except (asyncio.CancelledError, JobCancelled):
+        if not job.is_cancelled:
+            # Server shutdown, not a cancel request
+            raise
+        record_cancelled(review_token)
     
     except Exception as e:
-        app.logger.error(f"Processing error for {review_token}: {str(e)}")
-        reviews_db[review_token].update({
-            'status': 'failed',
-            'progress': f'Error: {str(e)}',
-            'error': str(e)
-        })
+        app.logger.exception("Processing error for %s: %s", review_token, e)
+        reviews_db.update(
+            review_token,
+            status='failed',
+            progress=f'Error: {str(e)}',
+            completed_at=datetime.now().isoformat(),
+            error=str(e)
+        )
+    
+    finally:
+        with jobs_lock:
+            active_jobs.pop(review_token, None)
+
+
+def process_batch(batch_id, jobs, profile=False):
+    """Review the papers of a batch on one event loop, sharing searches and rankings between them"""
+    asyncio.run(process_batch_async(batch_id, jobs, profile))
+
+
+async def process_batch_async(batch_id, jobs, profile=False):
+    shared_lookups = SharedLookups()
+    # Admission control: at most BATCH_CONCURRENCY papers of the batch in flight
+    slots = asyncio.Semaphore(app.config['BATCH_CONCURRENCY'])
+    
+    async def review_one(review_token, file_path):
+        async with slots:
+            await process_review_async(
+                review_token, file_path, shared_lookups=shared_lookups, profile=profile, priority=BATCH
+            )
+    
+    try:
+        await asyncio.gather(*(review_one(token, path) for token, path in jobs))
+    finally:
+        batches_db.update(
+            batch_id,
+            status='completed',
+            completed_at=datetime.now().isoformat(),
+            shared_lookups=shared_lookups.stats
+        )
 
 
 @app.route('/api/status/<token>', methods=['GET'])
 def check_status(token):
     """Check review status"""
-    if token not in reviews_db:
+    payload = status_payload(token)
+    if payload is None:
         return jsonify({'error': 'Invalid review token'}), 404
     
-    review = reviews_db[token]
+    return jsonify(payload)
+
+
+@app.route('/api/status', methods=['GET', 'POST'])
+def bulk_status():
+    """Statuses of many reviews at once, optionally only those changed since a cursor"""
+    query, error = bulk_status_query(request.args, request.get_json(silent=True) if request.method == 'POST' else None)
+    if error:
+        body, status = error
+        return jsonify(body), status
     
-    return jsonify({
-        'token': token,
-        'status': review['status'],
-        'progress': review.get('progress', ''),
-        'uploaded_at': review.get('uploaded_at'),
-        'completed_at': review.get('completed_at')
-    })
+    body, etag = bulk_status_payload(query, request.if_none_match)
+    response = app.response_class(status=304) if body is None else jsonify(body)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@app.route('/api/review/<token>/cancel', methods=['POST'])
+def cancel(token):
+    """Cancel a queued or running review; its upload is deleted"""
+    body, status = cancel_review(token)
+    return jsonify(body), status
 
 
 @app.route('/api/review/<token>', methods=['GET'])
 def get_review(token):
     """Retrieve completed review"""
-    if token not in reviews_db:
+    review = reviews_db.get(token)
+    if review is None:
         return jsonify({'error': 'Invalid review token'}), 404
     
-    review = reviews_db[token]
-    
     if review['status'] != 'completed':
         return jsonify({
             'error': 'Review not yet completed',
@@ -158,29 +700,152 @@ def get_review(token):
             'progress': review.get('progress')
         }), 400
     
-    return jsonify({
-        'token': token,
-        'status': review['status'],
-        'result': review.get('result'),
-        'original_filename': review.get('original_filename'),
-        'completed_at': review.get('completed_at')
-    })
+    encoding, etag, path = select_review_file(token, review, request.accept_encodings, request.if_none_match)
+    if path is None:
+        response = app.response_class(status=304)
+    else:
+        if not os.path.exists(path):
+            return jsonify({'error': 'Review file is missing'}), 404
+        response = send_file(path, mimetype='application/json', conditional=False, etag=False)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @app.route('/api/reviews', methods=['GET'])
 def list_reviews():
     """List all reviews"""
-    reviews = []
-    for token, review in reviews_db.items():
-        reviews.append({
-            'token': token,
-            'status': review['status'],
-            'original_filename': review.get('original_filename'),
-            'uploaded_at': review.get('uploaded_at'),
-            'completed_at': review.get('completed_at')
-        })
+    return jsonify(reviews_payload())
+
+
+@app.route('/api/batch', methods=['POST'])
+def upload_batch():
+    """Accept many PDFs (``files`` fields) or zips of PDFs and review them as one batch"""
+    try:
+        try:
+            uploads, rejected = ingest_upload(batch=True)
+        except UploadRejected as e:
+            return jsonify({'error': e.message}), e.status
+        except RequestEntityTooLarge:
+            return jsonify({'error': too_large_message(batch=True)}), 413
+        
+        if not uploads:
+            return jsonify({'error': 'No valid PDF files in batch', 'rejected': rejected}), 400
+        
+        batch_id, payload, jobs = create_batch(uploads, rejected)
+        if jobs:
+            threading.Thread(
+                target=process_batch, args=(batch_id, jobs, profile_requested(request.args)), daemon=True
+            ).start()
+        
+        return jsonify(payload)
+    
+    except Exception as e:
+        app.logger.error("Batch upload error: %s", e)
+        return jsonify({'error': f'Batch upload failed: {str(e)}'}), 500
+
+
+@app.route('/api/batch/<batch_id>', methods=['GET'])
+def batch_status(batch_id):
+    """Aggregate progress of a batch plus each paper's status"""
+    payload = batch_payload(batch_id)
+    if payload is None:
+        return jsonify({'error': 'Invalid batch id'}), 404
+    return jsonify(payload)
+
+
+@app.route('/api/batch/<batch_id>/results.jsonl', methods=['GET'])
+def batch_results(batch_id):
+    """Stream one JSON line per paper: the review for completed papers, the error for failed or cancelled ones"""
+    batch = batches_db.get(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Invalid batch id'}), 404
     
-    return jsonify({'reviews': reviews})
+    return Response(batch_result_lines(batch), mimetype='application/x-ndjson', headers={
+        'Content-Disposition': f'attachment; filename="batch_{batch_id}.jsonl"'
+    })
+
+
+def jobs_payload():
+    with jobs_lock:
+        running_jobs = list(active_jobs.values())
+    return {priority: sum(1 for job in running_jobs if job.priority == priority) for priority in PRIORITIES}
+
+
+def stats_payload():
+    return {
+        'review_store': reviews_db.stats(),
+        'batch_store': batches_db.stats(),
+        'jobs': jobs_payload(),
+        'speculative_search': root_agent.speculation_stats.snapshot(),
+        'structured_output': structured.stats(),
+        'startup': startup
+    }
+
+
+def is_ready():
+    return startup['warmup'] in ('disabled', 'ready', 'failed')
+
+
+def health_payload():
+    return {
+        'status': 'ok',
+        'ready': is_ready(),
+        'uptime_s': round(time.perf_counter() - APP_IMPORT_STARTED, 3),
+        'startup': startup
+    }
+
+
+def readiness_payload():
+    """``(body, status)``: 503 while the background warm-up is still running"""
+    if not is_ready():
+        return {'ready': False, 'warmup': startup['warmup']}, 503
+    return {'ready': True, 'warmup': startup['warmup'], 'ready_after_s': startup['ready_after_s']}, 200
+
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Memory use of the review index and the process"""
+    return jsonify(stats_payload())
+
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Liveness: always 200 once the app is importable, with readiness and cold-start timings"""
+    return jsonify(health_payload())
+
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness():
+    """Readiness: 503 while the background warm-up is still running"""
+    body, status = readiness_payload()
+    return jsonify(body), status
+
+
+def warm_up_agents():
+    """Build the agents and open model clients off the request path"""
+    try:
+        startup['warmup_timings'] = root_agent.warm_up()
+        startup['warmup'] = 'ready'
+        logger.info("🔥 Warm-up finished in %.2fs", startup['warmup_timings']['total_s'])
+    except Exception as e:
+        # The first review will do the work lazily instead
+        startup['warmup'] = 'failed'
+        startup['warmup_timings'] = {'error': str(e)}
+        logger.warning("⚠️ Warm-up failed: %s", e)
+    startup['ready_after_s'] = round(time.perf_counter() - APP_IMPORT_STARTED, 3)
+
+
+startup['import_s'] = round(time.perf_counter() - APP_IMPORT_STARTED, 3)
+if app.config['WARMUP_ON_START']:
+    startup['warmup'] = 'running'
+    threading.Thread(target=warm_up_agents, name='warm-up', daemon=True).start()
+else:
+    startup['ready_after_s'] = startup['import_s']
 
 
 if __name__ == '__main__':
@@ -0,0 +1,345 @@
+"""
+ASGI entry point - the review API on a single event loop
+
+Serves the same ``/api/*`` routes as the Flask app (``app.py``), but review
+pipelines run as tasks on the server's event loop instead of a thread (and
+an event loop) per upload, and clients wait on progress with a long-lived
+``/api/status/<token>/events`` stream instead of polling. An idle connection
+costs a coroutine, not a thread, so one process holds thousands of them.
+
+Run with ``python asgi.py`` or ``uvicorn asgi:app`` (one worker: the review
+index lives in this process).
+"""
+import asyncio
+import json
+import logging
+import os
+
+from flask import render_template
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from werkzeug.http import parse_accept_header, parse_etags
+
+from app import (
+    app as flask_app, reviews_db, batches_db, make_ingestor, too_large_message, register_upload,
+    profile_requested, priority_requested, revision_source, revision_fields, upload_payload, create_batch, status_payload,
+    bulk_status_query, bulk_status_payload,
+    select_review_file, reviews_payload, batch_payload, batch_result_lines, stats_payload, health_payload,
+    readiness_payload, process_review_async, process_batch_async, cancel_review
+)
+from services.review_store import TERMINAL_STATUSES
+from services.uploads import UploadRejected
+
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments on an idle progress stream
+EVENTS_KEEPALIVE = float(os.getenv('EVENTS_KEEPALIVE_SECONDS', '15'))
+
+# Pipelines started by this server; kept referenced so they aren't garbage-collected mid-run
+pipelines = set()
+# token -> asyncio.Events of the progress streams watching that review
+watchers = {}
+loop = None
+
+
+def notify_watchers(token):
+    """Review store subscriber: wake the streams watching ``token`` (called from any thread)"""
+    if loop is not None and token in watchers:
+        loop.call_soon_threadsafe(wake_watchers, token)
+
+
+def wake_watchers(token):
+    for event in watchers.get(token, ()):
+        event.set()
+
+
+reviews_db.subscribe(notify_watchers)
+
+
+def start_pipeline(coroutine):
+    task = asyncio.get_running_loop().create_task(coroutine)
+    pipelines.add(task)
+    task.add_done_callback(pipelines.discard)
+
+
+async def ingest_upload(request, batch=False):
+    """Stream the multipart body to disk; parsing and file writes run off the event loop"""
+    max_bytes = flask_app.config['BATCH_MAX_CONTENT_LENGTH' if batch else 'MAX_CONTENT_LENGTH']
+    declared = request.headers.get('content-length')
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise UploadRejected(too_large_message(batch), status=413)
+
+    ingestor = make_ingestor(request.headers.get('content-type'), batch)
+    try:
+        received = 0
+        async for chunk in request.stream():
+            if not chunk:
+                continue
+            received += len(chunk)
+            if received > max_bytes:
+                raise UploadRejected(too_large_message(batch), status=413)
+            await asyncio.to_thread(ingestor.feed, chunk)
+        await asyncio.to_thread(ingestor.feed, b'')
+        if batch:
+            return await asyncio.to_thread(ingestor.finish_many), ingestor.rejected
+        return await asyncio.to_thread(ingestor.finish)
+    except BaseException:
+        # Also on client disconnect / cancellation: don't leave partial files behind
+        ingestor.abort()
+        raise
+
+
+# The page only needs url_for('static', ...), so render it once with the Flask templates
+with flask_app.test_request_context('/'):
+    INDEX_HTML = render_template('index.html')
+
+
+async def index(request):
+    return HTMLResponse(INDEX_HTML)
+
+
+async def upload_paper(request):
+    """
+    Handle paper upload and start the review as a task on this loop
+    (``?revision_of=<token>`` for a revised version, ``?priority=batch`` to
+    yield to interactive reviews)
+    """
+    try:
+        previous_token, error = await asyncio.to_thread(revision_source, request.query_params)
+        if not error:
+            priority, error = priority_requested(request.query_params)
+        if error:
+            body, status = error
+            return JSONResponse(body, status_code=status)
+
+        try:
+            upload = await ingest_upload(request)
+        except UploadRejected as e:
+            return JSONResponse({'error': e.message}, status_code=e.status)
+
+        review_token, file_path, deduplicated = await asyncio.to_thread(
+            register_upload, upload, **revision_fields(previous_token)
+        )
+        if not deduplicated:
+            start_pipeline(process_review_async(
+                review_token, file_path, profile=profile_requested(request.query_params), revision_of=previous_token,
+                priority=priority
+            ))
+
+        return JSONResponse(upload_payload(review_token, deduplicated))
+
+    except Exception as e:
+        logger.exception("❌ Upload error: %s", e)
+        return JSONResponse({'error': f'Upload failed: {str(e)}'}, status_code=500)
+
+
+async def check_status(request):
+    payload = status_payload(request.path_params['token'])
+    if payload is None:
+        return JSONResponse({'error': 'Invalid review token'}, status_code=404)
+    return JSONResponse(payload)
+
+
+async def bulk_status(request):
+    """Statuses of many reviews at once, optionally only those changed since a cursor"""
+    body = None
+    if request.method == 'POST':
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+    query, error = bulk_status_query(request.query_params, body)
+    if error:
+        body, status = error
+        return JSONResponse(body, status_code=status)
+
+    if_none_match = parse_etags(request.headers.get('if-none-match'))
+    body, etag = await asyncio.to_thread(bulk_status_payload, query, if_none_match)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
+
+
+def sse_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+async def status_events(request):
+    """
+    Server-sent events with the review's status: one ``status`` event now and
+    after every change, ending after the terminal one
+    """
+    token = request.path_params['token']
+    if status_payload(token) is None:
+        return JSONResponse({'error': 'Invalid review token'}, status_code=404)
+
+    async def stream():
+        changed = asyncio.Event()
+        watchers.setdefault(token, set()).add(changed)
+        try:
+            last = None
+            while True:
+                payload = status_payload(token)
+                if payload is None:
+                    return
+                if payload != last:
+                    last = payload
+                    yield sse_event('status', payload)
+                    if payload['status'] in TERMINAL_STATUSES:
+                        return
+                try:
+                    await asyncio.wait_for(changed.wait(), EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                changed.clear()
+        finally:
+            subscribed = watchers.get(token)
+            if subscribed is not None:
+                subscribed.discard(changed)
+                if not subscribed:
+                    del watchers[token]
+
+    return StreamingResponse(stream(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+async def get_review(request):
+    """Retrieve completed review"""
+    token = request.path_params['token']
+    review = reviews_db.get(token)
+    if review is None:
+        return JSONResponse({'error': 'Invalid review token'}, status_code=404)
+
+    if review['status'] != 'completed':
+        return JSONResponse({
+            'error': 'Review not yet completed',
+            'status': review['status'],
+            'progress': review.get('progress')
+        }, status_code=400)
+
+    accept_encodings = parse_accept_header(request.headers.get('accept-encoding'))
+    if_none_match = parse_etags(request.headers.get('if-none-match'))
+    encoding, etag, path = select_review_file(token, review, accept_encodings, if_none_match)
+    headers = {
+        'ETag': f'"{etag}"',
+        'Vary': 'Accept-Encoding',
+        'Cache-Control': 'private, no-cache'
+    }
+    if path is None:
+        return Response(status_code=304, headers=headers)
+    if not os.path.exists(path):
+        return JSONResponse({'error': 'Review file is missing'}, status_code=404)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return FileResponse(path, media_type='application/json', headers=headers)
+
+
+async def cancel(request):
+    """Cancel a queued or running review; its upload is deleted"""
+    body, status = await asyncio.to_thread(cancel_review, request.path_params['token'])
+    return JSONResponse(body, status_code=status)
+
+
+async def list_reviews(request):
+    return JSONResponse(await asyncio.to_thread(reviews_payload))
+
+
+async def upload_batch(request):
+    """Accept several PDFs (or a ZIP of PDFs) and review them on this loop"""
+    try:
+        try:
+            uploads, rejected = await ingest_upload(request, batch=True)
+        except UploadRejected as e:
+            return JSONResponse({'error': e.message}, status_code=e.status)
+
+        if not uploads:
+            return JSONResponse({'error': 'No valid PDF files in batch', 'rejected': rejected}, status_code=400)
+
+        batch_id, payload, jobs = await asyncio.to_thread(create_batch, uploads, rejected)
+        if jobs:
+            start_pipeline(process_batch_async(batch_id, jobs, profile_requested(request.query_params)))
+
+        return JSONResponse(payload)
+
+    except Exception as e:
+        logger.exception("❌ Batch upload error: %s", e)
+        return JSONResponse({'error': f'Batch upload failed: {str(e)}'}, status_code=500)
+
+
+async def batch_status(request):
+    payload = batch_payload(request.path_params['batch_id'])
+    if payload is None:
+        return JSONResponse({'error': 'Invalid batch id'}, status_code=404)
+    return JSONResponse(payload)
+
+
+async def batch_results(request):
+    batch_id = request.path_params['batch_id']
+    batch = batches_db.get(batch_id)
+    if batch is None:
+        return JSONResponse({'error': 'Invalid batch id'}, status_code=404)
+
+    # Sync generator: starlette iterates it in a worker thread, so the file reads stay off the loop
+    return StreamingResponse(batch_result_lines(batch), media_type='application/x-ndjson', headers={
+        'Content-Disposition': f'attachment; filename="batch_{batch_id}.jsonl"'
+    })
+
+
+async def get_stats(request):
+    return JSONResponse({**stats_payload(), 'asgi': {
+        'pipelines_running': len(pipelines),
+        'progress_streams': sum(len(events) for events in watchers.values())
+    }})
+
+
+async def health(request):
+    return JSONResponse(health_payload())
+
+
+async def readiness(request):
+    body, status = readiness_payload()
+    return JSONResponse(body, status_code=status)
+
+
+async def lifespan(starlette_app):
+    global loop
+    loop = asyncio.get_running_loop()
+    yield
+    # Shutdown: stop the reviews still running on this loop
+    for task in list(pipelines):
+        task.cancel()
+    if pipelines:
+        await asyncio.gather(*pipelines, return_exceptions=True)
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/upload', upload_paper, methods=['POST']),
+        Route('/api/status', bulk_status, methods=['GET', 'POST']),
+        Route('/api/status/{token}', check_status),
+        Route('/api/status/{token}/events', status_events),
+        Route('/api/review/{token}', get_review),
+        Route('/api/review/{token}/cancel', cancel, methods=['POST']),
+        Route('/api/reviews', list_reviews),
+        Route('/api/batch', upload_batch, methods=['POST']),
+        Route('/api/batch/{batch_id}', batch_status),
+        Route('/api/batch/{batch_id}/results.jsonl', batch_results),
+        Route('/api/stats', get_stats),
+        Route('/api/health', health),
+        Route('/api/health/ready', readiness),
+        Mount('/static', StaticFiles(directory=flask_app.static_folder), name='static'),
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv('HOST', '127.0.0.1'), port=int(os.getenv('PORT', '5000')))
@@ -0,0 +1,234 @@
+"""
+Batch reviewer - Reviews a directory (or glob) of PDFs from the command line
+
+PDF conversion (CPU-bound) runs in a process pool while the LLM and search
+calls (I/O-bound) of many papers overlap on one event loop. Every finished
+paper is appended to a JSONL file as soon as it completes, so a run can be
+interrupted and resumed: papers whose content hash is already in the output
+are skipped.
+
+    python batch_review.py papers/ --output reviews.jsonl --concurrency 8
+    python batch_review.py "backlog/**/*.pdf" --output reviews.jsonl --retry-failed
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from agents.logs import configure_logging
+from agents.root_agent import RootAgent
+
+
+def find_pdfs(inputs: list) -> list:
+    """Expand directories (recursively), globs and file paths into a sorted, de-duplicated list of PDFs."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths += [os.path.join(root, name) for name in files if name.lower().endswith(".pdf")]
+        elif any(ch in item for ch in "*?["):
+            paths += [path for path in glob.glob(item, recursive=True) if path.lower().endswith(".pdf")]
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            print(f"⚠️ Skipping {item}: not a file, directory or matching glob", file=sys.stderr)
+    return sorted(set(os.path.abspath(path) for path in paths))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_finished(output_path: str, retry_failed: bool) -> dict:
+    """sha256 -> status of papers already in the output (the last line per paper wins)."""
+    finished = {}
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interrupted run
+            if record.get("sha256"):
+                finished[record["sha256"]] = record.get("status")
+    if retry_failed:
+        finished = {sha: status for sha, status in finished.items() if status == "completed"}
+    return finished
+
+
+class BatchReviewer:
+    """Runs review pipelines with bounded concurrency and appends each outcome to a JSONL file."""
+
+    def __init__(self, root_agent: RootAgent, output_path: str, concurrency: int, profile: bool = False):
+        self.root_agent = root_agent
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.profile = profile
+        self.stats = {"completed": 0, "failed": 0}
+        self.durations = []
+        self.total = 0
+        self.started = None
+
+    def _write(self, output, record: dict):
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+
+    def _progress(self):
+        done = self.stats["completed"] + self.stats["failed"]
+        elapsed = time.monotonic() - self.started
+        rate = done / elapsed * 60 if elapsed else 0.0
+        eta = (self.total - done) / (done / elapsed) if done else None
+        eta_text = f"{eta / 60:.1f} min" if eta is not None else "-"
+        print(
+            f"📊 [{done}/{self.total}] ✅ {self.stats['completed']} ❌ {self.stats['failed']} "
+            f"| {rate:.1f} papers/min | ETA {eta_text}",
+            file=sys.stderr, flush=True,
+        )
+
+    async def _review(self, path: str, sha256: str) -> dict:
+        started = time.monotonic()
+        try:
+            result = await self.root_agent.process_paper_async(path, trace_id=sha256[:16], profile=self.profile)
+        except Exception as e:
+            result = {"error": "Pipeline crashed", "details": str(e)}
+        record = {
+            "path": path,
+            "sha256": sha256,
+            "elapsed_s": round(time.monotonic() - started, 3),
+            "finished_at": datetime.now().isoformat(),
+        }
+        if isinstance(result, dict) and result.get("error"):
+            record.update(status="failed", error=result["error"], details=str(result.get("details", ""))[:2000])
+        else:
+            record.update(status="completed", result=result)
+        return record
+
+    async def run(self, jobs: list) -> dict:
+        self.total = len(jobs)
+        self.started = time.monotonic()
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+
+        with open(self.output_path, "a") as output:
+            if output.tell() and not self._ends_with_newline():
+                output.write("\n")  # Don't glue onto a line cut short by an interrupted run
+
+            async def worker():
+                while True:
+                    try:
+                        path, sha256 = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    record = await self._review(path, sha256)
+                    self._write(output, record)
+                    self.stats[record["status"]] += 1
+                    self.durations.append(record["elapsed_s"])
+                    self._progress()
+
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(jobs)))))
+
+        return self.summary()
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def summary(self) -> dict:
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        done = self.stats["completed"] + self.stats["failed"]
+        ordered = sorted(self.durations)
+        return {
+            "papers": done,
+            "completed": self.stats["completed"],
+            "failed": self.stats["failed"],
+            "wall_time_s": round(elapsed, 1),
+            "throughput_papers_per_min": round(done / elapsed * 60, 2) if elapsed else 0.0,
+            "paper_time_p50_s": round(statistics.median(ordered), 1) if ordered else None,
+            "paper_time_p95_s": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 1) if ordered else None,
+        }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Review a directory or glob of PDFs into a JSONL file")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories (searched recursively) or globs")
+    parser.add_argument("--output", default="batch_reviews.jsonl", help="JSONL file to append results to")
+    parser.add_argument("--concurrency", type=int, default=8, help="Papers in flight at once")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Processes for PDF conversion")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-run papers recorded as failed")
+    parser.add_argument("--limit", type=int, help="Review at most this many new papers")
+    parser.add_argument("--verbose", action="store_true", help="Show the agents' step-by-step logs")
+    parser.add_argument("--profile", action="store_true", help="Write a cProfile of each paper's CPU-bound steps to TRACE_DIR")
+    args = parser.parse_args(argv)
+    # Agents log every step; with many papers in flight that is noise unless asked for
+    configure_logging(level=None if args.verbose else os.getenv("LOG_LEVEL", "WARNING"))
+
+    paths = find_pdfs(args.inputs)
+    if not paths:
+        print("❌ No PDFs found", file=sys.stderr)
+        return 1
+
+    finished = load_finished(args.output, args.retry_failed)
+    jobs, already_done, duplicates = [], 0, 0
+    for path in paths:
+        sha256 = file_sha256(path)
+        if finished.get(sha256) == "pending":
+            duplicates += 1  # Identical files under two names are reviewed once
+            continue
+        if sha256 in finished:
+            already_done += 1
+            continue
+        finished[sha256] = "pending"
+        jobs.append((path, sha256))
+    if args.limit is not None:
+        jobs = jobs[:args.limit]
+
+    print(
+        f"📚 {len(paths)} PDF(s) found: {already_done} already in {args.output}, "
+        f"{duplicates} duplicate(s), {len(jobs)} to review",
+        file=sys.stderr,
+    )
+    if not jobs:
+        return 0
+
+    root_agent = RootAgent.from_env()
+    # Spawned (not forked) workers: the event loop already runs helper threads when the pool starts
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), mp_context=multiprocessing.get_context("spawn")) as pool:
+        root_agent.parser_agent.convert_executor = pool
+        reviewer = BatchReviewer(root_agent, args.output, max(1, args.concurrency), profile=args.profile)
+        try:
+            summary = asyncio.run(reviewer.run(jobs))
+        except KeyboardInterrupt:
+            print("\n⏹️  Interrupted; finished papers are saved. Re-run the same command to resume.", file=sys.stderr)
+            summary = reviewer.summary()
+
+    print("\n" + "=" * 60, file=sys.stderr)
+    print("🏁 BATCH REVIEW SUMMARY", file=sys.stderr)
+    print("=" * 60, file=sys.stderr)
+    for key, value in summary.items():
+        print(f"   {key}: {value}", file=sys.stderr)
+    print(f"💾 Results appended to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+"""
+Per-stage micro-benchmarks for the review pipeline hot paths
+
+Runs fully offline against the stub backends in ``benchmarks/stubs.py`` and
+writes machine-readable JSON that can be diffed between commits:
+
+    python -m benchmarks.bench_pipeline --output bench/base.json
+    python -m benchmarks.bench_pipeline --output bench/head.json --compare bench/base.json
+
+With ``--compare`` the process exits non-zero when any case's median time
+regressed by more than ``--threshold`` (default 20%) and ``--min-delta-ms``.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks import stubs
+from benchmarks.pdfgen import make_pdf
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _summarize(samples: list) -> dict:
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        "runs": len(samples),
+        "min_s": ordered[0],
+        "median_s": statistics.median(ordered),
+        "mean_s": statistics.fmean(ordered),
+        "p95_s": ordered[p95_index],
+        "stdev_s": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+def measure(func, repeat: int, warmup: int = 1) -> dict:
+    """Time ``func`` ``repeat`` times (after ``warmup`` untimed calls) with stdout silenced."""
+    sink = io.StringIO()
+    samples = []
+    with contextlib.redirect_stdout(sink):
+        for _ in range(warmup):
+            func()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+            sink.seek(0)
+            sink.truncate()
+    return _summarize(samples)
+
+
+class PipelineBenchmarks:
+    def __init__(self, workdir: str, repeat: int, quick: bool = False):
+        self.workdir = workdir
+        self.repeat = repeat
+        self.page_counts = (1, 5) if quick else (1, 5, 20, 50)
+        self.candidate_counts = (10, 100) if quick else (10, 100, 1000)
+        self.results = {}
+        # Expectations between cases (e.g. an optimisation that stopped paying off); any entry fails the run
+        self.failures = []
+
+    def _record(self, name: str, stats: dict, **params):
+        stats["params"] = params
+        self.results[name] = stats
+        print(f"  {name:<45} median {stats['median_s'] * 1000:9.3f} ms  p95 {stats['p95_s'] * 1000:9.3f} ms")
+
+    def _expect_fewer_calls(self, case: str, calls: dict, baseline: dict):
+        """Record a failure unless ``case`` made fewer search calls and fewer LLM calls than ``baseline``."""
+        searches = calls.get("tavily", 0) + calls.get("arxiv", 0)
+        baseline_searches = baseline.get("tavily", 0) + baseline.get("arxiv", 0)
+        if searches >= baseline_searches or calls.get("llm", 0) >= baseline.get("llm", 0):
+            self.failures.append(f"{case} saved no calls: {calls} vs {baseline} without it")
+
+    def _pdf(self, pages: int) -> str:
+        path = os.path.join(self.workdir, f"bench_{pages:03d}p.pdf")
+        if not os.path.exists(path):
+            make_pdf(path, pages, seed=pages)
+        return path
+
+    def bench_conversion(self):
+        from agents.parser_agent import convert_pdf
+
+        for pages in self.page_counts:
+            path = self._pdf(pages)
+            chars = len(convert_pdf(path)[0])
+            self._record(
+                f"markitdown_convert[pages={pages}]",
+                measure(lambda: convert_pdf(path), max(3, self.repeat // 5)),
+                pages=pages, markdown_chars=chars,
+            )
+
+    def bench_json_parsing(self):
+        from agents import schemas, structured
+
+        for count in (5, 20, 50):
+            answer = stubs.ranking_response(count)
+            self._record(
+                f"ranking_parse_json[papers={count}]",
+                measure(lambda: structured.parse(answer, schemas.RANKING, "paper_ranking_agent"), self.repeat),
+                papers=count, response_chars=len(answer),
+            )
+        review = stubs.review_response()
+        self._record(
+            "reviewer_parse_json",
+            measure(lambda: structured.parse(review, schemas.REVIEW, "assistant_reviewer_agent"), self.repeat),
+            response_chars=len(review),
+        )
+
+    def bench_finder(self, finder):
+        with contextlib.redirect_stdout(io.StringIO()):
+            arxiv = finder._arxiv_search("graph attention", max_results=5)
+        for count in self.candidate_counts:
+            candidates = stubs.make_candidates(count, duplicate_every=4)
+
+            def filter_and_merge():
+                finder._merge_results(finder._filter_academic(candidates) + arxiv)
+
+            self._record(
+                f"finder_filter_dedup[candidates={count}]",
+                measure(filter_and_merge, self.repeat),
+                candidates=count,
+            )
+
+    def bench_arxiv_parsing(self, finder):
+        """Streamed Atom parsing of one stub page of ``count`` entries."""
+        for count in self.candidate_counts:
+            def search(count=count):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    finder._arxiv_search("graph attention", max_results=count, page_size=count)
+
+            self._record(f"arxiv_stream_parse[entries={count}]", measure(search, self.repeat), entries=count)
+
+    def bench_finder_fanout(self, latency: float = 0.1):
+        """Wall time of one query vs the full keyword fan-out against equally slow stub searches."""
+        from agents import PaperFinderAgent
+
+        title = "Scalable Graph Attention Networks for Synthetic Benchmarking"
+        abstract = "We study scalable graph attention networks on synthetic benchmarks. Results follow."
+        keywords = ["graph attention", "scalability", "benchmarking"]
+        with stubs.StubBackends(search_latency=latency):
+            finder = PaperFinderAgent()
+            queries = finder.build_queries(title, abstract, keywords)
+            for name, fan_out in (("single", [title]), ("fanout", queries)):
+                self._record(
+                    f"finder_{name}_query[queries={len(fan_out)}]",
+                    measure(lambda: finder.find_papers(title, queries=fan_out), max(3, self.repeat // 10)),
+                    queries=len(fan_out), stub_latency_s=latency,
+                )
+
+    def bench_prompts(self, parser, validator, ranking, reviewer):
+        from agents.parser_agent import convert_pdf
+
+        markdown = convert_pdf(self._pdf(20))[0]
+        metadata = {"title": "Scalable Graph Attention Networks", "abstract": "We study graphs. " * 20}
+        paper_data = {**metadata, "full_content": markdown}
+        ranked = json.loads(stubs.ranking_response(5))["ranked_papers"]
+        cases = [
+            ("prompt_build[parser]", lambda: parser._build_prompt(markdown)),
+            ("prompt_build[validator]", lambda: validator._build_prompt(markdown, metadata)),
+            ("prompt_build[reviewer]", lambda: reviewer._build_prompt(paper_data, ranked)),
+        ]
+        for count in self.candidate_counts:
+            candidates = stubs.make_candidates(count)
+            cases.append((
+                f"prompt_build[ranking,papers={count}]",
+                lambda candidates=candidates: ranking._build_prompt(metadata["title"], candidates),
+            ))
+        for name, build in cases:
+            self._record(name, measure(build, self.repeat), prompt_chars=len(build()))
+
+    def bench_process_paper(self, root_agent):
+        for pages in self.page_counts[:2]:
+            path = self._pdf(pages)
+            self._record(
+                f"process_paper_overhead[pages={pages}]",
+                measure(lambda: root_agent.process_paper(path), max(3, self.repeat // 10)),
+                pages=pages,
+            )
+
+    def bench_lean_pipeline(self, latency: float = 0.1):
+        """Separate parser + validator calls vs the lean pipeline's combined call, at stub LLM latency."""
+        from agents import RootAgent
+
+        path = self._pdf(1)
+        with stubs.StubBackends(llm_latency=latency):
+            for name, lean in (("standard", False), ("lean", True)):
+                root_agent = RootAgent(lean_pipeline=lean)
+                self._record(
+                    f"process_paper_{name}[llm_latency={latency}]",
+                    measure(lambda: root_agent.process_paper(path), max(3, self.repeat // 10)),
+                    lean_pipeline=lean, stub_latency_s=latency,
+                )
+
+    def bench_structured_repair(self, latency: float = 0.1):
+        """Valid answers vs every agent's first answer truncated (one repair call each), at stub LLM latency."""
+        from agents import RootAgent
+
+        path = self._pdf(1)
+        flaky = ("pdf_metadata_extractor", "paper_validation_agent", "paper_scoring_agent", "assistant_reviewer_agent")
+        for name, flaky_agents in (("valid", ()), ("repaired", flaky)):
+            with stubs.StubBackends(llm_latency=latency, flaky_agents=flaky_agents):
+                root_agent = RootAgent()
+                self._record(
+                    f"process_paper_structured_{name}[llm_latency={latency}]",
+                    measure(lambda: root_agent.process_paper(path), max(3, self.repeat // 10)),
+                    flaky_agents=len(flaky_agents), stub_latency_s=latency,
+                )
+
+    def bench_startup(self):
+        """Cold ``import app`` in a fresh interpreter (warm-up disabled), i.e. time until requests can be served."""
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = {**os.environ, "WARMUP_ON_START": "0", "PYTHONPATH": project_root}
+        command = [sys.executable, "-c", "import app"]
+
+        def cold_import():
+            subprocess.run(command, cwd=self.workdir, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        self._record("app_cold_import", measure(cold_import, 3, warmup=0))
+
+    def bench_batch(self, papers: int = 6, concurrency: int = 3, latency: float = 0.1, search_latency: float = 0.3):
+        """
+        N papers on one topic: independent reviews vs a batch sharing searches
+        and rankings. Searches are slower than one LLM call, as real ones are,
+        so the speculative search can't hide them. The wall-clock gain is only
+        reported; the run fails if sharing stops saving search or LLM calls,
+        which (unlike timings) doesn't depend on scheduler noise.
+        """
+        from agents import RootAgent, SharedLookups
+
+        paths = [self._pdf(1)] * papers
+        calls = {}
+        with stubs.StubBackends(llm_latency=latency, search_latency=search_latency) as backends:
+            root_agent = RootAgent()
+
+            async def review_all(shared_lookups=None):
+                slots = asyncio.Semaphore(concurrency)
+
+                async def review_one(path):
+                    async with slots:
+                        await root_agent.process_paper_async(path, shared_lookups=shared_lookups)
+
+                await asyncio.gather(*(review_one(path) for path in paths))
+
+            for name, make_lookups in (("independent", lambda: None), ("shared_lookups", SharedLookups)):
+                backends.calls.clear()
+                asyncio.run(review_all(make_lookups()))
+                calls[name] = dict(backends.calls)
+                self._record(
+                    f"batch_{name}[papers={papers}]",
+                    measure(lambda: asyncio.run(review_all(make_lookups())), max(3, self.repeat // 10)),
+                    papers=papers, concurrency=concurrency, stub_latency_s=latency, stub_search_latency_s=search_latency,
+                    calls=calls[name],
+                )
+        independent = self.results[f"batch_independent[papers={papers}]"]["median_s"]
+        shared = self.results[f"batch_shared_lookups[papers={papers}]"]["median_s"]
+        print(f"  shared lookups: {1 - shared / independent:+.1%} wall clock, calls {calls['independent']} -> {calls['shared_lookups']}")
+        self._expect_fewer_calls(f"batch_shared_lookups[papers={papers}]", calls["shared_lookups"], calls["independent"])
+
+    def bench_runner_builds(self):
+        """Every agent's real runner (output schema included), built without stubs; fails if ADK rejects one."""
+        from agents import RootAgent
+
+        root_agent = RootAgent(lean_pipeline=True, review_ensemble="balanced,skeptic")
+        for factory in root_agent.runner_factories():
+            name = factory().agent.name
+            # The balanced ensemble variant is the plain reviewer; it was built above, one timing is enough
+            if f"runner_build[{name}]" not in self.results:
+                self._record(f"runner_build[{name}]", measure(factory, self.repeat))
+
+    def run(self) -> dict:
+        from agents import RootAgent
+
+        print("🧱 Real runner builds")
+        self.bench_runner_builds()
+        with stubs.StubBackends():
+            root_agent = RootAgent()
+            parser = root_agent.parser_agent
+            print("📄 PDF conversion")
+            self.bench_conversion()
+            print("🧩 Structured output parsing")
+            self.bench_json_parsing()
+            print("🔎 Finder filtering / dedup")
+            self.bench_finder(root_agent.finder_agent)
+            self.bench_arxiv_parsing(root_agent.finder_agent)
+            self.bench_finder_fanout()
+            print("📝 Prompt construction")
+            self.bench_prompts(parser, root_agent.validation_agent, root_agent.ranking_agent, root_agent.reviewer_agent)
+            print("🚀 End-to-end process_paper (stub model)")
+            self.bench_process_paper(root_agent)
+            self.bench_lean_pipeline()
+            self.bench_structured_repair()
+            print("🧊 Cold start")
+            self.bench_startup()
+            print("📚 Batch of similar papers (stub latency)")
+            self.bench_batch()
+        return self.results
+
+
+def compare(current: dict, baseline: dict, threshold: float, min_delta: float = 0.0) -> list:
+    """
+    Return (case, baseline_median, current_median, ratio) for every case slower than
+    ``threshold`` (relative) and ``min_delta`` seconds (absolute, filters timer noise).
+    """
+    regressions = []
+    print(f"\n{'case':<45} {'base ms':>10} {'head ms':>10} {'change':>8}")
+    for name, stats in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            print(f"{name:<45} {'-':>10} {stats['median_s'] * 1000:10.3f} {'new':>8}")
+            continue
+        ratio = stats["median_s"] / base["median_s"] if base["median_s"] else 1.0
+        regressed = ratio > 1 + threshold and stats["median_s"] - base["median_s"] > min_delta
+        flag = " ⚠️" if regressed else ""
+        print(f"{name:<45} {base['median_s'] * 1000:10.3f} {stats['median_s'] * 1000:10.3f} {ratio - 1:+8.1%}{flag}")
+        if regressed:
+            regressions.append((name, base["median_s"], stats["median_s"], ratio))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline per-stage benchmarks for the review pipeline")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed median slowdown before failing (0.20 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore slowdowns smaller than this many milliseconds")
+    parser.add_argument("--repeat", type=int, default=30, help="Timed repetitions per micro-benchmark")
+    parser.add_argument("--quick", action="store_true", help="Smaller page/candidate sweeps for a fast smoke run")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="reviewer_bench_") as workdir:
+        benchmarks = PipelineBenchmarks(workdir, args.repeat, quick=args.quick)
+        results = benchmarks.run()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "quick": args.quick,
+        },
+        "results": results,
+        "failures": benchmarks.failures,
+    }
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+
+    status = 0
+    if benchmarks.failures:
+        print(f"\n❌ {len(benchmarks.failures)} expectation(s) not met:")
+        for failure in benchmarks.failures:
+            print(f"  {failure}")
+        status = 1
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms / 1000)
+        if regressions:
+            print(f"\n❌ {len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+            return 1
+        print("\n✅ No regressions beyond threshold")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""
+HTTP load test - Drives /api/upload, /api/status/<token> and /api/review/<token>
+
+Each virtual user uploads a PDF from the corpus, polls the status endpoint the
+way the frontend does (fixed interval with jitter) until the review finishes,
+then downloads it. Concurrency levels are run back to back against the same
+server so latency collapse and memory growth show up as the load increases.
+
+    # Spawn a stub-backed server and sweep 1, 4 and 16 concurrent users
+    python -m benchmarks.load_test --concurrency 1,4,16
+
+    # Same sweep against the ASGI entry point
+    python -m benchmarks.load_test --concurrency 1,4,16 --asgi
+
+    # Target an already running deployment instead
+    python -m benchmarks.load_test --url http://localhost:5000 --server-pid 1234
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import requests
+
+from benchmarks.pdfgen import make_corpus
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: list, q: float) -> float | None:
+    """Nearest-rank percentile (q in 0..100); None for an empty sample."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def read_rss_kb(pid: int) -> int | None:
+    """Resident set size of ``pid`` in KiB (Linux /proc only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class VirtualUser(threading.Thread):
+    """Uploads papers one after another, polling each until completion."""
+
+    def __init__(self, base_url: str, corpus: list, uploads: int, poll_interval: float, timeout: float, stats: dict, lock: threading.Lock):
+        super().__init__(daemon=True)
+        self.base_url = base_url.rstrip("/")
+        self.corpus = corpus
+        self.uploads = uploads
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.stats = stats
+        self.lock = lock
+        self.session = requests.Session()
+
+    def _record(self, key: str, value):
+        with self.lock:
+            self.stats[key].append(value)
+
+    def _review_once(self, pdf_path: str):
+        started = time.perf_counter()
+        with open(pdf_path, "rb") as f:
+            # A trailing PDF comment makes every upload unique so the server's
+            # content-hash deduplication doesn't short-circuit the pipeline
+            payload = f.read() + f"\n% load-test {uuid.uuid4().hex}\n".encode()
+        t0 = time.perf_counter()
+        resp = self.session.post(
+            f"{self.base_url}/api/upload",
+            files={"file": (os.path.basename(pdf_path), payload, "application/pdf")},
+            timeout=60,
+        )
+        self._record("upload_latency", time.perf_counter() - t0)
+        if resp.status_code != 200:
+            self._record("errors", f"upload {resp.status_code}")
+            return
+        token = resp.json()["token"]
+
+        status = "processing"
+        deadline = started + self.timeout
+        while status == "processing":
+            if time.perf_counter() > deadline:
+                self._record("errors", "timeout")
+                return
+            # Same cadence as the frontend poller, jittered so users don't synchronize
+            time.sleep(self.poll_interval * random.uniform(0.8, 1.2))
+            t0 = time.perf_counter()
+            resp = self.session.get(f"{self.base_url}/api/status/{token}", timeout=30)
+            self._record("status_latency", time.perf_counter() - t0)
+            if resp.status_code != 200:
+                self._record("errors", f"status {resp.status_code}")
+                return
+            status = resp.json().get("status")
+
+        if status != "completed":
+            self._record("errors", f"review {status}")
+            return
+        t0 = time.perf_counter()
+        resp = self.session.get(f"{self.base_url}/api/review/{token}", timeout=30)
+        self._record("review_latency", time.perf_counter() - t0)
+        if resp.status_code != 200:
+            self._record("errors", f"review fetch {resp.status_code}")
+            return
+        self._record("time_to_completion", time.perf_counter() - started)
+
+    def run(self):
+        for _ in range(self.uploads):
+            try:
+                self._review_once(random.choice(self.corpus))
+            except requests.RequestException as exc:
+                self._record("errors", type(exc).__name__)
+
+
+def _latency_summary(values: list) -> dict:
+    return {
+        "count": len(values),
+        "p50_s": percentile(values, 50),
+        "p95_s": percentile(values, 95),
+        "p99_s": percentile(values, 99),
+        "max_s": max(values) if values else None,
+        "mean_s": statistics.fmean(values) if values else None,
+    }
+
+
+def run_level(base_url: str, corpus: list, concurrency: int, uploads_per_user: int, poll_interval: float, timeout: float, server_pid: int | None) -> dict:
+    stats = {key: [] for key in ("upload_latency", "status_latency", "review_latency", "time_to_completion", "errors")}
+    lock = threading.Lock()
+    rss_before = read_rss_kb(server_pid) if server_pid else None
+
+    started = time.perf_counter()
+    users = [
+        VirtualUser(base_url, corpus, uploads_per_user, poll_interval, timeout, stats, lock)
+        for _ in range(concurrency)
+    ]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - started
+
+    rss_after = read_rss_kb(server_pid) if server_pid else None
+    completed = len(stats["time_to_completion"])
+    return {
+        "concurrency": concurrency,
+        "uploads": concurrency * uploads_per_user,
+        "completed": completed,
+        "errors": len(stats["errors"]),
+        "error_kinds": sorted(set(stats["errors"])),
+        "wall_time_s": elapsed,
+        "throughput_reviews_per_min": completed / elapsed * 60 if elapsed else 0.0,
+        "time_to_completion": _latency_summary(stats["time_to_completion"]),
+        "status_latency": _latency_summary(stats["status_latency"]),
+        "upload_latency": _latency_summary(stats["upload_latency"]),
+        "review_latency": _latency_summary(stats["review_latency"]),
+        "server_rss_kb_before": rss_before,
+        "server_rss_kb_after": rss_after,
+        "server_rss_growth_kb": rss_after - rss_before if rss_before and rss_after else None,
+    }
+
+
+def _ms(value):
+    return f"{value * 1000:8.1f}" if value is not None else "       -"
+
+
+def print_report(levels: list):
+    print(f"\n{'users':>5} {'done':>5} {'err':>4} {'rev/min':>8} "
+          f"{'ttc p50':>8} {'ttc p95':>8} {'ttc p99':>8} "
+          f"{'st p50':>8} {'st p95':>8} {'st p99':>8} {'ΔRSS MB':>8}")
+    for level in levels:
+        ttc, st = level["time_to_completion"], level["status_latency"]
+        growth = level["server_rss_growth_kb"]
+        print(
+            f"{level['concurrency']:>5} {level['completed']:>5} {level['errors']:>4} "
+            f"{level['throughput_reviews_per_min']:8.1f} "
+            f"{_ms(ttc['p50_s'])} {_ms(ttc['p95_s'])} {_ms(ttc['p99_s'])} "
+            f"{_ms(st['p50_s'])} {_ms(st['p95_s'])} {_ms(st['p99_s'])} "
+            f"{growth / 1024 if growth is not None else float('nan'):8.1f}"
+        )
+    print("(ttc = time to completion, st = status endpoint latency; times in ms)")
+
+
+def _wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Stub server exited with code {process.returncode}")
+        try:
+            requests.get(f"{base_url}/api/reviews", timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise RuntimeError("Stub server did not become ready in time")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent upload/poll load test for the review API")
+    parser.add_argument("--url", help="Base URL of a running server (default: spawn the stub server)")
+    parser.add_argument("--server-pid", type=int, help="PID of --url's server, for RSS measurements")
+    parser.add_argument("--port", type=int, default=5055, help="Port for the spawned stub server")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrent user counts")
+    parser.add_argument("--uploads-per-user", type=int, default=3)
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between status polls")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Give up on a review after this many seconds")
+    parser.add_argument("--corpus", help="Directory of sample PDFs (default: generate synthetic ones)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Stub server: seconds per LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="Stub server: seconds per search call")
+    parser.add_argument("--asgi", action="store_true", help="Stub server: serve asgi.py instead of the Flask app")
+    parser.add_argument("--output", default="load_results.json", help="Where to write the JSON report")
+    args = parser.parse_args(argv)
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    tmpdir = tempfile.mkdtemp(prefix="reviewer_load_corpus_")
+    if args.corpus:
+        corpus = [os.path.join(args.corpus, name) for name in sorted(os.listdir(args.corpus)) if name.lower().endswith(".pdf")]
+    else:
+        corpus = make_corpus(tmpdir, page_counts=(2, 6, 12))
+    if not corpus:
+        print("❌ No PDFs found in corpus")
+        return 1
+
+    server = None
+    base_url, server_pid = args.url, args.server_pid
+    if not base_url:
+        base_url = f"http://127.0.0.1:{args.port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.stub_server", "--port", str(args.port),
+             "--llm-latency", str(args.llm_latency), "--search-latency", str(args.search_latency),
+             "--workdir", os.path.join(tmpdir, "server")] + (["--asgi"] if args.asgi else []),
+            cwd=PROJECT_ROOT,
+        )
+        server_pid = server.pid
+        _wait_for_server(base_url, server)
+
+    try:
+        results = []
+        for concurrency in levels:
+            print(f"🚦 {concurrency} concurrent user(s) x {args.uploads_per_user} upload(s)...", flush=True)
+            results.append(run_level(base_url, corpus, concurrency, args.uploads_per_user, args.poll_interval, args.timeout, server_pid))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+
+    print_report(results)
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "base_url": base_url,
+            "corpus": corpus,
+            "poll_interval_s": args.poll_interval,
+            "stub_llm_latency_s": None if args.url else args.llm_latency,
+            "stub_search_latency_s": None if args.url else args.search_latency,
+            "server": None if args.url else ("asgi" if args.asgi else "flask"),
+        },
+        "levels": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Synthetic PDF generator - Builds text-only research-paper-like PDFs for benchmarks
+"""
+import os
+import random
+
+WORDS = (
+    "learning model data network training results method approach performance "
+    "dataset evaluation baseline accuracy experiments proposed graph attention "
+    "transformer optimization loss convergence analysis framework inference "
+    "benchmark ablation representation embedding retrieval generalization"
+).split()
+
+SECTIONS = ["Introduction", "Related Work", "Methodology", "Experiments", "Conclusion"]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_lines(page_index: int, total_pages: int, lines_per_page: int, rng: random.Random) -> list:
+    lines = []
+    if page_index == 0:
+        lines += [
+            "Scalable Graph Attention Networks for Synthetic Benchmarking",
+            "Jane Doe, John Smith",
+            "",
+            "Abstract",
+        ]
+    section = SECTIONS[min(page_index * len(SECTIONS) // max(total_pages, 1), len(SECTIONS) - 1)]
+    lines.append(f"{page_index + 1}. {section}")
+    while len(lines) < lines_per_page:
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + ".")
+    if page_index == total_pages - 1:
+        lines += ["References", "[1] A. Author. Prior work on graphs. 2023."]
+    return lines
+
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 45, seed: int = 0) -> str:
+    """Write a minimal multi-page PDF with Helvetica text and return its path."""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages tree, filled once the kids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for index in range(pages):
+        stream_lines = ["BT", "/F1 10 Tf", "14 TL", "50 760 Td"]
+        for line in _page_lines(index, pages, lines_per_page, rng):
+            stream_lines.append(f"({_escape(line)}) Tj T*")
+        stream_lines.append("ET")
+        stream = "\n".join(stream_lines).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), pages
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def make_corpus(directory: str, page_counts=(1, 5, 20)) -> list:
+    """Generate one PDF per page count in ``directory`` and return their paths."""
+    os.makedirs(directory, exist_ok=True)
+    return [
+        make_pdf(os.path.join(directory, f"synthetic_{pages:03d}p.pdf"), pages, seed=pages)
+        for pages in page_counts
+    ]
@@ -0,0 +1,63 @@
+"""
+Stub server - Runs app.py with the offline stub backends for load testing
+
+    python -m benchmarks.stub_server --port 5055 --llm-latency 0.5
+    python -m benchmarks.stub_server --asgi   # asgi.py under uvicorn instead
+
+Uploads and reviews are written under ``--workdir`` (a temp dir by default) so
+load tests never touch the real ``uploads/`` and ``reviews/`` folders.
+"""
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve app.py against stub Gemini/Tavily/arXiv backends")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per stub LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="Seconds per stub Tavily/arXiv call")
+    parser.add_argument("--rate-limits", action="store_true", help="Apply the production Gemini/Tavily/arXiv rate limits")
+    parser.add_argument("--workdir", help="Directory for uploads/ and reviews/ (default: temp dir)")
+    parser.add_argument("--verbose", action="store_true", help="Keep the agents' console output")
+    parser.add_argument("--asgi", action="store_true", help="Serve asgi.py with uvicorn instead of the Flask dev server")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, PROJECT_ROOT)
+    from agents.logs import configure_logging
+    from benchmarks.stubs import StubBackends
+
+    # Before app is imported, so its own configure_logging() keeps this level
+    configure_logging(level="INFO" if args.verbose else "WARNING")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="reviewer_load_")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    with StubBackends(llm_latency=args.llm_latency, search_latency=args.search_latency, rate_limits=args.rate_limits):
+        import app as webapp
+
+        print(f"🧪 Stub server on http://{args.host}:{args.port} (workdir: {workdir}, {'asgi' if args.asgi else 'flask'})", flush=True)
+        if not args.verbose:
+            logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        # Discard (rather than buffer) agent output so it doesn't skew memory measurements
+        sink = open(os.devnull, "w")
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(sink)
+        with output, sink:
+            if args.asgi:
+                import uvicorn
+                import asgi
+
+                uvicorn.run(asgi.app, host=args.host, port=args.port, log_level="info" if args.verbose else "warning")
+            else:
+                webapp.app.run(host=args.host, port=args.port, debug=False, threaded=True, use_reloader=False)
+
+
+if __name__ == "__main__":
+    main()
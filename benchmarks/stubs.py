@@ -0,0 +1,349 @@
+"""
+Stub backends - Offline stand-ins for Gemini, Tavily and arXiv
+
+Used by the benchmark suite and the load-test server so the pipeline can run
+end to end without API keys or network access. Responses are canned but shaped
+like the real services (JSON-mode answers that follow each agent's schema from
+the LLM, Atom XML from arXiv) so the parsing paths are exercised exactly as in
+production. ``flaky_agents`` makes every other answer of the named agents
+truncated JSON, to exercise the structured-output repair path.
+"""
+import asyncio
+import collections
+import itertools
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from agents import finder_agent, rate_limit
+from agents.finder_agent import PaperFinderAgent
+from agents.parser_agent import ParserAgent
+from agents.ranking_agent import RankingAgent
+from agents.reviewer_agent import ReviewerAgent
+from agents.validator_agent import PaperValidationAgent
+
+
+def _answer(payload: dict) -> str:
+    return json.dumps(payload, indent=2)
+
+
+def make_candidates(count: int, duplicate_every: int = 0) -> list:
+    """Build Tavily-shaped search results; every ``duplicate_every``-th one repeats an earlier URL."""
+    domains = ["arxiv.org/abs", "ieeexplore.ieee.org/document", "dl.acm.org/doi", "example.com/blog"]
+    results = []
+    for i in range(count):
+        source_index = i - 1 if duplicate_every and i and i % duplicate_every == 0 else i
+        domain = domains[source_index % len(domains)]
+        content = f"Stub abstract {source_index} about graph attention and scalable training. " * 8
+        results.append({
+            "title": f"Stub related paper {source_index}",
+            "url": f"https://{domain}/{source_index:05d}",
+            "content": content,
+            "snippet": content[:500],
+        })
+    return results
+
+
+def ranking_response(count: int) -> str:
+    return _answer({
+        "ranked_papers": [
+            {
+                "rank": i + 1,
+                "title": f"Stub related paper {i}",
+                "url": f"https://arxiv.org/abs/{i:05d}",
+                "relevance_score": 10 - (i % 10),
+                "quality_score": 8,
+                "reason": "Closely related method evaluated on comparable benchmarks.",
+            }
+            for i in range(count)
+        ],
+        "notes": "Stub ranking",
+    })
+
+
+def review_response() -> str:
+    paragraph = "The manuscript proposes a scalable method and compares it against prior work. " * 6
+    return _answer({
+        "summary": paragraph,
+        "strengths": [f"Strength {i}: {paragraph}" for i in range(3)],
+        "weaknesses": [f"Weakness {i}: {paragraph}" for i in range(3)],
+        "detailed_comments": {
+            section: paragraph
+            for section in ["Title and Abstract", "Introduction", "Methodology", "Experiments", "Conclusion"]
+        },
+        "questions": [f"Question {i}?" for i in range(4)],
+        "related_work_analysis": paragraph,
+        "overall_assessment": {
+            "recommendation": "Weak Accept",
+            "confidence": "Medium",
+            "justification": paragraph,
+        },
+    })
+
+
+def revision_response() -> str:
+    paragraph = "The revision addresses the earlier concerns about the evaluation protocol. " * 4
+    return _answer({
+        "changes_summary": paragraph,
+        "addressed_concerns": ["Weakness 0: the missing ablation is now reported."],
+        "strengths": [f"Strength {i}: {paragraph}" for i in range(3)],
+        "weaknesses": [f"Weakness {i}: {paragraph}" for i in range(2)],
+        "questions": [f"Question {i}?" for i in range(3)],
+        "detailed_comments": {"Experiments": paragraph, "Conclusion": paragraph},
+        "overall_assessment": {
+            "recommendation": "Accept",
+            "confidence": "Medium",
+            "justification": paragraph,
+        },
+    })
+
+
+CANNED_RESPONSES = {
+    "pdf_metadata_extractor": lambda: _answer({
+        "title": "Scalable Graph Attention Networks for Synthetic Benchmarking",
+        "abstract": "We study scalable graph attention networks on synthetic benchmarks. " * 4,
+        "authors": ["Jane Doe", "John Smith"],
+        "keywords": ["graph attention", "scalability", "benchmarking"],
+    }),
+    "pdf_intake_agent": lambda: json.dumps({
+        "title": "Scalable Graph Attention Networks for Synthetic Benchmarking",
+        "abstract": "We study scalable graph attention networks on synthetic benchmarks. " * 4,
+        "authors": ["Jane Doe", "John Smith"],
+        "keywords": ["graph attention", "scalability", "benchmarking"],
+        "validation": {
+            "is_research_paper": True,
+            "category": "research_paper",
+            "confidence": "High",
+            "reason": "Stub validation: abstract, sections and references present.",
+        },
+    }, indent=2),
+    "paper_validation_agent": lambda: _answer({
+        "is_research_paper": True,
+        "category": "research_paper",
+        "confidence": "High",
+        "reason": "Stub validation: abstract, sections and references present.",
+    }),
+    "paper_ranking_agent": lambda: ranking_response(8),
+    "paper_scoring_agent": lambda: _answer({
+        "scores": [{"index": i, "relevance_score": 10 - (i % 10), "quality_score": 7} for i in range(20)],
+    }),
+    "assistant_reviewer_agent": review_response,
+    "revision_reviewer_agent": revision_response,
+}
+
+
+def _event(text: str, partial: bool = False) -> SimpleNamespace:
+    return SimpleNamespace(partial=partial, content=SimpleNamespace(parts=[SimpleNamespace(text=text)]))
+
+
+class StubSessionService:
+    async def create_session(self, *, app_name, user_id, session_id=None, **kwargs):
+        return SimpleNamespace(id=session_id or "stub_session", app_name=app_name, user_id=user_id)
+
+
+class StubRunner:
+    """
+    Mimics ``InMemoryRunner`` with a canned response per agent name.
+
+    ``run_debug`` answers after ``latency`` seconds; ``run_async`` streams the
+    same text as partial events spread over ``latency`` and then yields the
+    aggregated final event, like SSE streaming mode.
+    """
+
+    STREAM_CHUNK_CHARS = 200
+
+    def __init__(self, agent_name: str, latency: float = 0.0, backends=None):
+        self.agent_name = agent_name
+        self.latency = latency
+        self.backends = backends
+        self.app_name = "stub_app"
+        self.session_service = StubSessionService()
+
+    def _answer(self) -> str:
+        if self.backends is not None:
+            return self.backends.answer(self.agent_name)
+        return CANNED_RESPONSES[self.agent_name]()
+
+    async def run_debug(self, user_messages, **kwargs) -> list:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [_event(self._answer())]
+
+    async def run_async(self, **kwargs):
+        text = self._answer()
+        chunks = [text[i:i + self.STREAM_CHUNK_CHARS] for i in range(0, len(text), self.STREAM_CHUNK_CHARS)]
+        for chunk in chunks:
+            if self.latency:
+                await asyncio.sleep(self.latency / len(chunks))
+            yield _event(chunk, partial=True)
+        yield _event(text)
+
+
+ATOM_ENTRY = """  <entry>
+    <id>http://arxiv.org/abs/2401.{index:05d}v1</id>
+    <updated>2024-02-{day:02d}T00:00:00Z</updated>
+    <published>2024-01-{day:02d}T00:00:00Z</published>
+    <title>Stub arXiv paper {index} on graph attention</title>
+    <summary>Stub arXiv abstract {index} describing a scalable attention mechanism.</summary>
+    <author><name>Ada Stub</name></author>
+    <author><name>Alan Stub</name></author>
+    <arxiv:journal_ref>Stub Conference {index}</arxiv:journal_ref>
+    <link href="http://arxiv.org/abs/2401.{index:05d}v1" rel="alternate" type="text/html"/>
+    <link title="pdf" href="http://arxiv.org/pdf/2401.{index:05d}v1" rel="related" type="application/pdf"/>
+    <arxiv:primary_category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.AI" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>
+"""
+
+
+def atom_feed(count: int, start: int = 0, total: int | None = None) -> bytes:
+    entries = "".join(ATOM_ENTRY.format(index=i, day=i % 28 + 1) for i in range(start, start + count))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom"'
+        ' xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">\n'
+        f"  <opensearch:totalResults>{start + count if total is None else total}</opensearch:totalResults>\n"
+        f"{entries}</feed>\n"
+    ).encode("utf-8")
+
+
+class StubResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.status_code = 200
+
+    def raise_for_status(self):
+        return None
+
+    def iter_content(self, chunk_size: int = 1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        return None
+
+
+class StubSession:
+    """Stands in for the finder's ``requests.Session`` and serves a canned, pageable Atom feed."""
+
+    def __init__(self, latency: float = 0.0, total_results: int = 1000, backends=None):
+        self.latency = latency
+        self.total_results = total_results
+        self.backends = backends
+        self.headers = {}
+
+    def get(self, url, params=None, **kwargs):
+        if self.backends is not None:
+            self.backends.count("arxiv")
+        if self.latency:
+            time.sleep(self.latency)
+        params = params or {}
+        start = int(params.get("start", 0))
+        count = max(0, min(int(params.get("max_results", 5)), self.total_results - start))
+        return StubResponse(atom_feed(count, start, self.total_results))
+
+
+class StubBackends:
+    """
+    Context manager that routes every agent to the stub backends.
+
+    Args:
+        llm_latency: Seconds each LLM call sleeps before answering
+        search_latency: Seconds each Tavily/arXiv call sleeps before answering
+        candidates: Number of Tavily results returned per search
+        rate_limits: Keep the production rate limits (e.g. arXiv's 3s spacing);
+            by default they are lifted since no real service is being called
+        corpus_path: Local paper corpus for finders built inside the context;
+            empty (the default) disables it so every run searches the stubs
+        flaky_agents: Agent config names whose 1st, 3rd, ... answers are cut
+            off mid-JSON, so each of their calls needs one repair
+
+    ``calls`` counts the requests each stub backend (``llm``, ``tavily``,
+    ``arxiv``) answered, so a benchmark can check how many calls an
+    optimisation saved without relying on timings.
+    """
+
+    UNLIMITED_ENV = {
+        "GEMINI_RPM": "1000000", "GEMINI_MAX_CONCURRENCY": "100000",
+        "TAVILY_RPM": "1000000", "TAVILY_MAX_CONCURRENCY": "100000",
+        "ARXIV_MIN_INTERVAL": "0.000001", "ARXIV_MAX_CONCURRENCY": "100000",
+    }
+
+    def __init__(self, llm_latency: float = 0.0, search_latency: float = 0.0, candidates: int = 8, rate_limits: bool = False,
+                 corpus_path: str = "", flaky_agents=()):
+        self.llm_latency = llm_latency
+        self.search_latency = search_latency
+        self.candidates = candidates
+        self.rate_limits = rate_limits
+        self.corpus_path = corpus_path
+        self.flaky_agents = set(flaky_agents)
+        self._answers = {}
+        self._answers_lock = threading.Lock()
+        self.calls = collections.Counter()
+        self._patches = []
+
+    def count(self, backend: str):
+        with self._answers_lock:
+            self.calls[backend] += 1
+
+    def answer(self, agent_name: str) -> str:
+        """Canned answer of ``agent_name``; every other one truncated for flaky agents."""
+        self.count("llm")
+        text = CANNED_RESPONSES[agent_name]()
+        if agent_name not in self.flaky_agents:
+            return text
+        with self._answers_lock:
+            count = next(self._answers.setdefault(agent_name, itertools.count()))
+        return text[:len(text) // 2] if count % 2 == 0 else text
+
+    def _tavily_search(self, query: str, max_results: int = 8, stop=None):
+        self.count("tavily")
+        if self.search_latency:
+            time.sleep(self.search_latency)
+        return make_candidates(min(self.candidates, max_results))
+
+    def __enter__(self):
+        latency = self.llm_latency
+        for agent_cls in (ParserAgent, PaperValidationAgent, RankingAgent, ReviewerAgent):
+            self._patches.append(mock.patch.object(
+                agent_cls, "_build_runner",
+                lambda agent, latency=latency: StubRunner(agent._agent_config["name"], latency, self),
+            ))
+        self._patches.append(mock.patch.object(
+            ParserAgent, "_build_lean_runner",
+            lambda agent, latency=latency: StubRunner(agent._lean_config["name"], latency, self),
+        ))
+        self._patches.append(mock.patch.object(
+            ReviewerAgent, "_build_variant_runner",
+            lambda agent, variant, latency=latency: StubRunner(agent._agent_config["name"], latency, self),
+        ))
+        self._patches.append(mock.patch.object(
+            ReviewerAgent, "_build_revision_runner",
+            lambda agent, latency=latency: StubRunner(agent._revision_config["name"], latency, self),
+        ))
+        self._patches.append(mock.patch.object(
+            RankingAgent, "_build_light_runner",
+            lambda agent, latency=latency: StubRunner(agent._light_config["name"], latency, self),
+        ))
+        self._patches.append(mock.patch.object(
+            PaperFinderAgent, "_build_session",
+            lambda agent: StubSession(self.search_latency, backends=self),
+        ))
+        self._patches.append(mock.patch.object(finder_agent, "tavily_search", self._tavily_search))
+        self._patches.append(mock.patch.dict(os.environ, {"PAPER_CORPUS_PATH": self.corpus_path}))
+        if not self.rate_limits:
+            self._patches.append(mock.patch.dict(os.environ, self.UNLIMITED_ENV))
+            self._patches.append(mock.patch.object(rate_limit, "_limiters", {}))
+        for patch in self._patches:
+            patch.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for patch in reversed(self._patches):
+            patch.stop()
+        self._patches = []
+        return False
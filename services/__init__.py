@@ -0,0 +1,16 @@
+"""
+Services package for AI Paper Reviewer (web-tier helpers shared by the servers)
+"""
+from .uploads import PdfUploadIngestor, IngestedUpload, UploadRejected
+from .review_files import write_review_response, negotiate_encoding, response_path
+from .review_store import ReviewStore
+
+__all__ = [
+    'PdfUploadIngestor',
+    'IngestedUpload',
+    'UploadRejected',
+    'write_review_response',
+    'negotiate_encoding',
+    'response_path',
+    'ReviewStore'
+]
@@ -0,0 +1,96 @@
+"""
+Review Files - Completed reviews rendered once, pre-compressed, and served from disk
+
+When a review completes, the ``/api/review/<token>`` response body is encoded
+a single time and written next to the archived result as identity, gzip and
+(when the optional ``brotli`` / ``zstandard`` packages are installed) br and
+zstd variants. Requests then only pick the best variant for the client's
+``Accept-Encoding`` and send the file, or answer 304 when the client's ETag
+still matches; nothing is re-serialized and results needn't stay in memory.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # Optional: br variant is skipped
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd variant is skipped
+    zstandard = None
+
+# Content-Encoding -> file suffix, in server preference order
+ENCODING_SUFFIXES = {
+    "zstd": ".zst",
+    "br": ".br",
+    "gzip": ".gz",
+    "identity": "",
+}
+
+
+def _compressors() -> dict:
+    compressors = {"gzip": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors["br"] = lambda data: brotli.compress(data, quality=11)
+    if zstandard is not None:
+        compressors["zstd"] = lambda data: zstandard.ZstdCompressor(level=19).compress(data)
+    return compressors
+
+
+def response_path(reviews_dir: str, token: str, encoding: str = "identity") -> str:
+    """Path of the pre-rendered response body for ``token`` in ``encoding``."""
+    return os.path.join(reviews_dir, f"{token}.response.json{ENCODING_SUFFIXES[encoding]}")
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_review_response(reviews_dir: str, token: str, body: dict) -> dict:
+    """
+    Encode ``body`` once and write every available encoding of it
+
+    Returns:
+        ``{'etag': str, 'encodings': [...], 'size_bytes': int}`` to keep on the
+        review entry instead of the result itself
+    """
+    data = json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    _atomic_write(response_path(reviews_dir, token), data)
+    encodings = ["identity"]
+    for encoding, compress in _compressors().items():
+        _atomic_write(response_path(reviews_dir, token, encoding), compress(data))
+        encodings.append(encoding)
+    return {
+        "etag": hashlib.sha256(data).hexdigest()[:32],
+        "encodings": encodings,
+        "size_bytes": len(data),
+    }
+
+
+def negotiate_encoding(accept_encodings, available: list) -> str:
+    """
+    Pick the encoding to send from a werkzeug ``Accept`` header object
+
+    The client's quality values decide; ties go to the server's preference
+    order (zstd, br, gzip, identity).
+    """
+    best, best_quality = "identity", 0.0
+    for encoding in ENCODING_SUFFIXES:
+        if encoding not in available:
+            continue
+        quality = accept_encodings[encoding] if encoding != "identity" else max(accept_encodings["identity"], 0.001)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def representation_etag(etag: str, encoding: str) -> str:
+    """Each encoding is a distinct representation, so it gets its own strong ETag."""
+    return etag if encoding == "identity" else f"{etag}-{encoding}"
@@ -0,0 +1,292 @@
+"""
+Review Store - Byte-bounded in-memory index of review status rows
+
+Only small status rows live in memory, in an LRU capped by their (estimated)
+serialized size. Rows are written through to ``<token>.status.json`` once a
+review reaches a terminal state, so evicting them is free and they are read
+back on the next access. Rows of reviews still processing are never evicted.
+Large payloads (a failed run's partial result) go straight to disk via
+``save_payload``. A small sha256 -> token map stays resident for upload
+deduplication.
+
+Every change stamps the row with the next value of a store-wide, monotonic
+change sequence (``seq``). A token -> last-change map in sequence order lets
+``changed_since`` answer "what changed after cursor N" without touching
+the rows, which is what bulk status polling needs.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+STATUS_SUFFIX = ".status.json"
+
+logger = logging.getLogger(__name__)
+
+
+def process_rss_kb() -> int | None:
+    """Resident set size of this process in KiB (Linux /proc only)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _hash_key(row: dict) -> tuple:
+    """Dedup key: the file's hash, and for a revision the review it revises."""
+    return row["sha256"], row.get("revision_of")
+
+
+def _row_size(row: dict) -> int:
+    return len(json.dumps(row, default=str))
+
+
+class ReviewStore:
+    """
+    Thread-safe review index with LRU eviction by byte size
+
+    Args:
+        directory: Where terminal rows and payloads are written (the reviews folder)
+        max_bytes: Budget for rows held in memory
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 16 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._hot = OrderedDict()  # token -> (row, size)
+        self._hot_bytes = 0
+        self._cold = set()  # tokens only on disk
+        self._by_hash = {}
+        self._lock = threading.RLock()
+        self.counters = {"evictions": 0, "disk_loads": 0, "writes": 0}
+        self._subscribers = []
+        self._seq = 0
+        self._changes = OrderedDict()  # token -> (seq, time) of its last change, oldest change first
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Index rows persisted by earlier runs without loading them."""
+        persisted = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(STATUS_SUFFIX):
+                continue
+            token = name[:-len(STATUS_SUFFIX)]
+            self._cold.add(token)
+            row = self._read(token)
+            if row and row.get("sha256") and row.get("status") == "completed":
+                self._by_hash[_hash_key(row)] = token
+            if row:
+                persisted.append((row.get("seq") or 0, row.get("changed_at") or 0.0, token))
+        for seq, changed_at, token in sorted(persisted):
+            self._changes[token] = (seq, changed_at)
+        # Start past anything an earlier run handed out, persisted or not (rows of in-flight reviews
+        # aren't), so clients' cursors stay valid across restarts: wall-clock milliseconds, unless
+        # a persisted row is already beyond that
+        self._seq = max([int(time.time() * 1000)] + [seq for seq, _, _ in persisted])
+
+    def _path(self, token: str, suffix: str = STATUS_SUFFIX) -> str:
+        return os.path.join(self.directory, f"{token}{suffix}")
+
+    def _read(self, token: str) -> dict | None:
+        try:
+            with open(self._path(token)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, token: str, row: dict):
+        tmp_path = self._path(token, STATUS_SUFFIX + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(row, f, default=str)
+        os.replace(tmp_path, self._path(token))
+        self.counters["writes"] += 1
+
+    def _stamp(self, token: str, row: dict) -> dict:
+        """Next change-sequence value for ``token``'s row; call with the lock held."""
+        self._seq += 1
+        changed_at = time.time()
+        self._changes[token] = (self._seq, changed_at)
+        self._changes.move_to_end(token)
+        return dict(row, seq=self._seq, changed_at=changed_at)
+
+    def _put_hot(self, token: str, row: dict):
+        if token in self._hot:
+            self._hot_bytes -= self._hot.pop(token)[1]
+        size = _row_size(row)
+        self._hot[token] = (row, size)
+        self._hot_bytes += size
+        self._evict()
+
+    def _evict(self):
+        if self._hot_bytes <= self.max_bytes:
+            return
+        for token in list(self._hot):
+            if self._hot_bytes <= self.max_bytes:
+                break
+            row, size = self._hot[token]
+            if row.get("status") not in TERMINAL_STATUSES:
+                continue
+            del self._hot[token]
+            self._hot_bytes -= size
+            self._cold.add(token)
+            self.counters["evictions"] += 1
+
+    def _load(self, token: str) -> dict | None:
+        row = self._hot.get(token)
+        if row is not None:
+            self._hot.move_to_end(token)
+            return row[0]
+        if token not in self._cold:
+            return None
+        row = self._read(token)
+        if row is None:
+            self._cold.discard(token)
+            return None
+        self.counters["disk_loads"] += 1
+        self._cold.discard(token)
+        self._put_hot(token, row)
+        return row
+
+    def subscribe(self, callback):
+        """
+        Call ``callback(token)`` after every change to a row
+
+        Callbacks run on the writer's thread, outside the store lock; they
+        should only hand the token off (e.g. wake an event loop), not block.
+        """
+        self._subscribers.append(callback)
+
+    def _notify(self, token: str):
+        for callback in self._subscribers:
+            try:
+                callback(token)
+            except Exception as exc:
+                logger.warning("⚠️ Review store subscriber failed: %s", exc)
+
+    def __contains__(self, token: str) -> bool:
+        with self._lock:
+            return token in self._hot or token in self._cold
+
+    def create(self, token: str, row: dict):
+        """Add a new review row."""
+        with self._lock:
+            row = self._stamp(token, dict(row, token=token))
+            self._put_hot(token, row)
+            if row.get("sha256"):
+                self._by_hash[_hash_key(row)] = token
+            if row.get("status") in TERMINAL_STATUSES:
+                self._write(token, row)
+        self._notify(token)
+
+    def get(self, token: str) -> dict | None:
+        """Return a copy of the row for ``token`` (None if unknown)."""
+        with self._lock:
+            row = self._load(token)
+            return dict(row) if row is not None else None
+
+    def update(self, token: str, **fields):
+        """Merge ``fields`` into the row; persists it once the review is terminal."""
+        with self._lock:
+            row = self._load(token)
+            if row is None:
+                raise KeyError(token)
+            row = self._stamp(token, dict(row, **fields))
+            self._put_hot(token, row)
+            if row.get("status") in TERMINAL_STATUSES:
+                self._write(token, row)
+        self._notify(token)
+
+    def set_partial(self, token: str, key: str, value):
+        """Record one streamed review section on a processing row."""
+        with self._lock:
+            row = self._load(token)
+            if row is None:
+                raise KeyError(token)
+            partial = dict(row.get("partial_review") or {}, **{key: value})
+            self._put_hot(token, self._stamp(token, dict(row, partial_review=partial)))
+        self._notify(token)
+
+    def discard_field(self, token: str, name: str):
+        with self._lock:
+            row = self._load(token)
+            if row is not None and name in row:
+                row = self._stamp(token, {k: v for k, v in row.items() if k != name})
+                self._put_hot(token, row)
+            else:
+                return
+        self._notify(token)
+
+    @property
+    def seq(self) -> int:
+        """Sequence value of the latest change."""
+        with self._lock:
+            return self._seq
+
+    def last_change(self, token: str) -> int | None:
+        """Sequence value of ``token``'s latest change (None if unknown)."""
+        with self._lock:
+            change = self._changes.get(token)
+            return change[0] if change else None
+
+    def changed_since(self, seq: int | None = None, timestamp: float | None = None) -> list:
+        """
+        Tokens changed after cursor ``seq`` and/or after ``timestamp`` (epoch
+        seconds), oldest change first; walks only the changes past the cursor.
+        """
+        with self._lock:
+            changed = []
+            for token in reversed(self._changes):
+                token_seq, changed_at = self._changes[token]
+                if (seq is not None and token_seq <= seq) or (timestamp is not None and changed_at <= timestamp):
+                    break
+                changed.append(token)
+            return changed[::-1]
+
+    def find_by_hash(self, sha256: str, statuses=("processing", "completed"), revision_of: str | None = None) -> str | None:
+        """
+        Token of a review of the same file whose status is in ``statuses``; a
+        revision only matches an earlier upload revising the same ``revision_of``.
+        """
+        with self._lock:
+            token = self._by_hash.get((sha256, revision_of))
+            row = self._load(token) if token else None
+            return token if row is not None and row.get("status") in statuses else None
+
+    def save_payload(self, token: str, name: str, payload) -> str:
+        """Write a large payload for ``token`` to disk instead of keeping it on the row."""
+        path = self._path(token, f".{name}.json")
+        with open(path, "w") as f:
+            json.dump(payload, f, indent=2, default=str)
+        return path
+
+    def rows(self) -> list:
+        """Copies of every row (hot and on disk), oldest upload first; cold rows are not promoted."""
+        with self._lock:
+            rows = [dict(row) for row, _ in self._hot.values()]
+            cold = list(self._cold)
+        for token in cold:
+            row = self._read(token)
+            if row is not None:
+                rows.append(row)
+        return sorted(rows, key=lambda row: row.get("uploaded_at") or "")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rows_in_memory": len(self._hot),
+                "rows_on_disk_only": len(self._cold),
+                "memory_bytes": self._hot_bytes,
+                "max_bytes": self.max_bytes,
+                "hash_index_entries": len(self._by_hash),
+                "seq": self._seq,
+                **self.counters,
+                "process_rss_kb": process_rss_kb(),
+            }
@@ -0,0 +1,338 @@
+"""
+Upload Ingestion - Streams a multipart PDF upload to disk in a single pass
+
+The request body is decoded incrementally (werkzeug's sans-IO multipart
+decoder) and each chunk of the file part is written straight to disk while
+the same bytes feed the SHA-256 hash, the ``%PDF-`` magic check and a running
+scan for page objects. A non-PDF is rejected after its first kilobyte instead
+of after the whole body has been buffered and saved.
+
+The scan only sees uncompressed page objects, so it can abort an oversized
+classic PDF early but misses the pages of PDF 1.5+ files kept in object
+streams. The authoritative page count is the ``/Count`` of the root
+``/Pages`` node, read with pdfminer once the file is on disk; when
+``max_pages`` is set and that count can't be read, the upload is rejected.
+
+Batch uploads use the same ingestor with ``max_files > 1``: each file part
+(or each PDF inside an uploaded zip) is validated on its own, and a bad file
+is recorded in ``rejected`` instead of failing the whole upload.
+"""
+import hashlib
+import os
+import re
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NEED_DATA
+from werkzeug.utils import secure_filename
+
+PDF_MAGIC = b"%PDF-"
+ZIP_MAGIC = b"PK\x03\x04"
+# The spec tolerates leading junk before the header; readers look in the first 1024 bytes
+MAGIC_SEARCH_BYTES = 1024
+# Uncompressed page objects, not the /Pages tree nodes
+PAGE_OBJECT_RE = re.compile(rb"/Type\s*/Page(?![A-Za-z0-9])")
+PAGE_SCAN_OVERLAP = 40
+MAX_FIELD_BYTES = 4096
+ZIP_READ_CHUNK = 64 * 1024
+
+
+class UploadRejected(Exception):
+    """Raised when an upload fails validation; carries the HTTP status to return."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def pdf_page_count(path: str) -> int | None:
+    """``/Count`` of the PDF's root ``/Pages`` node, or None if the file can't be parsed that far."""
+    try:
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.pdftypes import resolve1
+
+        with open(path, "rb") as f:
+            pages = resolve1(PDFDocument(PDFParser(f)).catalog.get("Pages"))
+            count = resolve1(pages.get("Count")) if isinstance(pages, dict) else None
+    except Exception:
+        return None
+    return count if isinstance(count, int) and count >= 0 else None
+
+
+@dataclass
+class IngestedUpload:
+    path: str
+    filename: str
+    sha256: str
+    size: int
+    page_count: int | None
+    fields: dict = field(default_factory=dict)
+
+
+class _FileSink:
+    """One file being written: hashes it, checks its header and scans for PDF page objects as bytes arrive."""
+
+    def __init__(self, upload_dir: str, filename: str, max_bytes: int | None, max_pages: int | None, magic: bytes = PDF_MAGIC):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.magic = magic
+        self.path = os.path.join(upload_dir, f".incoming_{uuid.uuid4().hex}.part")
+        self._file = open(self.path, "wb")
+        self._hasher = hashlib.sha256()
+        self.size = 0
+        self._head = bytearray()
+        self._magic_ok = False
+        self._page_count = 0
+        self._page_tail = b""
+
+    @property
+    def invalid_message(self) -> str:
+        return "Uploaded file is not a valid PDF" if self.magic == PDF_MAGIC else "Uploaded file is not a valid zip archive"
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise UploadRejected(f"File exceeds the {self.max_bytes // (1024 * 1024)}MB limit", status=413)
+        if not self._magic_ok:
+            self._head += data[:MAGIC_SEARCH_BYTES]
+            if self.magic in self._head[:MAGIC_SEARCH_BYTES]:
+                self._magic_ok = True
+                self._head = bytearray()
+            elif len(self._head) >= MAGIC_SEARCH_BYTES:
+                raise UploadRejected(self.invalid_message)
+        if self.magic == PDF_MAGIC:
+            self._count_pages(data)
+        self._hasher.update(data)
+        self._file.write(data)
+
+    def _count_pages(self, data: bytes):
+        """Early abort only: a lower bound, blind to pages in compressed object streams."""
+        buffer = self._page_tail + data
+        tail_length = len(self._page_tail)
+        for match in PAGE_OBJECT_RE.finditer(buffer):
+            # Skip matches already counted in the previous window, and defer
+            # ones touching the end until the next byte confirms them
+            if match.end() < tail_length or match.end() >= len(buffer):
+                continue
+            self._page_count += 1
+        self._page_tail = buffer[-PAGE_SCAN_OVERLAP:]
+        if self.max_pages and self._page_count > self.max_pages:
+            raise UploadRejected(f"PDF has more than {self.max_pages} pages", status=413)
+
+    def close(self) -> IngestedUpload:
+        """
+        Finish the file; raises ``UploadRejected`` (and deletes it) if the
+        header never appeared, or if a page limit is set and the page count
+        is over it or can't be read.
+        """
+        self._file.close()
+        if not self._magic_ok:
+            self.abort()
+            raise UploadRejected(self.invalid_message)
+        page_count = pdf_page_count(self.path) if self.magic == PDF_MAGIC else None
+        if self.max_pages:
+            if page_count is None:
+                self.abort()
+                raise UploadRejected("Could not determine the PDF's page count")
+            if page_count > self.max_pages:
+                self.abort()
+                raise UploadRejected(f"PDF has more than {self.max_pages} pages", status=413)
+        return IngestedUpload(
+            path=self.path,
+            filename=self.filename,
+            sha256=self._hasher.hexdigest(),
+            size=self.size,
+            page_count=page_count,
+        )
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class PdfUploadIngestor:
+    """
+    Feed raw request-body chunks with ``feed``; call ``finish`` (or
+    ``finish_many`` for batches) at the end.
+
+    Args:
+        content_type: The request's Content-Type header (must carry a boundary)
+        upload_dir: Directory the file is streamed into
+        max_bytes: Reject a file once it grows past this size (413)
+        max_pages: Reject PDFs with more pages than this, or whose page count
+            can't be read (None = no limit)
+        allowed_extensions: Accepted filename extensions
+        field_name: Name of the multipart file field(s)
+        max_files: Files accepted from one body; above 1 a bad file is recorded
+            in ``rejected`` and the rest of the upload continues
+        allow_zip: Accept ``.zip`` parts and unpack the PDFs inside
+    """
+
+    def __init__(self, content_type: str, upload_dir: str, *, max_bytes: int | None = None,
+                 max_pages: int | None = None, allowed_extensions=("pdf",), field_name: str = "file",
+                 max_files: int = 1, allow_zip: bool = False):
+        mimetype, options = parse_options_header(content_type or "")
+        boundary = options.get("boundary")
+        if mimetype != "multipart/form-data" or not boundary:
+            raise UploadRejected("No file provided")
+        self.decoder = MultipartDecoder(boundary.encode("latin-1"))
+        self.upload_dir = upload_dir
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.allowed_extensions = {ext.lower() for ext in allowed_extensions}
+        self.field_name = field_name
+        self.max_files = max_files
+        self.allow_zip = allow_zip
+
+        self.fields = {}
+        self.rejected = []
+        self._current = None  # a _FileSink, a field name, or None to skip the part
+        self._field_buffer = bytearray()
+        self._files = []
+        self._archives = []
+        self._files_seen = 0
+
+    @property
+    def _batch(self) -> bool:
+        return self.max_files > 1
+
+    def feed(self, chunk: bytes):
+        """Process the next chunk of the request body; an empty chunk marks the end of the body."""
+        self.decoder.receive_data(chunk or None)
+        while True:
+            event = self.decoder.next_event()
+            if event is NEED_DATA or isinstance(event, Epilogue):
+                return
+            if isinstance(event, File):
+                self._start_file(event)
+            elif isinstance(event, Field):
+                self._current = event.name
+                self._field_buffer = bytearray()
+            elif isinstance(event, Data):
+                if isinstance(self._current, _FileSink):
+                    self._write(self._current, event.data, event.more_data)
+                elif self._current is not None:
+                    self._field_buffer += event.data
+                    if len(self._field_buffer) > MAX_FIELD_BYTES:
+                        raise UploadRejected(f"Form field '{self._current}' is too large")
+                    if not event.more_data:
+                        self.fields[self._current] = self._field_buffer.decode("utf-8", "replace")
+                        self._current = None
+
+    def _reject(self, filename: str, error: UploadRejected):
+        if not self._batch:
+            raise error
+        self.rejected.append({"filename": filename, "error": error.message})
+
+    def _start_file(self, event: File):
+        self._current = None  # Ignore unexpected or extra file parts
+        if event.name != self.field_name or (not self._batch and self._files_seen):
+            return
+        if not event.filename:
+            if not self._batch:
+                raise UploadRejected("No file selected")
+            return
+        filename = secure_filename(event.filename)
+        extension = filename.rsplit(".", 1)[1].lower() if "." in filename else ""
+        is_zip = self.allow_zip and extension == "zip"
+        if extension not in self.allowed_extensions and not is_zip:
+            self._reject(filename or event.filename, UploadRejected("Only PDF files are allowed"))
+            return
+        if self._files_seen >= self.max_files:
+            self._reject(filename, UploadRejected(f"Too many files (limit {self.max_files})"))
+            return
+        self._files_seen += 1
+        if is_zip:
+            # The archive is bounded by the request size limit; its members are checked when unpacked
+            self._current = _FileSink(self.upload_dir, filename, None, None, magic=ZIP_MAGIC)
+        else:
+            self._current = _FileSink(self.upload_dir, filename, self.max_bytes, self.max_pages)
+
+    def _write(self, sink: _FileSink, data: bytes, more_data: bool):
+        try:
+            sink.write(data)
+            if not more_data:
+                self._current = None
+                (self._archives if sink.magic == ZIP_MAGIC else self._files).append(sink.close())
+        except UploadRejected as e:
+            sink.abort()
+            self._current = None
+            self._reject(sink.filename, e)
+
+    def _check_complete(self):
+        if isinstance(self._current, _FileSink):
+            sink, self._current = self._current, None
+            sink.abort()
+            self._reject(sink.filename, UploadRejected("Upload ended before the file was complete"))
+
+    def finish(self) -> IngestedUpload:
+        """Validate the completed single-file upload and return it (the file stays at a temp path)."""
+        self._check_complete()
+        if not self._files:
+            raise UploadRejected("No file provided")
+        upload = self._files[0]
+        upload.fields = dict(self.fields)
+        return upload
+
+    def finish_many(self) -> list:
+        """Every accepted PDF, with uploaded zips unpacked; rejected files are listed in ``rejected``."""
+        self._check_complete()
+        uploads = list(self._files)
+        for archive in self._archives:
+            try:
+                uploads += self._unpack_zip(archive, self.max_files - len(uploads))
+            finally:
+                os.remove(archive.path)
+        self._files, self._archives = uploads, []
+        for upload in uploads:
+            upload.fields = dict(self.fields)
+        if not uploads and not self.rejected:
+            raise UploadRejected("No file provided")
+        return uploads
+
+    def _unpack_zip(self, archive: IngestedUpload, limit: int) -> list:
+        uploads = []
+        try:
+            bundle = zipfile.ZipFile(archive.path)
+        except zipfile.BadZipFile:
+            self._reject(archive.filename, UploadRejected("Uploaded file is not a valid zip archive"))
+            return uploads
+        with bundle:
+            for member in bundle.infolist():
+                name = os.path.basename(member.filename)
+                if member.is_dir() or member.filename.startswith("__MACOSX/") or not name.lower().endswith(".pdf"):
+                    continue
+                if len(uploads) >= limit:
+                    self._reject(name, UploadRejected(f"Too many files (limit {self.max_files})"))
+                    continue
+                sink = _FileSink(self.upload_dir, secure_filename(name), self.max_bytes, self.max_pages)
+                try:
+                    # Streamed through the same checks, so a zip bomb stops at max_bytes
+                    with bundle.open(member) as source:
+                        for chunk in iter(lambda: source.read(ZIP_READ_CHUNK), b""):
+                            sink.write(chunk)
+                    uploads.append(sink.close())
+                except UploadRejected as e:
+                    sink.abort()
+                    self._reject(name, e)
+                except (zipfile.BadZipFile, OSError, RuntimeError) as e:
+                    sink.abort()
+                    self._reject(name, UploadRejected(f"Could not extract file: {e}"))
+        return uploads
+
+    def abort(self):
+        """Close and delete any partially written or unclaimed files."""
+        if isinstance(self._current, _FileSink):
+            self._current.abort()
+        for upload in self._files + self._archives:
+            if os.path.exists(upload.path):
+                os.remove(upload.path)
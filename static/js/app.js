@@ -168,6 +168,7 @@ async function checkStatus(token, options = {}) {
                         <h3>⏳ Processing</h3>
                         <p>${data.progress || 'Your paper is being analyzed...'}</p>
                         ${elapsedHtml}
+                        ${renderPartialReview(data.partial_review)}
                         <button onclick="checkStatus('${targetToken}')" class="btn btn-secondary" style="margin-top: 1rem;">Refresh Status</button>
                     </div>
                 `;
@@ -458,6 +459,42 @@ function renderEvidenceList(items = []) {
     }).join('');
 }
 
+// Render the review sections streamed so far while generation is still running
+function renderPartialReview(partial) {
+    if (!partial || !Object.keys(partial).length) return '';
+    const labels = {
+        summary: 'Summary',
+        strengths: 'Strengths',
+        weaknesses: 'Weaknesses',
+        detailed_comments: 'Detailed Comments',
+        questions: 'Questions',
+        related_work_analysis: 'Related Work Analysis',
+        overall_assessment: 'Overall Assessment'
+    };
+    const blocks = Object.entries(labels)
+        .filter(([key]) => key in partial)
+        .map(([key, label]) => {
+            const value = partial[key];
+            let body;
+            if (Array.isArray(value)) {
+                body = `<ul>${renderEvidenceList(value)}</ul>`;
+            } else if (value && typeof value === 'object') {
+                body = Object.entries(value).map(([name, text]) =>
+                    `<p><strong>${escapeHtml(name)}:</strong> ${escapeHtml(typeof text === 'string' ? text : JSON.stringify(text))}</p>`
+                ).join('');
+            } else {
+                body = `<p>${escapeHtml(value)}</p>`;
+            }
+            return `<div class="partial-review-section"><h4>${label}</h4>${body}</div>`;
+        }).join('');
+    return `
+        <div class="partial-review">
+            <p class="partial-review-note">Review in progress — sections appear as soon as they are written.</p>
+            ${blocks}
+        </div>
+    `;
+}
+
 function scrollToSection(sectionId) {
     const element = document.getElementById(sectionId);
     if (element) {
@@ -12,10 +12,12 @@ load_dotenv()
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from agents.logs import configure_logging
 from agents.root_agent import RootAgent
 
 def main():
     """Test the paper review workflow"""
+    configure_logging()
     
     print("\n" + "="*80)
     print("🧪 TESTING AI PAPER REVIEWER - AGENT WORKFLOW")